@@ -5,14 +5,26 @@ from .setup_display import get_display_from_config
 from .selection import GlobalSelection, BodyController, SelectionUpdateEvent, SelectedBodyPositionUpdateEvent
 from .select_renderer import SelectionRenderer
 from .velocity_controller import VelocityController
-from .celestial_body import get_celestial_body
+from .celestial_body import get_celestial_body, create_celestial_body, prepare_celestial_body_config, \
+    CelestialBodyConfig
 from .ui_elements import UIElement, TextBox, SwitchButtons
 from .upper_panel import UpperPanel
 from .side_panel import SidePanel
-from .trail_renderer import TrailRenderer
-from .merge_on_collision import MergeOnCollision
-from .reference_frame import ReferenceFrameManager, ReferenceFrame, ReferenceFrameUpdateValuesEvent, \
-    ReferenceFrameCalculateOffsetEvent, ReferenceFrameOriginChanged, ReferenceFrameCameraAdjuster
+from .trail_renderer import TrailRenderer, TrailResetEvent, TrailCache
+from .merge_on_collision import MergeOnCollision, MergeManager
+from .encounter_predictor import EncounterPredictor, Encounter, EncounterPredictedEvent
+from .conservation_diagnostics import ConservationDiagnostics, ConservationSample, ConservationDriftExceededEvent
+from .dt_tuner import DtTuner, DtTuningResult, DtTunedEvent, DtTuningCancelledEvent, DtTuningFailedEvent, \
+    probe_energy_drift
+from .orbital_elements import OrbitalElementsTracker, OrbitalElements, get_shortest_period
+from .reference_frame import ReferenceFrameManager, ReferenceFrameOriginChanged, ReferenceFrameCameraAdjuster, \
+    RelativeVelocityVectorRenderer
 from .body_creator import BodyCreator
 from .simulation_loader import SimulationLoader, SimulationLoadEvent
-from .save_simulation import save_simulation_to_json
+from .save_simulation import save_simulation_to_json, save_simulation_snapshot, append_simulation_to_series
+from .snapshot import BodyColumns, BodyValidationError, read_snapshot, write_snapshot
+from .snapshot_series import SnapshotSeriesWriter, SnapshotSeriesReader
+from .trajectory_recorder import TrajectoryRecorder, TrajectoryReader, TrajectoryRecord
+from .checkpointer import Checkpointer, CheckpointFailedEvent
+from .body_events import BodyCreatedEvent, BodyDeletedEvent, BodyStateEditedEvent
+from .replay import ReplayRecorder, play_replay, get_state_checksum
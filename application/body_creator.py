@@ -3,6 +3,8 @@ from sophysics_engine import Camera
 import pygame
 from typing import Dict, Optional
 from .celestial_body import get_celestial_body
+from .reference_frame import ReferenceFrameManager
+from .body_events import BodyCreatedEvent
 
 
 class BodyCreator(Clickable):
@@ -22,6 +24,7 @@ class BodyCreator(Clickable):
 
         self.__camera = camera
         self.__renderer: Optional[CircleRenderer] = None
+        self.__reference_frame_manager: Optional[ReferenceFrameManager] = None
 
         super().__init__(button, hold_time)
 
@@ -66,6 +69,7 @@ class BodyCreator(Clickable):
     def _clickable_start(self):
         self.__renderer = self.sim_object.get_component(CircleRenderer)
         self.__renderer.is_active = self.is_enabled
+        self.__reference_frame_manager = self.sim_object.environment.try_get_component(ReferenceFrameManager)
         self.refresh_parameters()
 
     def _clickable_update(self):
@@ -95,14 +99,22 @@ class BodyCreator(Clickable):
         return self.__rect.collidepoint(mouse_pos)
 
     def _on_click(self):
-        body = get_celestial_body(
-            config=self.__body_config,
+        # new bodies are at rest relative to the origin
+        initial_velocity = [0, 0]
+        if self.__reference_frame_manager is not None:
+            initial_velocity = list(self.__reference_frame_manager.velocity_offset)
+
+        parameters = dict(
             initial_position=list(self.sim_object.transform.position),
-            initial_velocity=[0, 0],
-            camera=self.__camera,
+            initial_velocity=initial_velocity,
             **self.__body_parameters
         )
+
+        body = get_celestial_body(config=self.__body_config, camera=self.__camera, **parameters)
         self.sim_object.environment.attach_sim_object(body)
 
+        self.sim_object.environment.event_system.raise_event(BodyCreatedEvent(body, parameters))
+
     def _clickable_end(self):
         self.__renderer = None
+        self.__reference_frame_manager = None
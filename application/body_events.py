@@ -0,0 +1,68 @@
+"""
+Events raised when the user changes the state of the simulation
+"""
+from sophysics_engine import Event, SimObject, RigidBody
+from typing import Dict, Any
+
+
+class BodyCreatedEvent(Event):
+    """
+    Raised after the user creates a new body
+    """
+    def __init__(self, sim_object: SimObject, parameters: Dict):
+        """
+        :param parameters: the parameters of get_celestial_body the body was created with
+        """
+        self.__sim_object = sim_object
+        self.__parameters = parameters
+
+    @property
+    def sim_object(self) -> SimObject:
+        return self.__sim_object
+
+    @property
+    def parameters(self) -> Dict:
+        return self.__parameters
+
+
+class BodyDeletedEvent(Event):
+    """
+    Raised right before the user deletes a body
+    """
+    def __init__(self, rigidbody: RigidBody):
+        self.__rigidbody = rigidbody
+
+    @property
+    def rigidbody(self) -> RigidBody:
+        return self.__rigidbody
+
+
+class BodyStateEditedEvent(Event):
+    """
+    Raised after the user changes one of the attributes of a body
+    """
+    POSITION = "position"
+    VELOCITY = "velocity"
+    MASS = "mass"
+    RADIUS = "radius"
+
+    def __init__(self, rigidbody: RigidBody, attribute: str, value: Any):
+        """
+        :param attribute: one of POSITION, VELOCITY, MASS or RADIUS
+        :param value: the new value of the attribute
+        """
+        self.__rigidbody = rigidbody
+        self.__attribute = attribute
+        self.__value = value
+
+    @property
+    def rigidbody(self) -> RigidBody:
+        return self.__rigidbody
+
+    @property
+    def attribute(self) -> str:
+        return self.__attribute
+
+    @property
+    def value(self) -> Any:
+        return self.__value
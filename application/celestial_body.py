@@ -1,13 +1,59 @@
 import pygame
 import pymunk
-from typing import Dict, List, Optional
+from typing import NamedTuple, Dict, List, Optional, Tuple, Sequence
 from sophysics_engine import Transform, RigidBody, Camera, SimObject
-from defaults import Attraction, CircleRenderer, VelocityVectorRenderer
+from defaults import Attraction, CircleRenderer
 from .select_renderer import SelectionRenderer
 from .selection import BodyController
 from .trail_renderer import TrailRenderer
 from .merge_on_collision import MergeOnCollision
-from .reference_frame import ReferenceFrame
+from .reference_frame import RelativeVelocityVectorRenderer
+
+
+class CelestialBodyConfig(NamedTuple):
+    """
+    The parts of the celestial body config that are the same for every body, with the colors already converted,
+    so that many bodies can be created without going through the config for every one of them
+    """
+    selection_width: int
+    selection_color: Tuple[int, ...]
+    selection_layer: int
+    # the arguments of the velocity renderer, shared by all the bodies
+    velocity_arrow: Dict
+    controller_button: int
+    controller_hold_time: float
+    trail_alpha: int
+    trail_max_points: int
+    trail_thickness: int
+    trail_layer: int
+    trail_min_pixel_distance: float
+    trail_simplification_tolerance: float
+
+
+def prepare_celestial_body_config(config: Dict) -> CelestialBodyConfig:
+    """
+    Reads the config of the celestial bodies once, for create_celestial_body()
+    """
+    selection_config = config["selection_renderer"]
+    arrow_config = config["velocity_arrow"]
+    controller_config = config["controller"]
+    trail_config = config["trail"]
+
+    return CelestialBodyConfig(
+        selection_width=selection_config["width"],
+        selection_color=tuple(selection_config["color"]),
+        selection_layer=selection_config["layer"],
+        # the config itself is left alone, since the scale factor in it is changed when a simulation is loaded
+        velocity_arrow=dict(arrow_config, color=pygame.Color(arrow_config["color"])),
+        controller_button=controller_config["button"],
+        controller_hold_time=controller_config["hold_time"],
+        trail_alpha=trail_config["alpha"],
+        trail_max_points=trail_config["max_points"],
+        trail_thickness=trail_config["thickness"],
+        trail_layer=trail_config["layer"],
+        trail_min_pixel_distance=trail_config["min_pixel_distance"],
+        trail_simplification_tolerance=trail_config["simplification_tolerance"]
+    )
 
 
 # the data types are such, so that we can fill all the parameters from a json file
@@ -15,77 +61,134 @@ def get_celestial_body(config: Dict, name: str, initial_position: List[float], i
                        mass: float, radius: float, is_attractor: bool, min_screen_radius: int, color,
                        draw_layer: int, camera: Camera, draw_trail: bool = True,
                        trail_vertex_distance: Optional[float] = None) -> SimObject:
-    transform = Transform(pygame.Vector2(initial_position))
-
-    shape = pymunk.Circle(None, radius)
-    shape.mass = mass
-    shape.elasticity = 0.0  # don't want planets bouncing off of each other
-    rigid_body = RigidBody((shape, ))
-    rigid_body.velocity = initial_velocity
-
-    grav_force = Attraction(is_attractor)
+    return create_celestial_body(prepare_celestial_body_config(config), name, initial_position, initial_velocity,
+                                 mass, radius, is_attractor, min_screen_radius, color, draw_layer, camera,
+                                 draw_trail, trail_vertex_distance)
+
+
+def create_celestial_body(config: CelestialBodyConfig, name: str, initial_position: Sequence[float],
+                          initial_velocity: Sequence[float], mass: float, radius: float, is_attractor: bool,
+                          min_screen_radius: int, color, draw_layer: int, camera: Camera, draw_trail: bool = True,
+                          trail_vertex_distance: Optional[float] = None) -> SimObject:
+    """
+    Creates a celestial body from the config prepared by prepare_celestial_body_config(),
+    which can be shared by all the bodies that are created at once
+    """
+    transform, rigid_body, grav_force, merge_on_collision = get_physics_components(
+        initial_position, initial_velocity, mass, radius, is_attractor
+    )
 
+    body_color = pygame.Color(color)
     circle_renderer = CircleRenderer(
         radius=radius,
         min_pixel_radius=min_screen_radius,
-        color=pygame.Color(color),
+        color=body_color,
         layer=draw_layer
     )
 
-    selection_config = config["selection_renderer"]
-
     selection_renderer = SelectionRenderer(
         radius=radius,
         min_pixel_radius=min_screen_radius,
-        width=selection_config["width"],
-        color=tuple(selection_config["color"]),
-        layer=selection_config["layer"]
+        width=config.selection_width,
+        color=config.selection_color,
+        layer=config.selection_layer
     )
     selection_renderer.is_active = False
 
-    arrow_config = config["velocity_arrow"]
-    # changing color from list to pygame.Color to save on space
-    arrow_config["color"] = pygame.Color(arrow_config["color"])
-
-    velocity_renderer = VelocityVectorRenderer(**arrow_config)
+    velocity_renderer = RelativeVelocityVectorRenderer(**config.velocity_arrow)
     velocity_renderer.is_active = False
 
-    controller_config = config["controller"]
-
     body_controller = BodyController(
         camera=camera,
         radius=radius,
-        button=controller_config["button"],
+        button=config.controller_button,
         min_pixel_radius=min_screen_radius,
-        hold_time=controller_config["hold_time"]
+        hold_time=config.controller_hold_time,
+        layer=draw_layer
     )
 
-    trail_config = config["trail"]
-    trail_color = pygame.Color(color)
-    trail_color.a = trail_config["alpha"]
+    # the color is already converted, so the trail color is made from its channels instead of parsing it again
+    trail_color = pygame.Color(body_color.r, body_color.g, body_color.b, config.trail_alpha)
 
-    point_distance = trail_vertex_distance if trail_vertex_distance is not None else max(radius, 100_000)
+    point_distance = trail_vertex_distance if trail_vertex_distance is not None else \
+        get_default_trail_vertex_distance(radius)
 
     trail_renderer = TrailRenderer(
         point_distance=point_distance,
-        max_points=trail_config["max_points"],
-        thickness=trail_config["thickness"],
+        max_points=config.trail_max_points,
+        thickness=config.trail_thickness,
         color=trail_color,
-        layer=trail_config["layer"]
+        layer=config.trail_layer,
+        min_pixel_distance=config.trail_min_pixel_distance,
+        simplification_tolerance=config.trail_simplification_tolerance
     )
 
     trail_renderer.is_active = draw_trail
 
-    merge_on_collision = MergeOnCollision()
-    reference_frame = ReferenceFrame()
-
     sim_object = SimObject(
         tag=name,
         components=(
             transform, rigid_body, grav_force, circle_renderer, selection_renderer,
-            velocity_renderer, body_controller, trail_renderer, merge_on_collision,
-            reference_frame
+            velocity_renderer, body_controller, trail_renderer, merge_on_collision
         )
     )
 
     return sim_object
+
+
+def get_default_trail_vertex_distance(radius: float) -> float:
+    """
+    The distance between the vertices of the trail of a body, that doesn't have it specified
+    """
+    return max(radius, 100_000)
+
+
+def get_physics_components(initial_position: Sequence[float], initial_velocity: Sequence[float], mass: float,
+                           radius: float, is_attractor: bool
+                           ) -> Tuple[Transform, RigidBody, Attraction, MergeOnCollision]:
+    """
+    Creates the components of a celestial body that take part in the physics simulation
+    """
+    transform = Transform(pygame.Vector2(initial_position))
+
+    shape = pymunk.Circle(None, radius)
+    shape.mass = mass
+    shape.elasticity = 0.0  # don't want planets bouncing off of each other
+    rigid_body = RigidBody((shape, ))
+    rigid_body.velocity = initial_velocity
+
+    grav_force = Attraction(is_attractor)
+    merge_on_collision = MergeOnCollision()
+
+    return transform, rigid_body, grav_force, merge_on_collision
+
+
+def get_physics_body(name: str, initial_position: Sequence[float], initial_velocity: Sequence[float], mass: float,
+                     radius: float, is_attractor: bool) -> SimObject:
+    """
+    A celestial body without any of the rendering and the UI components, e.g. for headless simulations
+    """
+    return SimObject(
+        tag=name,
+        components=get_physics_components(initial_position, initial_velocity, mass, radius, is_attractor)
+    )
+
+
+def set_body_mass(rigidbody: RigidBody, mass: float):
+    """
+    Changes the mass of a celestial body
+    """
+    rigidbody.mass = mass
+
+    # so, changing the radius resets the mass for some obscure reason (it actually does make a little sense)
+    # so, we're gonna change the mass of the shape as well
+    circle: pymunk.Circle = rigidbody.shapes.copy().pop()  # type: ignore
+    circle.mass = mass
+
+
+def set_body_radius(rigidbody: RigidBody, radius: float):
+    """
+    Changes the radius of the collision shape of a celestial body
+    """
+    circle: pymunk.Circle = rigidbody.shapes.copy().pop()  # type: ignore
+    circle.unsafe_set_radius(radius)
@@ -0,0 +1,227 @@
+from sophysics_engine import GlobalBehavior, TimeSettings, Camera, Event
+from .save_simulation import get_snapshot_data
+from .snapshot import write_snapshot, SNAPSHOT_EXTENSION, BodyColumns
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from typing import Optional, Dict, Deque
+import threading
+import logging
+import time
+import os
+
+
+_logger = logging.getLogger(__name__)
+
+
+class CheckpointFailedEvent(Event):
+    """
+    Raised when the Checkpointer finds out that writing a checkpoint failed
+    """
+    def __init__(self, path: str, error: BaseException):
+        self.__path = path
+        self.__error = error
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def error(self) -> BaseException:
+        return self.__error
+
+
+class Checkpointer(GlobalBehavior):
+    """
+    Periodically saves the simulation into snapshot files, keeping only the latest few.
+
+    The state is copied right after a physics step, the copy is written on a background thread,
+    so the main loop isn't stalled by the disk. If the previous checkpoint is still being written when the next
+    one is due, the next one is skipped. A failed write is found out about when the next checkpoint is due,
+    it's logged and CheckpointFailedEvent is raised.
+    """
+    SIMULATED_TIME = "simulated"
+    WALL_TIME = "wall"
+
+    PREFIX = "checkpoint_"
+
+    def __init__(self, directory: str, interval: float, interval_type: str = SIMULATED_TIME, keep: int = 3):
+        """
+        :param directory: the directory to put the checkpoints into
+        :param interval: the time between checkpoints in seconds
+        :param interval_type: "simulated" to measure the interval in simulated time, "wall" to measure it in real time
+        :param keep: the number of the latest checkpoints to keep
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        if interval_type not in (self.SIMULATED_TIME, self.WALL_TIME):
+            raise ValueError(f"interval_type must be either '{self.SIMULATED_TIME}' or '{self.WALL_TIME}'")
+
+        if keep <= 0:
+            raise ValueError("keep must be positive")
+
+        self.__directory = directory
+        self.__interval = interval
+        self.__interval_type = interval_type
+        self.__keep = keep
+
+        self.__simulated_time = 0.0
+        self.__last_checkpoint_time = 0.0
+        self.__checkpoint_number = 0
+
+        # the checkpoints that are currently on the disk, oldest first
+        self.__checkpoints: Deque[str] = deque()
+        self.__checkpoints_lock = threading.Lock()
+
+        self.__executor: Optional[ThreadPoolExecutor] = None
+        self.__pending: Optional[Future] = None
+        self.__pending_path: Optional[str] = None
+        self.__last_error: Optional[BaseException] = None
+
+        self.__time_settings: Optional[TimeSettings] = None
+        self.__camera: Optional[Camera] = None
+
+        super().__init__()
+
+    @property
+    def checkpoints(self):
+        """
+        Paths to the checkpoints on the disk, oldest first
+        """
+        with self.__checkpoints_lock:
+            return tuple(self.__checkpoints)
+
+    @property
+    def last_error(self) -> Optional[BaseException]:
+        """
+        The error of the last checkpoint that failed to be written, None if none of them failed
+        """
+        return self.__last_error
+
+    def _start(self):
+        self.__time_settings = self.environment.get_component(TimeSettings)
+        self.__camera = self.environment.get_component(Camera)
+
+        os.makedirs(self.__directory, exist_ok=True)
+        self.__find_existing_checkpoints()
+
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpointer")
+        self.__last_checkpoint_time = self.__get_time()
+
+    def __find_existing_checkpoints(self):
+        """
+        Picks up the checkpoints left by a previous run, so that they are rotated instead of overwritten
+        """
+        numbers = []
+
+        for filename in os.listdir(self.__directory):
+            if not (filename.startswith(self.PREFIX) and filename.endswith(SNAPSHOT_EXTENSION)):
+                continue
+
+            number = filename[len(self.PREFIX):-len(SNAPSHOT_EXTENSION)]
+            if number.isdigit():
+                numbers.append(int(number))
+
+        numbers.sort()
+
+        for number in numbers:
+            self.__checkpoints.append(self.__get_path(number))
+
+        if numbers:
+            self.__checkpoint_number = numbers[-1] + 1
+
+    def __get_path(self, number: int) -> str:
+        return os.path.join(self.__directory, f"{self.PREFIX}{number:06d}{SNAPSHOT_EXTENSION}")
+
+    def __get_time(self) -> float:
+        if self.__interval_type == self.WALL_TIME:
+            return time.monotonic()
+
+        return self.__simulated_time
+
+    def _physics_update(self):
+        self.__simulated_time += self.__time_settings.dt
+
+        if self.__get_time() - self.__last_checkpoint_time < self.__interval:
+            return
+
+        self.checkpoint()
+
+    def checkpoint(self) -> bool:
+        """
+        Copies the current state and schedules it to be written.
+        Returns False if the previous checkpoint is still being written.
+        """
+        if self.__pending is not None and not self.__pending.done():
+            return False
+
+        self.__check_pending_checkpoint()
+
+        self.__last_checkpoint_time = self.__get_time()
+
+        settings_dict, columns = get_snapshot_data(self.environment, self.__camera)
+        settings_dict["simulated_time"] = self.__simulated_time
+
+        path = self.__get_path(self.__checkpoint_number)
+        self.__checkpoint_number += 1
+
+        self.__pending = self.__executor.submit(self.__write_checkpoint, path, settings_dict, columns)
+        self.__pending_path = path
+
+        return True
+
+    def __check_pending_checkpoint(self):
+        """
+        Reports the error of the last written checkpoint, if there was one
+        """
+        pending = self.__pending
+        self.__pending = None
+
+        if pending is None or pending.cancelled():
+            return
+
+        error = pending.exception()
+        if error is None:
+            return
+
+        self.__last_error = error
+        _logger.error("Could not write the checkpoint %s: %r", self.__pending_path, error)
+        self.environment.event_system.raise_event(CheckpointFailedEvent(self.__pending_path, error))
+
+    def __write_checkpoint(self, path: str, settings_dict: Dict, columns: BodyColumns):
+        # writing into a temporary file first, so that a crash doesn't leave a broken checkpoint
+        temporary_path = path + ".tmp"
+        try:
+            write_snapshot(temporary_path, settings_dict, columns)
+            os.replace(temporary_path, path)
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+            raise
+
+        with self.__checkpoints_lock:
+            self.__checkpoints.append(path)
+
+            old_paths = []
+            while len(self.__checkpoints) > self.__keep:
+                old_paths.append(self.__checkpoints.popleft())
+
+        for old_path in old_paths:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    def _end(self):
+        # letting the last checkpoint finish
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+        self.__check_pending_checkpoint()
+        self.__pending_path = None
+        self.__time_settings = None
+        self.__camera = None
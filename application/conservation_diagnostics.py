@@ -0,0 +1,242 @@
+"""
+Monitoring of the conserved quantities, to tell whether the time step is small enough
+"""
+from sophysics_engine import EnvironmentComponent, Event, PhysicsManager, PrePhysicsUpdateEvent, \
+    PostPhysicsUpdateEvent
+from defaults import AttractionManager
+from .body_events import BodyStateEditedEvent
+from .simulation_loader import SimulationLoadEvent
+from typing import NamedTuple, Optional, Callable, Tuple
+import pymunk
+import math
+
+
+class ConservationSample(NamedTuple):
+    # the number of physics steps since the diagnostics were set up
+    step: int
+    kinetic_energy: float
+    potential_energy: float
+    momentum: Tuple[float, float]
+    # around the origin of the coordinates
+    angular_momentum: float
+    # the changes since the baseline, relative to the size of the baseline values
+    energy_drift: float
+    momentum_drift: float
+    angular_momentum_drift: float
+
+    @property
+    def total_energy(self) -> float:
+        return self.kinetic_energy + self.potential_energy
+
+
+class ConservationDriftExceededEvent(Event):
+    """
+    Raised when the energy drift of a sample goes over the threshold of the ConservationDiagnostics
+    """
+    def __init__(self, sample: ConservationSample):
+        self.__sample = sample
+
+    @property
+    def sample(self) -> ConservationSample:
+        return self.__sample
+
+
+class ConservationDiagnostics(EnvironmentComponent):
+    """
+    Computes the total energy, momentum and angular momentum of the bodies every few steps,
+    and how far they drifted from the baseline.
+
+    The potential energy is summed up by the AttractionManager from the same pairs it computes the forces for,
+    so it costs next to nothing on top of the step. The baseline is taken again when the bodies are added,
+    removed, merged or edited, since the totals change for reasons other than the integration error then.
+    """
+    def __init__(self, interval: int = 10, threshold: float = 1e-3,
+                 drift_callback: Optional[Callable[[ConservationSample], None]] = None):
+        """
+        :param interval: the number of steps between the samples
+        :param threshold: the relative energy drift that raises ConservationDriftExceededEvent
+        :param drift_callback: called with the sample when the energy drift goes over the threshold
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        if threshold <= 0:
+            raise ValueError("threshold must be positive")
+
+        self.__interval = interval
+        self.__threshold = threshold
+        self.__drift_callback = drift_callback
+
+        self.__step = 0
+        self.__is_sampling = False
+        self.__is_over_threshold = False
+        self.__body_count: Optional[int] = None
+
+        # kinetic energy, momentum x and y, angular momentum, and their scales, from the start of the sampled step
+        self.__pending: Optional[Tuple[float, float, float, float, float, float]] = None
+        self.__baseline: Optional[ConservationSample] = None
+        self.__baseline_scales: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self.__last_sample: Optional[ConservationSample] = None
+
+        self.__physics_manager: Optional[PhysicsManager] = None
+        self.__attraction_manager: Optional[AttractionManager] = None
+
+        super().__init__()
+
+    @property
+    def interval(self) -> int:
+        return self.__interval
+
+    @property
+    def threshold(self) -> float:
+        return self.__threshold
+
+    @property
+    def baseline(self) -> Optional[ConservationSample]:
+        """
+        The sample the drift is measured from
+        """
+        return self.__baseline
+
+    @property
+    def last_sample(self) -> Optional[ConservationSample]:
+        return self.__last_sample
+
+    def setup(self):
+        super().setup()
+
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.__attraction_manager = self.environment.try_get_component(AttractionManager)
+
+        event_system = self.environment.event_system
+        event_system.add_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+        event_system.add_listener(PostPhysicsUpdateEvent, self.__handle_post_physics_update_event)
+        event_system.add_listener(BodyStateEditedEvent, self.__handle_reset_event)
+        event_system.add_listener(SimulationLoadEvent, self.__handle_reset_event)
+
+    def reset_baseline(self):
+        """
+        Makes the next sample the new baseline
+        """
+        self.__baseline = None
+        self.__last_sample = None
+        self.__is_over_threshold = False
+
+    def __handle_reset_event(self, _: Event):
+        self.reset_baseline()
+
+    def __handle_pre_physics_update_event(self, _: PrePhysicsUpdateEvent):
+        body_count = len(self.__physics_manager.space.bodies)
+        if body_count != self.__body_count:
+            self.__body_count = body_count
+            self.reset_baseline()
+
+        self.__is_sampling = self.__baseline is None or self.__step % self.__interval == 0
+        self.__step += 1
+
+        if not self.__is_sampling:
+            return
+
+        # the potential energy is computed by the attraction manager during the step,
+        # so everything else is measured at the start of the step too
+        if self.__attraction_manager is not None:
+            self.__attraction_manager.request_potential_energy()
+
+        self.__pending = self.__measure_motion()
+
+    def __measure_motion(self) -> Tuple[float, float, float, float, float, float]:
+        dynamic = pymunk.Body.DYNAMIC
+
+        kinetic_energies = []
+        momenta_x = []
+        momenta_y = []
+        angular_momenta = []
+        momentum_sizes = []
+        angular_momentum_sizes = []
+
+        for body in self.__physics_manager.space.bodies:
+            if body.body_type != dynamic:
+                continue
+
+            mass = body.mass
+            position = body.rigidbody.sim_object.transform.position
+            velocity_x, velocity_y = body.velocity
+
+            momentum_x = mass * velocity_x
+            momentum_y = mass * velocity_y
+            angular_momentum = position.x * momentum_y - position.y * momentum_x
+
+            kinetic_energies.append((momentum_x * velocity_x + momentum_y * velocity_y) / 2)
+            momenta_x.append(momentum_x)
+            momenta_y.append(momentum_y)
+            angular_momenta.append(angular_momentum)
+            momentum_sizes.append(math.hypot(momentum_x, momentum_y))
+            angular_momentum_sizes.append(abs(angular_momentum))
+
+        fsum = math.fsum
+        return (fsum(kinetic_energies), fsum(momenta_x), fsum(momenta_y), fsum(angular_momenta),
+                fsum(momentum_sizes), fsum(angular_momentum_sizes))
+
+    def __handle_post_physics_update_event(self, _: PostPhysicsUpdateEvent):
+        if not self.__is_sampling:
+            return
+
+        self.__is_sampling = False
+
+        kinetic_energy, momentum_x, momentum_y, angular_momentum, momentum_size, angular_momentum_size = \
+            self.__pending
+        self.__pending = None
+
+        potential_energy = 0.0
+        if self.__attraction_manager is not None:
+            potential_energy = self.__attraction_manager.potential_energy
+
+        baseline = self.__baseline
+        if baseline is None:
+            # the scales the drift is relative to, so that the quantities that are 0 at the start still work
+            energy_scale = abs(kinetic_energy + potential_energy) or kinetic_energy + abs(potential_energy)
+            self.__baseline_scales = (energy_scale, momentum_size, angular_momentum_size)
+
+            sample = ConservationSample(self.__step - 1, kinetic_energy, potential_energy, (momentum_x, momentum_y),
+                                        angular_momentum, 0.0, 0.0, 0.0)
+            self.__baseline = sample
+            self.__last_sample = sample
+            return
+
+        energy_scale, momentum_scale, angular_momentum_scale = self.__baseline_scales
+        sample = ConservationSample(
+            self.__step - 1, kinetic_energy, potential_energy, (momentum_x, momentum_y), angular_momentum,
+            _get_drift(kinetic_energy + potential_energy - baseline.total_energy, energy_scale),
+            _get_drift(math.hypot(momentum_x - baseline.momentum[0], momentum_y - baseline.momentum[1]),
+                       momentum_scale),
+            _get_drift(angular_momentum - baseline.angular_momentum, angular_momentum_scale)
+        )
+        self.__last_sample = sample
+
+        is_over_threshold = sample.energy_drift > self.__threshold
+        if is_over_threshold and not self.__is_over_threshold:
+            self.environment.event_system.raise_event(ConservationDriftExceededEvent(sample))
+
+            if self.__drift_callback is not None:
+                self.__drift_callback(sample)
+
+        self.__is_over_threshold = is_over_threshold
+
+    def _on_destroy(self):
+        event_system = self.environment.event_system
+        event_system.remove_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+        event_system.remove_listener(PostPhysicsUpdateEvent, self.__handle_post_physics_update_event)
+        event_system.remove_listener(BodyStateEditedEvent, self.__handle_reset_event)
+        event_system.remove_listener(SimulationLoadEvent, self.__handle_reset_event)
+
+        self.__physics_manager = None
+        self.__attraction_manager = None
+
+        super()._on_destroy()
+
+
+def _get_drift(change: float, scale: float) -> float:
+    if scale == 0:
+        return 0.0 if change == 0 else math.inf
+
+    return abs(change) / scale
@@ -0,0 +1,286 @@
+"""
+Choosing the time step from the energy drift of short probe runs
+"""
+from sophysics_engine import GlobalBehavior, Event, TimeSettings
+from defaults import AttractionManager
+from .conservation_diagnostics import ConservationDiagnostics
+from .headless import get_simulation_settings, get_headless_environment, get_physics_bodies
+from .simulation_loader import SimulationLoadEvent, SimulationParametersChangedEvent
+from .snapshot import BodyColumns
+from .orbital_elements import get_shortest_period
+from concurrent.futures import ProcessPoolExecutor, Future, CancelledError
+from typing import NamedTuple, Optional, Dict, List, Sequence
+import multiprocessing
+import logging
+import math
+
+
+_logger = logging.getLogger(__name__)
+
+
+def probe_energy_drift(columns: BodyColumns, settings: Dict, dt: float, steps: int) -> float:
+    """
+    Simulates the bodies for the given number of steps without rendering,
+    returns the largest relative energy drift that was measured
+    """
+    environment = get_headless_environment(dt, settings)
+    diagnostics = ConservationDiagnostics(interval=max(1, steps // 50))
+    environment.attach_component(diagnostics)
+    environment.attach_sim_objects(get_physics_bodies(columns))
+
+    max_drift = 0.0
+    for _ in range(steps):
+        environment.advance()
+
+        sample = diagnostics.last_sample
+        if sample is not None:
+            max_drift = max(max_drift, sample.energy_drift)
+
+    environment.destroy()
+    return max_drift
+
+
+class DtTuningResult(NamedTuple):
+    dt: float
+    tolerance: float
+    # the largest energy drift of every probed time step
+    drifts: Dict[float, float]
+
+    @property
+    def energy_drift(self) -> float:
+        return self.drifts[self.dt]
+
+    @property
+    def is_within_tolerance(self) -> bool:
+        return self.energy_drift <= self.tolerance
+
+
+class DtTunedEvent(Event):
+    """
+    Raised after the tuned time step is applied to the TimeSettings
+    """
+    def __init__(self, result: DtTuningResult):
+        self.__result = result
+
+    @property
+    def result(self) -> DtTuningResult:
+        return self.__result
+
+
+class DtTuningCancelledEvent(Event):
+    """
+    Raised when the tuning is cancelled before the probes finish, e.g. because another simulation was loaded
+    """
+
+
+class DtTuningFailedEvent(Event):
+    """
+    Raised when a probe couldn't run, the time step is left as it is
+    """
+    def __init__(self, dt: float, error: BaseException):
+        self.__dt = dt
+        self.__error = error
+
+    @property
+    def dt(self) -> float:
+        """
+        The time step of the probe that failed
+        """
+        return self.__dt
+
+    @property
+    def error(self) -> BaseException:
+        return self.__error
+
+
+class DtTuner(GlobalBehavior):
+    """
+    Picks the largest time step that keeps the energy drift within the tolerance.
+
+    The current state is copied and simulated for the same amount of simulated time with every candidate time step,
+    the probes run in worker processes, so the simulation keeps running meanwhile.
+    The probes cover a fraction of the shortest orbital period (see get_shortest_period()), so a probe that sees
+    too little of an orbit to drift can't make the time step grow with every tuning. A time step far smaller
+    than the orbits need would make the probes too long, so they're cut to max_probe_steps of the smallest candidate.
+    If none of the candidates is within the tolerance, the smallest one is picked.
+    If any of the probes fails to run (an error in the worker, or the worker was killed), the time step isn't changed,
+    the error is logged and DtTuningFailedEvent is raised instead.
+    Loading another simulation cancels the tuning and raises DtTuningCancelledEvent.
+    """
+    def __init__(self, tolerance: float = 1e-3, candidate_factors: Sequence[float] = (0.25, 0.5, 1, 2, 4, 8, 16),
+                 period_fraction: float = 0.25, probe_steps: int = 200, min_probe_steps: int = 10,
+                 max_probe_steps: int = 20000, max_workers: Optional[int] = None):
+        """
+        :param tolerance: the largest allowed relative energy drift
+        :param candidate_factors: the candidate time steps relative to the current one
+        :param period_fraction: the probes simulate this fraction of the shortest orbital period
+        :param probe_steps: the probes simulate as much time as this many steps of the current time step
+                            when none of the bodies is on a bound orbit
+        :param min_probe_steps: the candidates that would make fewer steps than this are skipped
+        :param max_probe_steps: the probes are cut to this many steps of the smallest candidate
+        :param max_workers: the number of worker processes, None for the number of processors
+        """
+        if tolerance <= 0:
+            raise ValueError("tolerance must be positive")
+
+        if not candidate_factors or any(factor <= 0 for factor in candidate_factors):
+            raise ValueError("candidate_factors must be a non-empty sequence of positive numbers")
+
+        if period_fraction <= 0:
+            raise ValueError("period_fraction must be positive")
+
+        if probe_steps <= 0 or min_probe_steps <= 0 or max_probe_steps <= 0:
+            raise ValueError("probe_steps, min_probe_steps and max_probe_steps must be positive")
+
+        self.tolerance = tolerance
+        self.__candidate_factors = tuple(sorted(candidate_factors))
+        self.__period_fraction = period_fraction
+        self.__probe_steps = probe_steps
+        self.__min_probe_steps = min_probe_steps
+        self.__max_probe_steps = max_probe_steps
+        self.__max_workers = max_workers
+
+        self.__executor: Optional[ProcessPoolExecutor] = None
+        self.__pending: Dict[float, Future] = {}
+        self.__last_result: Optional[DtTuningResult] = None
+
+        self.__time_settings: Optional[TimeSettings] = None
+
+        super().__init__()
+
+    @property
+    def is_tuning(self) -> bool:
+        return bool(self.__pending)
+
+    @property
+    def last_result(self) -> Optional[DtTuningResult]:
+        """
+        The result of the last tuning, None if the time step wasn't tuned since the simulation was loaded
+        """
+        return self.__last_result
+
+    def _start(self):
+        self.__time_settings = self.environment.get_component(TimeSettings)
+        self.environment.event_system.add_listener(SimulationLoadEvent, self.__handle_simulation_load_event)
+        # the simulations loaded without the UI only raise this one
+        self.environment.event_system.add_listener(SimulationParametersChangedEvent,
+                                                   self.__handle_simulation_load_event)
+
+    def get_probe_duration(self) -> float:
+        """
+        The simulated time the next tuning's probes will cover
+        """
+        return self.__get_probe_duration(BodyColumns.from_environment(self.environment))
+
+    def get_candidates(self) -> List[float]:
+        """
+        The time steps the next tuning will probe
+        """
+        return self.__get_candidates(self.get_probe_duration())
+
+    def __get_probe_duration(self, columns: BodyColumns) -> float:
+        dt = self.__time_settings.dt
+        attraction_manager = self.environment.try_get_component(AttractionManager)
+        period = math.inf
+
+        if attraction_manager is not None:
+            period = get_shortest_period(columns, attraction_manager.attraction_coefficient)
+
+        if not math.isfinite(period):
+            return dt * self.__probe_steps
+
+        return min(period * self.__period_fraction, dt * self.__candidate_factors[0] * self.__max_probe_steps)
+
+    def __get_candidates(self, duration: float) -> List[float]:
+        dt = self.__time_settings.dt
+
+        return [dt * factor for factor in self.__candidate_factors
+                if duration / (dt * factor) >= self.__min_probe_steps]
+
+    def start_tuning(self) -> bool:
+        """
+        Starts probing the candidate time steps, returns False if there's nothing to tune
+        """
+        if self.is_tuning or self.__time_settings.dt <= 0:
+            return False
+
+        columns = BodyColumns.from_environment(self.environment)
+        duration = self.__get_probe_duration(columns)
+        candidates = self.__get_candidates(duration)
+        if not candidates or len(columns) < 2:
+            return False
+
+        if self.__executor is None:
+            # spawned workers don't inherit the window and the rest of the state of this process
+            self.__executor = ProcessPoolExecutor(self.__max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        settings = get_simulation_settings(self.environment)
+        # the probes already run in parallel, a parallel gravity solver would start a pool of workers in every probe
+        settings["attraction_settings"]["solver"] = "direct"
+        settings["attraction_settings"].pop("solver_settings", None)
+
+        for dt in candidates:
+            steps = math.ceil(duration / dt)
+            self.__pending[dt] = self.__executor.submit(probe_energy_drift, columns, settings, dt, steps)
+
+        return True
+
+    def cancel_tuning(self):
+        """
+        Stops waiting for the probes, the time step is left as it is
+        """
+        if not self.__pending:
+            return
+
+        for future in self.__pending.values():
+            future.cancel()
+
+        self.__pending.clear()
+        self.environment.event_system.raise_event(DtTuningCancelledEvent())
+
+    def _update(self):
+        if not self.__pending or not all(future.done() for future in self.__pending.values()):
+            return
+
+        pending = self.__pending
+        self.__pending = {}
+
+        for dt, future in pending.items():
+            error = CancelledError() if future.cancelled() else future.exception()
+
+            if error is not None:
+                # picking the smallest candidate would punish the simulation for a broken worker
+                _logger.error("Could not probe the time step %s: %r", dt, error)
+                self.environment.event_system.raise_event(DtTuningFailedEvent(dt, error))
+                return
+
+        drifts = {}
+        for dt, future in pending.items():
+            # a probe that blew up is as bad as a drift can get
+            drift = future.result()
+            drifts[dt] = drift if math.isfinite(drift) else math.inf
+
+        good_candidates = [dt for dt, drift in drifts.items() if drift <= self.tolerance]
+        best_dt = max(good_candidates) if good_candidates else min(drifts)
+
+        result = DtTuningResult(best_dt, self.tolerance, drifts)
+        self.__last_result = result
+        self.__time_settings.dt = best_dt
+
+        self.environment.event_system.raise_event(DtTunedEvent(result))
+
+    def __handle_simulation_load_event(self, _: Event):
+        self.cancel_tuning()
+        self.__last_result = None
+
+    def _end(self):
+        self.cancel_tuning()
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
+
+        self.environment.event_system.remove_listener(SimulationLoadEvent, self.__handle_simulation_load_event)
+        self.environment.event_system.remove_listener(SimulationParametersChangedEvent,
+                                                      self.__handle_simulation_load_event)
+        self.__time_settings = None
@@ -0,0 +1,183 @@
+"""
+Prediction of the close encounters and the collisions that happen in the middle of a physics step
+"""
+from sophysics_engine import EnvironmentComponent, Event, PhysicsManager, RigidBody, TimeSettings, \
+    PrePhysicsUpdateEvent
+from sophysics_engine.helper_functions import sort_and_sweep
+from typing import NamedTuple, Optional, List, Tuple
+import math
+
+
+class Encounter(NamedTuple):
+    body1: RigidBody
+    body2: RigidBody
+    # the time from the start of the step, when the bodies touch (for collisions) or come the closest
+    time: float
+    # the smallest distance between the surfaces of the bodies during the step, 0 for collisions
+    distance: float
+    is_collision: bool
+
+
+class EncounterPredictedEvent(Event):
+    """
+    Raised before a physics step with all the collisions and the close passes that are predicted to happen during it
+    """
+    def __init__(self, encounters: List[Encounter], dt: float):
+        self.__encounters = encounters
+        self.__dt = dt
+
+    @property
+    def encounters(self) -> List[Encounter]:
+        return self.__encounters
+
+    @property
+    def dt(self) -> float:
+        return self.__dt
+
+    @property
+    def collisions(self) -> List[Encounter]:
+        return [encounter for encounter in self.__encounters if encounter.is_collision]
+
+
+class EncounterPredictor(EnvironmentComponent):
+    """
+    Predicts the collisions and the close passes that happen between the bodies during the next physics step,
+    so that the fast bodies don't tunnel through each other when the step is big.
+
+    The bodies are assumed to move in straight lines during the step. Their swept bounding circles are put into
+    a sort and sweep pass to find the candidate pairs, and the time of the closest approach is computed for every one
+    of them. The bodies that already overlap at the start of the step are left to the physics manager.
+
+    The step is split into substeps, so that the bodies of an encounter move by no more than the distance
+    between them in one substep (up to PhysicsManager.max_substeps)
+    """
+    def __init__(self, close_pass_factor: float = 5.0, use_substeps: bool = True):
+        """
+        :param close_pass_factor: the bodies pass close to each other if the distance between their centers gets
+                                  smaller than the sum of their radii times this factor
+        :param use_substeps: whether to split the steps with encounters into substeps
+        """
+        if close_pass_factor < 1:
+            raise ValueError("close_pass_factor must be at least 1")
+
+        self.__close_pass_factor = close_pass_factor
+        self.__use_substeps = use_substeps
+
+        self.__physics_manager: Optional[PhysicsManager] = None
+        self.__time_settings: Optional[TimeSettings] = None
+
+        super().__init__()
+
+    @property
+    def close_pass_factor(self) -> float:
+        return self.__close_pass_factor
+
+    @property
+    def use_substeps(self) -> bool:
+        return self.__use_substeps
+
+    def setup(self):
+        super().setup()
+
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.__time_settings = self.environment.get_component(TimeSettings)
+        self.environment.event_system.add_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+
+    def __handle_pre_physics_update_event(self, event: PrePhysicsUpdateEvent):
+        dt = self.__time_settings.dt
+        encounters, substeps = self.__predict(dt)
+
+        if not encounters:
+            return
+
+        if self.__use_substeps:
+            event.request_substeps(substeps)
+
+        self.environment.event_system.raise_event(EncounterPredictedEvent(encounters, dt))
+
+    def predict_encounters(self, dt: float) -> List[Encounter]:
+        """
+        Finds the collisions and the close passes that happen during the next dt seconds, sorted by their time
+        """
+        return self.__predict(dt)[0]
+
+    def __predict(self, dt: float) -> Tuple[List[Encounter], int]:
+        """
+        Returns the encounters and the number of substeps that makes the bodies of every encounter move
+        by no more than the distance between their centers at the closest approach in one substep
+        """
+        rigidbodies = [body.rigidbody for body in self.__physics_manager.space.bodies]
+        factor = self.__close_pass_factor
+
+        xs = []
+        ys = []
+        velocities_x = []
+        velocities_y = []
+        radii = []
+        for rigidbody in rigidbodies:
+            position = rigidbody.sim_object.transform.position
+            velocity_x, velocity_y = rigidbody.velocity
+
+            xs.append(position.x)
+            ys.append(position.y)
+            velocities_x.append(velocity_x)
+            velocities_y.append(velocity_y)
+            radii.append(rigidbody.get_bounding_radius())
+
+        # the circles that contain everything that's closer than the close pass distance to the body during the step
+        swept_xs = [x + velocity_x * dt / 2 for x, velocity_x in zip(xs, velocities_x)]
+        swept_ys = [y + velocity_y * dt / 2 for y, velocity_y in zip(ys, velocities_y)]
+        swept_radii = [radius * factor + math.hypot(velocity_x, velocity_y) * dt / 2
+                       for radius, velocity_x, velocity_y in zip(radii, velocities_x, velocities_y)]
+
+        encounters = []
+        substeps = 1
+        for i, j in sort_and_sweep(swept_xs, swept_ys, swept_radii):
+            # the position and the velocity of the second body relative to the first one
+            dx = xs[j] - xs[i]
+            dy = ys[j] - ys[i]
+            dvx = velocities_x[j] - velocities_x[i]
+            dvy = velocities_y[j] - velocities_y[i]
+
+            contact_distance = radii[i] + radii[j]
+            distance_squared = dx * dx + dy * dy
+
+            if distance_squared < contact_distance * contact_distance:
+                continue
+
+            speed_squared = dvx * dvx + dvy * dvy
+            if speed_squared == 0:
+                continue
+
+            # the time of the closest approach, clamped to the step
+            approach = dx * dvx + dy * dvy
+            closest_time = min(max(-approach / speed_squared, 0.0), dt)
+            closest_x = dx + dvx * closest_time
+            closest_y = dy + dvy * closest_time
+            closest_distance_squared = closest_x * closest_x + closest_y * closest_y
+
+            if closest_distance_squared >= (contact_distance * factor) ** 2:
+                continue
+
+            # the colliding bodies are only required to not pass through each other in one substep
+            substep_distance_squared = max(closest_distance_squared, contact_distance * contact_distance)
+            substeps = max(substeps, math.ceil(math.sqrt(speed_squared / substep_distance_squared) * dt))
+
+            if closest_distance_squared < contact_distance * contact_distance:
+                # the first root of |d + v * t| = contact_distance
+                discriminant = approach * approach - speed_squared * (distance_squared - contact_distance ** 2)
+                contact_time = (-approach - math.sqrt(max(discriminant, 0.0))) / speed_squared
+                encounters.append(Encounter(rigidbodies[i], rigidbodies[j], contact_time, 0.0, True))
+            else:
+                distance = math.sqrt(closest_distance_squared) - contact_distance
+                encounters.append(Encounter(rigidbodies[i], rigidbodies[j], closest_time, distance, False))
+
+        encounters.sort(key=lambda encounter: encounter.time)
+        return encounters, substeps
+
+    def _on_destroy(self):
+        self.environment.event_system.remove_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+        self.__physics_manager = None
+        self.__time_settings = None
+
+        super()._on_destroy()
@@ -0,0 +1,103 @@
+"""
+Simulating the bodies without rendering, for the replays and the probe runs
+"""
+from sophysics_engine import SimEnvironment, SimObject, TimeSettings, PhysicsManager
+from defaults import AttractionManager
+from .celestial_body import get_physics_body
+from .encounter_predictor import EncounterPredictor
+from .merge_on_collision import MergeManager
+from .reference_frame import ReferenceFrameManager
+from .snapshot import BodyColumns, FLAG_IS_ATTRACTOR
+from typing import Dict, List
+
+
+def get_simulation_settings(environment: SimEnvironment) -> Dict:
+    """
+    Everything besides the bodies and the time step that changes how the environment simulates them,
+    as a JSON compatible dict for get_headless_environment()
+    """
+    physics_manager = environment.get_component(PhysicsManager)
+    attraction_manager = environment.get_component(AttractionManager)
+
+    # the encounter predictor changes the number of substeps, so it has to be the same too
+    encounter_predictor = environment.try_get_component(EncounterPredictor)
+    encounter_predictor_settings = None
+    if encounter_predictor is not None:
+        encounter_predictor_settings = {
+            "close_pass_factor": encounter_predictor.close_pass_factor,
+            "use_substeps": encounter_predictor.use_substeps
+        }
+
+    return {
+        "attraction_coefficient": attraction_manager.attraction_coefficient,
+        "attraction_settings": {
+            "softening": attraction_manager.softening,
+            "softening_length": attraction_manager.softening_length,
+            "regularization": attraction_manager.regularization,
+            "regularization_steps": attraction_manager.regularization_steps,
+            "solver": attraction_manager.solver_name,
+            "solver_settings": attraction_manager.solver_settings,
+            "summation": attraction_manager.summation
+        },
+        "physics_mode": physics_manager.mode,
+        "broadphase": physics_manager.broadphase,
+        "spatial_hash_cell_size": physics_manager.spatial_hash_cell_size,
+        "cell_size_percentile": physics_manager.cell_size_percentile,
+        "iterations": physics_manager.iterations,
+        "collision_slop": physics_manager.collision_slop,
+        "threads": physics_manager.threads,
+        "max_substeps": physics_manager.max_substeps,
+        "compensated_positions": physics_manager.compensated_positions,
+        "encounter_predictor": encounter_predictor_settings
+    }
+
+
+def get_headless_environment(dt: float, settings: Dict) -> SimEnvironment:
+    """
+    An environment that only has the components needed to simulate celestial bodies
+
+    :param settings: the dict from get_simulation_settings(). Only the attraction coefficient is required,
+                     the rest defaults to the settings the components had before they were configurable
+    """
+    environment = SimEnvironment((), (
+        TimeSettings(dt=dt),
+        PhysicsManager(
+            broadphase=settings.get("broadphase", PhysicsManager.BOUNDING_BOX_TREE),
+            spatial_hash_cell_size=settings.get("spatial_hash_cell_size", None),
+            cell_size_percentile=settings.get("cell_size_percentile", 90),
+            iterations=settings.get("iterations", 10),
+            collision_slop=settings.get("collision_slop", 0.1),
+            threads=settings.get("threads", 1),
+            mode=settings.get("physics_mode", PhysicsManager.PYMUNK),
+            max_substeps=settings.get("max_substeps", 1),
+            compensated_positions=settings.get("compensated_positions", False)
+        ),
+        AttractionManager(settings["attraction_coefficient"], **(settings.get("attraction_settings", None) or {})),
+        MergeManager(),
+        ReferenceFrameManager()
+    ))
+
+    encounter_predictor_settings = settings.get("encounter_predictor", None)
+    if encounter_predictor_settings is not None:
+        environment.attach_component(EncounterPredictor(**encounter_predictor_settings))
+
+    return environment
+
+
+def get_physics_bodies(columns: BodyColumns) -> List[SimObject]:
+    """
+    Creates the bodies from the columns without any rendering, the same way the simulation loader does
+    """
+    bodies = []
+
+    for i in range(len(columns)):
+        bodies.append(get_physics_body(
+            name=columns.get_name(i),
+            initial_position=[columns["position_x"][i], columns["position_y"][i]],
+            initial_velocity=[columns["velocity_x"][i], columns["velocity_y"][i]],
+            mass=columns["mass"][i],
+            radius=columns["radius"][i],
+            is_attractor=bool(columns["flags"][i] & FLAG_IS_ATTRACTOR)
+        ))
+
+    return bodies
@@ -0,0 +1,154 @@
+"""
+Incremental parsing of big JSON files
+"""
+from typing import BinaryIO, Iterator, Tuple, Any
+import codecs
+import json
+
+
+_WHITESPACE = " \t\n\r"
+
+
+class JSONObjectStream:
+    """
+    Parses a JSON object from a file one member at a time.
+
+    The items of the array under streamed_key are yielded one by one, so the whole file never has to be in memory.
+    Iterating yields (key, value) pairs for the members of the object, and (streamed_key, item) for every item
+    of the streamed array. Raises ValueError if the file isn't valid JSON
+    and TypeError if the value under streamed_key isn't an array.
+    """
+    def __init__(self, file: BinaryIO, streamed_key: str, chunk_size: int = 1 << 16):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+
+        self.__file = file
+        self.__streamed_key = streamed_key
+        self.__chunk_size = chunk_size
+
+        self.__decoder = json.JSONDecoder()
+        self.__text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+        self.__buffer = ""
+        self.__position = 0
+        self.__is_eof = False
+        self.__bytes_read = 0
+        self.__has_streamed_array = False
+
+    @property
+    def bytes_read(self) -> int:
+        """
+        The number of bytes read from the file so far
+        """
+        return self.__bytes_read
+
+    @property
+    def has_streamed_array(self) -> bool:
+        """
+        Whether the array under streamed_key has been encountered so far
+        """
+        return self.__has_streamed_array
+
+    def __read_chunk(self) -> bool:
+        """
+        Appends the next chunk of the file to the buffer, returns False if the file has ended
+        """
+        if self.__is_eof:
+            return False
+
+        data = self.__file.read(self.__chunk_size)
+        self.__bytes_read += len(data)
+        self.__is_eof = len(data) == 0
+
+        # dropping the parsed part, so that the buffer doesn't grow with the file
+        self.__buffer = self.__buffer[self.__position:] + self.__text_decoder.decode(data, final=self.__is_eof)
+        self.__position = 0
+
+        return not self.__is_eof
+
+    def __peek(self) -> str:
+        """
+        Skips the whitespace and returns the next character without consuming it
+        """
+        while True:
+            buffer = self.__buffer
+            position = self.__position
+
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+
+            self.__position = position
+
+            if position < len(buffer):
+                return buffer[position]
+
+            if not self.__read_chunk():
+                raise ValueError("unexpected end of the file")
+
+    def __expect(self, characters: str) -> str:
+        character = self.__peek()
+
+        if character not in characters:
+            raise ValueError(f"expected one of '{characters}', got '{character}'")
+
+        self.__position += 1
+        return character
+
+    def __read_value(self) -> Any:
+        self.__peek()
+
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer, self.__position)
+            except json.JSONDecodeError:
+                # the value may just be cut off by the end of the chunk
+                if not self.__read_chunk():
+                    raise
+
+                continue
+
+            # a number at the very end of the buffer might continue in the next chunk
+            if end == len(self.__buffer) and self.__read_chunk():
+                continue
+
+            self.__position = end
+            return value
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        self.__expect("{")
+
+        if self.__peek() == "}":
+            return
+
+        while True:
+            key = self.__read_value()
+
+            if not isinstance(key, str):
+                raise ValueError("object keys must be strings")
+
+            self.__expect(":")
+
+            if key == self.__streamed_key:
+                if self.__peek() != "[":
+                    raise TypeError(f"'{key}' attribute must be a list")
+
+                self.__has_streamed_array = True
+                yield from self.__iter_array(key)
+            else:
+                yield key, self.__read_value()
+
+            if self.__expect(",}") == "}":
+                return
+
+    def __iter_array(self, key: str) -> Iterator[Tuple[str, Any]]:
+        self.__expect("[")
+
+        if self.__peek() == "]":
+            self.__position += 1
+            return
+
+        while True:
+            yield key, self.__read_value()
+
+            if self.__expect(",]") == "]":
+                return
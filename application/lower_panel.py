@@ -3,7 +3,9 @@ import pygame
 from sophysics_engine import GUIPanel, TimeSettings, PauseEvent, UnpauseEvent
 from .ui_elements import TextBox, UIElement
 from .simulation_loader import SimulationParametersChangedEvent
-from typing import Dict, List
+from .conservation_diagnostics import ConservationDiagnostics, ConservationSample
+from .dt_tuner import DtTuner, DtTunedEvent, DtTuningCancelledEvent, DtTuningFailedEvent
+from typing import Dict, List, Optional
 import pygame_gui
 import math
 
@@ -13,6 +15,9 @@ class LowerPanel(GUIPanel):
         self.__config = config
         self.__elements: List[UIElement] = []
 
+        self.__diagnostics: Optional[ConservationDiagnostics] = None
+        self.__shown_sample: Optional[ConservationSample] = None
+
         super().__init__()
 
     @property
@@ -33,6 +38,9 @@ class LowerPanel(GUIPanel):
         self.environment.event_system.add_listener(UnpauseEvent, self.__handle_unpause_event)
         self.environment.event_system.add_listener(SimulationParametersChangedEvent,
                                                    self.__handle_parameters_change_event)
+        self.environment.event_system.add_listener(DtTunedEvent, self.__handle_dt_tuned_event)
+        self.environment.event_system.add_listener(DtTuningCancelledEvent, self.__handle_dt_tuning_cancelled_event)
+        self.environment.event_system.add_listener(DtTuningFailedEvent, self.__handle_dt_tuning_failed_event)
 
         self.__time_settings: TimeSettings = self.environment.get_component(TimeSettings)
         self.__create_panel()
@@ -40,6 +48,7 @@ class LowerPanel(GUIPanel):
         self.__create_timestep_controls()
         self.__create_language_menu()
         self.__create_timestep_per_frame_controls()
+        self.__create_diagnostics_readout()
 
     def __handle_parameters_change_event(self, _: SimulationParametersChangedEvent):
         self.__update_timestep_textbox()
@@ -114,6 +123,51 @@ class LowerPanel(GUIPanel):
     def __update_time_steps_per_frame_text_box(self):
         self.__timestep_per_frame_textbox.set_text(str(self.__time_settings.steps_per_frame))
 
+    def __create_diagnostics_readout(self):
+        local_config = self.__config["diagnosticsReadoutCfg"]
+        # the diagnostics may be attached later, so the labels are always created
+        self.__energy_drift_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(local_config["energyLabelRect"]),
+            text="",
+            manager=self._pygame_gui_manager,
+            container=self.__panel
+        )
+        self.__momentum_drift_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(local_config["momentumLabelRect"]),
+            text="",
+            manager=self._pygame_gui_manager,
+            container=self.__panel
+        )
+        self.__angular_momentum_drift_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(local_config["angularMomentumLabelRect"]),
+            text="",
+            manager=self._pygame_gui_manager,
+            container=self.__panel
+        )
+
+    def __update_diagnostics_readout(self):
+        if self.__diagnostics is None:
+            self.__diagnostics = self.environment.try_get_component(ConservationDiagnostics)
+
+            if self.__diagnostics is None:
+                return
+
+        sample = self.__diagnostics.last_sample
+        if sample is self.__shown_sample:
+            return
+
+        self.__shown_sample = sample
+
+        if sample is None:
+            drifts = ("-", "-", "-")
+        else:
+            drifts = (f"{sample.energy_drift:.2e}", f"{sample.momentum_drift:.2e}",
+                      f"{sample.angular_momentum_drift:.2e}")
+
+        self.__energy_drift_label.set_text("loc.energy_drift", text_kwargs={"drift": drifts[0]})
+        self.__momentum_drift_label.set_text("loc.momentum_drift", text_kwargs={"drift": drifts[1]})
+        self.__angular_momentum_drift_label.set_text("loc.angular_momentum_drift", text_kwargs={"drift": drifts[2]})
+
     def __create_language_menu(self):
         local_config = self.__config["languageMenuCfg"]
         self.__language_dropdown = pygame_gui.elements.UIDropDownMenu(
@@ -176,6 +230,19 @@ class LowerPanel(GUIPanel):
             self.__increase_timestep
         )
 
+        self.__auto_tune_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(local_config["autoTuneButtonRect"]),
+            text="loc.auto_dt_button",
+            manager=self._pygame_gui_manager,
+            container=self.__panel,
+            tool_tip_text="loc.auto_dt_tooltip"
+        )
+        self._ui_manager.add_callback(
+            pygame_gui.UI_BUTTON_PRESSED,
+            self.__auto_tune_button,
+            self.__start_dt_tuning
+        )
+
         self.__slow_down_button = pygame_gui.elements.UIButton(
             relative_rect=pygame.Rect(local_config["slowerButtonRect"]),
             text="◀◀1/2x",
@@ -189,6 +256,27 @@ class LowerPanel(GUIPanel):
             self.__decrease_timestep
         )
 
+    def __start_dt_tuning(self):
+        dt_tuner = self.environment.try_get_component(DtTuner)
+
+        if dt_tuner is not None and dt_tuner.start_tuning():
+            self.__auto_tune_button.set_text("loc.auto_dt_tuning")
+            self.__auto_tune_button.disable()
+
+    def __handle_dt_tuned_event(self, _: DtTunedEvent):
+        self.__reset_auto_tune_button()
+        self.__update_timestep_textbox()
+
+    def __handle_dt_tuning_cancelled_event(self, _: DtTuningCancelledEvent):
+        self.__reset_auto_tune_button()
+
+    def __handle_dt_tuning_failed_event(self, _: DtTuningFailedEvent):
+        self.__reset_auto_tune_button()
+
+    def __reset_auto_tune_button(self):
+        self.__auto_tune_button.set_text("loc.auto_dt_button")
+        self.__auto_tune_button.enable()
+
     def __decrease_timestep(self):
         new_dt = self.__time_settings.dt / 2
 
@@ -271,10 +359,18 @@ class LowerPanel(GUIPanel):
             for element in self.__elements:
                 element.on_step()
 
+        self.__update_diagnostics_readout()
+
     def _on_destroy(self):
         self.environment.event_system.remove_listener(PauseEvent, self.__handle_pause_event)
         self.environment.event_system.remove_listener(UnpauseEvent, self.__handle_unpause_event)
         self.environment.event_system.remove_listener(SimulationParametersChangedEvent,
                                                       self.__handle_parameters_change_event)
+        self.environment.event_system.remove_listener(DtTunedEvent, self.__handle_dt_tuned_event)
+        self.environment.event_system.remove_listener(DtTuningCancelledEvent,
+                                                      self.__handle_dt_tuning_cancelled_event)
+        self.environment.event_system.remove_listener(DtTuningFailedEvent, self.__handle_dt_tuning_failed_event)
+        self.__diagnostics = None
+        self.__shown_sample = None
 
         super()._on_destroy()
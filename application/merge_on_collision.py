@@ -1,33 +1,178 @@
-import pygame
-
-from sophysics_engine import CollisionListener, RigidBody
+from sophysics_engine import CollisionListener, RigidBody, EnvironmentComponent, PhysicsManager, \
+    CollisionResolutionEvent
+from .encounter_predictor import EncounterPredictedEvent
+from typing import Optional, Dict, List, Tuple
 import pymunk
+import math
 
 
-class MergeOnCollision(CollisionListener):
-    def begin(self, other_body: RigidBody, arbiter: pymunk.Arbiter) -> bool:
-        # if this body is lighter, than schedule itself for deletion
-        # it checks if the other body is scheduled for deletion
-        # because if they have the same mass, then the one that's deleted
-        # is the one that called this method first
-        if self._rigidbody.mass <= other_body.mass and \
-                other_body.sim_object not in self.sim_object.environment.to_be_destroyed_sim_objects:
-            self.sim_object.environment.destroy_after_step(self.sim_object)
-            return False
+class MergeManager(EnvironmentComponent):
+    """
+    Merges the bodies that collided during a physics step.
+
+    All the colliding pairs of a step are joined into clusters, and every cluster is merged into its heaviest body
+    at once. The merged body gets the total mass, the total momentum and the center of mass of the cluster,
+    and the rest of the bodies are destroyed at the end of the step.
+    The result doesn't depend on the order in which the collisions were reported.
+
+    The collisions predicted by the EncounterPredictor are merged too, so that the fast bodies are merged
+    even if they pass through each other during the step.
+    """
+    def __init__(self):
+        # the pairs of bodies that collided during the current step
+        self.__contacts: List[Tuple[RigidBody, RigidBody]] = []
+        self.__physics_manager: Optional[PhysicsManager] = None
+
+        super().__init__()
+
+    def setup(self):
+        super().setup()
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.environment.event_system.add_listener(CollisionResolutionEvent, self.__handle_collision_resolution_event)
+        self.environment.event_system.add_listener(EncounterPredictedEvent, self.__handle_encounter_predicted_event)
+
+    def add_contact(self, body1: RigidBody, body2: RigidBody):
+        """
+        Schedules 2 bodies to be merged at the end of the current step
+        """
+        self.__contacts.append((body1, body2))
+
+    def __handle_encounter_predicted_event(self, event: EncounterPredictedEvent):
+        for encounter in event.collisions:
+            if self.__merges_on_collision(encounter.body1) or self.__merges_on_collision(encounter.body2):
+                self.add_contact(encounter.body1, encounter.body2)
+
+    @staticmethod
+    def __merges_on_collision(body: RigidBody) -> bool:
+        return any(isinstance(listener, MergeOnCollision) for listener in body.collision_listeners)
+
+    def __handle_collision_resolution_event(self, _: CollisionResolutionEvent):
+        self.resolve_merges()
+
+    def resolve_merges(self):
+        """
+        Merges the clusters of the bodies that collided since the last call
+        """
+        if not self.__contacts:
+            return
+
+        contacts = self.__contacts
+        self.__contacts = []
+
+        to_be_destroyed = self.environment.to_be_destroyed_sim_objects
+        parents: Dict[RigidBody, RigidBody] = {}
+
+        def find(body: RigidBody) -> RigidBody:
+            root = body
+            while parents[root] is not root:
+                root = parents[root]
+
+            # path compression
+            while parents[body] is not root:
+                parents[body], body = root, parents[body]
+
+            return root
+
+        for body1, body2 in contacts:
+            # the bodies might have been removed by something else during the step
+            if body1.sim_object is None or body2.sim_object is None or \
+                    body1.sim_object in to_be_destroyed or body2.sim_object in to_be_destroyed:
+                continue
 
-        mass1, mass2 = self._rigidbody.mass, other_body.mass
-        pos1, pos2 = self.sim_object.transform.position, other_body.sim_object.transform.position
-        vel1, vel2 = map(pygame.Vector2, (self._rigidbody.velocity, other_body.velocity))
+            parents.setdefault(body1, body1)
+            parents.setdefault(body2, body2)
 
-        new_mass = mass1 + mass2
+            root1 = find(body1)
+            root2 = find(body2)
 
-        new_vel = (mass1 * vel1 + mass2 * vel2) / new_mass
-        new_pos = pymunk.Vec2d(*((mass1 * pos1 + mass2 * pos2) / new_mass))
+            if root1 is not root2:
+                parents[root2] = root1
 
-        self._rigidbody.mass = new_mass
-        self._rigidbody.shapes.copy().pop().mass = new_mass     # also need to change the mass on the shape
+        if not parents:
+            return
 
-        self._rigidbody.velocity = new_vel
-        self._rigidbody.body.position = new_pos
+        # the order of the space is used to break the ties and to destroy the bodies in a reproducible order
+        space_order = {body.rigidbody: i for i, body in enumerate(self.__physics_manager.space.bodies)}
 
+        clusters: Dict[RigidBody, List[RigidBody]] = {}
+        for body in sorted(parents, key=space_order.__getitem__):
+            clusters.setdefault(find(body), []).append(body)
+
+        absorbed: List[RigidBody] = []
+        for cluster in clusters.values():
+            absorbed.extend(self.__merge_cluster(cluster))
+
+        absorbed.sort(key=space_order.__getitem__)
+        for body in absorbed:
+            self.environment.destroy_after_step(body.sim_object)
+
+    @staticmethod
+    def __merge_cluster(cluster: List[RigidBody]) -> List[RigidBody]:
+        """
+        Merges the cluster into its heaviest body, returns the rest of the bodies
+        """
+        # the cluster is in the order of the space, so max() picks the first one of the equally heavy bodies
+        survivor = max(cluster, key=lambda body: body.mass)
+
+        masses = [body.mass for body in cluster]
+        positions = [body.sim_object.transform.position for body in cluster]
+        velocities = [body.velocity for body in cluster]
+
+        # fsum is exact, so the result doesn't depend on the order of the bodies
+        total_mass = math.fsum(masses)
+        position = (
+            math.fsum(mass * position.x for mass, position in zip(masses, positions)) / total_mass,
+            math.fsum(mass * position.y for mass, position in zip(masses, positions)) / total_mass
+        )
+        velocity = (
+            math.fsum(mass * velocity.x for mass, velocity in zip(masses, velocities)) / total_mass,
+            math.fsum(mass * velocity.y for mass, velocity in zip(masses, velocities)) / total_mass
+        )
+
+        survivor.mass = total_mass
+        for shape in survivor.shapes:
+            # pymunk computes the mass of the body from its shapes, so they have to be changed too
+            shape.mass = total_mass / len(survivor.shapes)
+
+        survivor.velocity = velocity
+        survivor.sim_object.transform.position = position
+        survivor.body.position = pymunk.Vec2d(*position)
+
+        return [body for body in cluster if body is not survivor]
+
+    def _on_destroy(self):
+        self.environment.event_system.remove_listener(
+            CollisionResolutionEvent,
+            self.__handle_collision_resolution_event
+        )
+        self.environment.event_system.remove_listener(
+            EncounterPredictedEvent,
+            self.__handle_encounter_predicted_event
+        )
+        self.__contacts.clear()
+        self.__physics_manager = None
+
+        super()._on_destroy()
+
+
+class MergeOnCollision(CollisionListener):
+    """
+    Merges the body with the bodies it collides with, through the MergeManager
+    """
+    def __init__(self):
+        self.__merge_manager: Optional[MergeManager] = None
+
+        super().__init__()
+
+    def setup(self):
+        super().setup()
+        self.__merge_manager = self.sim_object.environment.get_component(MergeManager)
+
+    def begin(self, other_body: RigidBody, arbiter: Optional[pymunk.Arbiter]) -> bool:
+        # if both bodies report the pair, it's merged only once anyway
+        self.__merge_manager.add_contact(self._rigidbody, other_body)
         return False
+
+    def _on_destroy(self):
+        self.__merge_manager = None
+        super()._on_destroy()
@@ -0,0 +1,338 @@
+"""
+Osculating Keplerian elements of the bodies relative to a primary body
+"""
+from sophysics_engine import EnvironmentComponent, Event, PhysicsManager, RigidBody, PostPhysicsUpdateEvent
+from defaults import AttractionManager, Attraction
+from .body_events import BodyCreatedEvent, BodyDeletedEvent, BodyStateEditedEvent
+from .reference_frame import ReferenceFrameManager, ReferenceFrameOriginChanged
+from .simulation_loader import SimulationLoadEvent
+from .snapshot import BodyColumns, FLAG_IS_ATTRACTOR
+from array import array
+from typing import NamedTuple, Optional, Dict, List, Tuple
+import pymunk
+import math
+import csv
+
+
+class OrbitalElements(NamedTuple):
+    # negative for the unbound orbits
+    semi_major_axis: float
+    eccentricity: float
+    # inf for the unbound orbits
+    period: float
+    periapsis: float
+    # inf for the unbound orbits
+    apoapsis: float
+    # the angles are in radians, counted from the x axis in the direction of the motion for the true anomaly
+    argument_of_periapsis: float
+    true_anomaly: float
+    specific_energy: float
+    # negative for the clockwise orbits
+    specific_angular_momentum: float
+
+
+_NO_ELEMENTS = OrbitalElements(*(math.nan for _ in OrbitalElements._fields))
+
+
+class OrbitalElementsTracker(EnvironmentComponent):
+    """
+    Computes the osculating orbital elements of all the bodies relative to the primary every few steps.
+
+    The primary is the origin of the ReferenceFrameManager unless another body is chosen,
+    and the most massive attractor if there's no origin either. The elements are computed for the two-body problem
+    of every body and the primary, with only the bodies that generate gravity pulling the other one.
+    They are cached until the next update, the edits of the bodies and the change of the primary
+    make the elements get computed again the next time they're requested.
+    """
+    def __init__(self, interval: int = 10):
+        """
+        :param interval: the number of steps between the updates
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self.__interval = interval
+        self.__step = 0
+        self.__update_count = 0
+        self.__is_stale = True
+        self.__body_count = 0
+
+        self.__chosen_primary: Optional[RigidBody] = None
+        self.__primary: Optional[RigidBody] = None
+        self.__bodies: List[RigidBody] = []
+        self.__indices: Dict[RigidBody, int] = {}
+        self.__columns: Dict[str, array] = {name: array("d") for name in OrbitalElements._fields}
+
+        self.__physics_manager: Optional[PhysicsManager] = None
+        self.__attraction_manager: Optional[AttractionManager] = None
+        self.__reference_frame_manager: Optional[ReferenceFrameManager] = None
+
+        super().__init__()
+
+    @property
+    def interval(self) -> int:
+        return self.__interval
+
+    @property
+    def update_count(self) -> int:
+        """
+        The number of times the elements were computed, changes whenever the cached elements do
+        """
+        return self.__update_count
+
+    @property
+    def primary(self) -> Optional[RigidBody]:
+        """
+        The body the orbits are computed around, None if there's no body to orbit.
+        Setting it to None makes the orbits be computed around the origin of the reference frame again
+        """
+        self.__refresh()
+        return self.__primary
+
+    @primary.setter
+    def primary(self, value: Optional[RigidBody]):
+        self.__chosen_primary = value
+        self.invalidate()
+
+    @property
+    def bodies(self) -> List[RigidBody]:
+        """
+        The bodies in the order of the columns, without the primary
+        """
+        self.__refresh()
+        return list(self.__bodies)
+
+    def setup(self):
+        super().setup()
+
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.__attraction_manager = self.environment.try_get_component(AttractionManager)
+        self.__reference_frame_manager = self.environment.try_get_component(ReferenceFrameManager)
+
+        event_system = self.environment.event_system
+        event_system.add_listener(PostPhysicsUpdateEvent, self.__handle_post_physics_update_event)
+        event_system.add_listener(ReferenceFrameOriginChanged, self.__handle_invalidating_event)
+        event_system.add_listener(BodyCreatedEvent, self.__handle_invalidating_event)
+        event_system.add_listener(BodyDeletedEvent, self.__handle_invalidating_event)
+        event_system.add_listener(BodyStateEditedEvent, self.__handle_invalidating_event)
+        event_system.add_listener(SimulationLoadEvent, self.__handle_invalidating_event)
+
+    def invalidate(self):
+        """
+        Makes the elements get computed again the next time they're requested
+        """
+        self.__is_stale = True
+
+    def __handle_invalidating_event(self, _: Event):
+        self.invalidate()
+
+    def __handle_post_physics_update_event(self, _: PostPhysicsUpdateEvent):
+        self.__step += 1
+
+        if self.__step % self.__interval == 0:
+            self.update()
+
+    def __refresh(self):
+        # the bodies can also be destroyed by merging, without any event
+        if self.__is_stale or len(self.__physics_manager.space.bodies) != self.__body_count:
+            self.update()
+
+    def get_elements(self, rigidbody: RigidBody) -> Optional[OrbitalElements]:
+        """
+        The cached elements of the body, None for the primary, the bodies that don't orbit anything
+        and the bodies that were added since the last update
+        """
+        self.__refresh()
+
+        index = self.__indices.get(rigidbody, None)
+        if index is None:
+            return None
+
+        elements = OrbitalElements(*(self.__columns[name][index] for name in OrbitalElements._fields))
+        return None if math.isnan(elements.eccentricity) else elements
+
+    def get_arrays(self) -> List[Tuple[str, array]]:
+        """
+        The columns of the elements, in the order of the bodies. The bodies that don't orbit anything have NaNs
+        """
+        self.__refresh()
+        return [(name, array("d", self.__columns[name])) for name in OrbitalElements._fields]
+
+    def write_csv(self, path):
+        """
+        Writes the name and the elements of every body to a CSV file
+        """
+        self.__refresh()
+
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(("name",) + OrbitalElements._fields)
+
+            columns = [self.__columns[name] for name in OrbitalElements._fields]
+            for rigidbody, row in zip(self.__bodies, zip(*columns)):
+                writer.writerow((rigidbody.sim_object.tag,) + row)
+
+    def __find_primary(self) -> Optional[RigidBody]:
+        for primary in (self.__chosen_primary,
+                        self.__reference_frame_manager.origin_body if self.__reference_frame_manager else None):
+            # the primary might have been destroyed (e.g. merged into another body)
+            if primary is not None and primary.sim_object is not None:
+                return primary
+
+        attractors = [body.rigidbody for body in self.__physics_manager.space.bodies if _is_attractor(body.rigidbody)]
+        return max(attractors, key=lambda rigidbody: rigidbody.mass, default=None)
+
+    def update(self):
+        """
+        Computes the elements of all the bodies at once
+        """
+        self.__is_stale = False
+        self.__update_count += 1
+
+        self.__body_count = len(self.__physics_manager.space.bodies)
+
+        primary = self.__find_primary()
+        dynamic = pymunk.Body.DYNAMIC
+        bodies = [body.rigidbody for body in self.__physics_manager.space.bodies
+                  if body.body_type == dynamic and body.rigidbody is not primary]
+
+        self.__primary = primary
+        self.__bodies = bodies
+        self.__indices = {rigidbody: i for i, rigidbody in enumerate(bodies)}
+
+        if primary is None or self.__attraction_manager is None:
+            rows = [_NO_ELEMENTS] * len(bodies)
+        else:
+            coefficient = self.__attraction_manager.attraction_coefficient
+            primary_position = primary.sim_object.transform.position
+            primary_velocity = primary.velocity
+            # the part of the gravitational parameter that comes from the primary
+            primary_parameter = coefficient * primary.mass if _is_attractor(primary) else 0.0
+
+            positions = [rigidbody.sim_object.transform.position for rigidbody in bodies]
+            velocities = [rigidbody.velocity for rigidbody in bodies]
+            parameters = [primary_parameter + coefficient * rigidbody.mass if _is_attractor(rigidbody)
+                          else primary_parameter for rigidbody in bodies]
+
+            rows = list(map(
+                _get_orbital_elements,
+                [position.x - primary_position.x for position in positions],
+                [position.y - primary_position.y for position in positions],
+                [velocity.x - primary_velocity.x for velocity in velocities],
+                [velocity.y - primary_velocity.y for velocity in velocities],
+                parameters
+            ))
+
+        # transposing the rows into the columns
+        columns = zip(*rows) if rows else ((),) * len(OrbitalElements._fields)
+        self.__columns = {name: array("d", column) for name, column in zip(OrbitalElements._fields, columns)}
+
+    def _on_destroy(self):
+        event_system = self.environment.event_system
+        event_system.remove_listener(PostPhysicsUpdateEvent, self.__handle_post_physics_update_event)
+        event_system.remove_listener(ReferenceFrameOriginChanged, self.__handle_invalidating_event)
+        event_system.remove_listener(BodyCreatedEvent, self.__handle_invalidating_event)
+        event_system.remove_listener(BodyDeletedEvent, self.__handle_invalidating_event)
+        event_system.remove_listener(BodyStateEditedEvent, self.__handle_invalidating_event)
+        event_system.remove_listener(SimulationLoadEvent, self.__handle_invalidating_event)
+
+        self.__chosen_primary = None
+        self.__primary = None
+        self.__bodies = []
+        self.__indices = {}
+
+        self.__physics_manager = None
+        self.__attraction_manager = None
+        self.__reference_frame_manager = None
+
+        super()._on_destroy()
+
+
+def _is_attractor(rigidbody: RigidBody) -> bool:
+    attraction = rigidbody.sim_object.try_get_component(Attraction)
+    return attraction is not None and attraction.is_attractor
+
+
+def get_shortest_period(columns: BodyColumns, attraction_coefficient: float) -> float:
+    """
+    The shortest orbital period of the bodies, inf if none of them is on a bound orbit.
+
+    Every body is paired with the attractor that pulls it the hardest, so the moons orbit their planets
+    rather than the star. Takes time proportional to the number of bodies times the number of attractors
+    """
+    xs = columns["position_x"]
+    ys = columns["position_y"]
+    velocity_xs = columns["velocity_x"]
+    velocity_ys = columns["velocity_y"]
+    masses = columns["mass"]
+    flags = columns["flags"]
+
+    attractors = [j for j, flag in enumerate(flags) if flag & FLAG_IS_ATTRACTOR]
+    shortest_period = math.inf
+
+    for i, (x, y, mass, flag) in enumerate(zip(xs, ys, masses, flags)):
+        primary = -1
+        max_pull = 0.0
+
+        for j in attractors:
+            distance_squared = (xs[j] - x) ** 2 + (ys[j] - y) ** 2
+
+            if j != i and distance_squared > 0 and masses[j] / distance_squared > max_pull:
+                primary = j
+                max_pull = masses[j] / distance_squared
+
+        if primary < 0:
+            continue
+
+        gravitational_parameter = attraction_coefficient * (
+            masses[primary] + mass if flag & FLAG_IS_ATTRACTOR else masses[primary]
+        )
+        elements = _get_orbital_elements(x - xs[primary], y - ys[primary], velocity_xs[i] - velocity_xs[primary],
+                                         velocity_ys[i] - velocity_ys[primary], gravitational_parameter)
+
+        # NaN for the degenerate orbits, the comparison is false then
+        if elements.period < shortest_period:
+            shortest_period = elements.period
+
+    return shortest_period
+
+
+def _get_orbital_elements(x: float, y: float, velocity_x: float, velocity_y: float,
+                          gravitational_parameter: float) -> OrbitalElements:
+    """
+    The elements of the orbit with the given position and velocity relative to the primary
+    """
+    distance = math.hypot(x, y)
+    if distance == 0 or gravitational_parameter <= 0:
+        return _NO_ELEMENTS
+
+    speed_squared = velocity_x * velocity_x + velocity_y * velocity_y
+    radial_velocity = x * velocity_x + y * velocity_y
+    angular_momentum = x * velocity_y - y * velocity_x
+    energy = speed_squared / 2 - gravitational_parameter / distance
+
+    # the eccentricity vector points at the periapsis
+    factor = speed_squared - gravitational_parameter / distance
+    eccentricity_x = (factor * x - radial_velocity * velocity_x) / gravitational_parameter
+    eccentricity_y = (factor * y - radial_velocity * velocity_y) / gravitational_parameter
+    eccentricity = math.hypot(eccentricity_x, eccentricity_y)
+
+    argument_of_periapsis = math.atan2(eccentricity_y, eccentricity_x) % math.tau
+    true_anomaly = math.atan2(y, x) - argument_of_periapsis
+    if angular_momentum < 0:
+        true_anomaly = -true_anomaly
+
+    # this works for all the conics, unlike a * (1 - e)
+    periapsis = angular_momentum * angular_momentum / (gravitational_parameter * (1 + eccentricity))
+
+    if energy < 0:
+        semi_major_axis = -gravitational_parameter / (2 * energy)
+        period = math.tau * math.sqrt(semi_major_axis ** 3 / gravitational_parameter)
+        apoapsis = semi_major_axis * (1 + eccentricity)
+    else:
+        semi_major_axis = -gravitational_parameter / (2 * energy) if energy > 0 else math.inf
+        period = math.inf
+        apoapsis = math.inf
+
+    return OrbitalElements(semi_major_axis, eccentricity, period, periapsis, apoapsis, argument_of_periapsis,
+                           true_anomaly % math.tau, energy, angular_momentum)
@@ -1,17 +1,12 @@
-import pymunk
-
-from sophysics_engine import EnvironmentComponent, MonoBehavior, GlobalBehavior, RigidBody, Event, Camera
+from __future__ import annotations
+from sophysics_engine import EnvironmentComponent, GlobalBehavior, RigidBody, Event, Camera, Color
+from defaults import VelocityVectorRenderer
 from .trail_renderer import TrailResetEvent
-from typing import Optional
+from typing import Optional, Sequence, Union
 import pygame
 
 
-class ReferenceFrameCalculateOffsetEvent(Event):
-    pass
-
-
-class ReferenceFrameUpdateValuesEvent(Event):
-    pass
+number = Union[int, float]
 
 
 class ReferenceFrameOriginChanged(Event):
@@ -26,13 +21,19 @@ class ReferenceFrameOriginChanged(Event):
 class ReferenceFrameManager(GlobalBehavior):
     """
     Holds info, about which object is currently the origin
+
+    The simulation itself always runs in the inertial frame, the origin is only applied as an offset
+    when the scene is rendered, displayed or saved.
     """
     def __init__(self):
         self.__origin_body: Optional[RigidBody] = None
-        self.__body_changed: bool = False
+        self.__camera: Optional[Camera] = None
 
         super().__init__()
 
+    def _start(self):
+        self.__camera = self.environment.try_get_component(Camera)
+
     @property
     def origin_body(self) -> Optional[RigidBody]:
         return self.__origin_body
@@ -40,65 +41,115 @@ class ReferenceFrameManager(GlobalBehavior):
     @origin_body.setter
     def origin_body(self, value: Optional[RigidBody]):
         self.__origin_body = value
-        self.__body_changed = True
+
+        # the camera adjuster needs the old origin to still be applied to the camera
+        self.environment.event_system.raise_event(ReferenceFrameOriginChanged(value))
+
+        if self.__camera is not None:
+            self.__camera.origin = value.sim_object.transform if value is not None else None
+
+        self.environment.event_system.raise_event(TrailResetEvent())
+
+    @property
+    def position_offset(self) -> pygame.Vector2:
+        """
+        The world position of the origin
+        """
+        if self.__origin_body is None:
+            return pygame.Vector2()
+
+        return self.__origin_body.sim_object.transform.position.copy()
+
+    @property
+    def velocity_offset(self) -> pygame.Vector2:
+        """
+        The world velocity of the origin
+        """
+        if self.__origin_body is None:
+            return pygame.Vector2()
+
+        return pygame.Vector2(self.__origin_body.velocity)
+
+    def to_relative_position(self, position: Sequence[number]) -> pygame.Vector2:
+        """
+        Converts a world position into the position relative to the origin
+        """
+        return pygame.Vector2(position[0], position[1]) - self.position_offset
+
+    def to_world_position(self, position: Sequence[number]) -> pygame.Vector2:
+        """
+        Converts a position relative to the origin into the world position
+        """
+        return pygame.Vector2(position[0], position[1]) + self.position_offset
+
+    def to_relative_velocity(self, velocity: Sequence[number]) -> pygame.Vector2:
+        """
+        Converts a world velocity into the velocity relative to the origin
+        """
+        return pygame.Vector2(velocity[0], velocity[1]) - self.velocity_offset
+
+    def to_world_velocity(self, velocity: Sequence[number]) -> pygame.Vector2:
+        """
+        Converts a velocity relative to the origin into the world velocity
+        """
+        return pygame.Vector2(velocity[0], velocity[1]) + self.velocity_offset
+
+    def __check_origin_exists(self):
+        # the origin might have been destroyed (e.g. merged into another body)
+        if self.__origin_body is not None and self.__origin_body.sim_object is None:
+            self.origin_body = None
 
     def _physics_update(self):
-        if self.__body_changed:
-            self.environment.event_system.raise_event(ReferenceFrameOriginChanged(self.origin_body))
+        self.__check_origin_exists()
 
-        if self.origin_body is not None:
-            if self.origin_body.sim_object is not None:
-                self.environment.event_system.raise_event(ReferenceFrameCalculateOffsetEvent())
-                self.environment.event_system.raise_event(ReferenceFrameUpdateValuesEvent())
+    def _update(self):
+        self.__check_origin_exists()
 
-            else:
-                self.origin_body = None
 
-        if self.__body_changed:
-            self.environment.event_system.raise_event(TrailResetEvent())
-            self.__body_changed = False
+class RelativeVelocityVectorRenderer(VelocityVectorRenderer):
+    """
+    Renders the velocity of the object relative to the origin of the reference frame
+    """
+    def __init__(self, scale_factor: float = 1.0, base_radius: int = 1, arrow_width: int = 1,
+                 arrow_head_length: int = 10, arrow_head_width: int = 10, color = Color.WHITE, layer: int = 0):
+        self.__reference_frame_manager: Optional[ReferenceFrameManager] = None
 
+        super().__init__(scale_factor, base_radius, arrow_width, arrow_head_length, arrow_head_width, color, layer)
 
-class ReferenceFrame(MonoBehavior):
-    def _start(self):
-        self.__rigidbody: RigidBody = self.sim_object.get_component(RigidBody)
-        self.__position_offset = pygame.Vector2()
-        self.__velocity_offset = pymunk.Vec2d(0, 0)
+    def setup(self):
+        self.__reference_frame_manager = self.sim_object.environment.try_get_component(ReferenceFrameManager)
 
-        self.__reference_frame_manager: ReferenceFrameManager = \
-            self.sim_object.environment.try_get_component(ReferenceFrameManager)
+        super().setup()
 
-        if self.__reference_frame_manager is None:
-            self.__reference_frame_manager = ReferenceFrameManager()
-            self.sim_object.environment.attach_component(self.__reference_frame_manager)
+    def get_vector(self) -> pygame.Vector2:
+        velocity = super().get_vector()
 
-        self.sim_object.environment.event_system.add_listener(
-            ReferenceFrameCalculateOffsetEvent, self.__handle_calculate_offset_event)
+        if self.__reference_frame_manager is None:
+            return velocity
 
-        self.sim_object.environment.event_system.add_listener(
-            ReferenceFrameUpdateValuesEvent, self.__handle_reference_update_event
-        )
+        return self.__reference_frame_manager.to_relative_velocity(velocity)
 
-    def __handle_calculate_offset_event(self, _: ReferenceFrameCalculateOffsetEvent):
-        origin = self.__reference_frame_manager.origin_body
+    def _on_destroy(self):
+        self.__reference_frame_manager = None
 
-        self.__position_offset = origin.sim_object.transform.position.copy()
-        self.__velocity_offset = origin.velocity
+        super()._on_destroy()
 
-    def __handle_reference_update_event(self, _: ReferenceFrameUpdateValuesEvent):
-        self.__rigidbody.sim_object.transform.position -= self.__position_offset
-        self.__rigidbody.velocity -= self.__velocity_offset
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[RelativeVelocityVectorRenderer]):
+        if cls._on_destroy is not RelativeVelocityVectorRenderer._on_destroy:
+            cls._on_destroy_each(components)
+            return
 
-    def _end(self):
-        self.sim_object.environment.event_system.remove_listener(
-            ReferenceFrameCalculateOffsetEvent, self.__handle_calculate_offset_event)
+        for renderer in components:
+            renderer.__reference_frame_manager = None
 
-        self.sim_object.environment.event_system.remove_listener(
-            ReferenceFrameUpdateValuesEvent, self.__handle_reference_update_event
-        )
+        cls._batch_on_destroy_renderers(components)
 
 
 class ReferenceFrameCameraAdjuster(EnvironmentComponent):
+    """
+    Moves the camera when the origin changes, so that the view doesn't jump
+    """
     def __init__(self, camera: Camera):
         self.__camera = camera
 
@@ -109,19 +160,18 @@ class ReferenceFrameCameraAdjuster(EnvironmentComponent):
 
     def __handle_origin_change_event(self, event: ReferenceFrameOriginChanged):
         if event.new_origin is None:
-            return
-
-        new_origin_point = event.new_origin.sim_object.transform.position
+            new_origin_point = pygame.Vector2()
+        else:
+            new_origin_point = event.new_origin.sim_object.transform.position
 
         self.__adjust_camera(new_origin_point)
 
     def __adjust_camera(self, new_origin_point: pygame.Vector2):
-        screen_origin_point = pygame.Vector2(self.__camera.world_to_screen(new_origin_point))
-        offset_from_origin = self.__camera.position - screen_origin_point
-
-        new_camera_position = pygame.Vector2(self.__camera.world_to_screen((0, 0))) + offset_from_origin
+        # how much everything on the screen would move, once the new origin is applied
+        displacement = (new_origin_point - self.__camera.origin_offset) * self.__camera.pixels_per_unit
 
-        self.__camera.position = new_camera_position
+        # the y axis is flipped on the screen
+        self.__camera.position -= pygame.Vector2(displacement.x, -displacement.y)
 
     def _on_destroy(self):
         self.environment.event_system.remove_listener(ReferenceFrameOriginChanged, self.__handle_origin_change_event)
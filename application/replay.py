@@ -0,0 +1,324 @@
+"""
+Recording and replaying of interactive sessions.
+
+A replay consists of a snapshot of the simulation at the start of the recording and a JSON Lines log of every
+command that changed the state of the simulation, together with the number of physics steps that were advanced
+before the command was applied. The bodies are referred to by their index in the physics space.
+"""
+from sophysics_engine import GlobalBehavior, SimEnvironment, TimeSettings, PhysicsManager, RigidBody, Camera, \
+    PygameEvent, TimeStepChangedEvent
+from .body_events import BodyCreatedEvent, BodyDeletedEvent, BodyStateEditedEvent
+from .celestial_body import get_physics_body, set_body_mass, set_body_radius
+from .headless import get_simulation_settings, get_headless_environment, get_physics_bodies
+from .reference_frame import ReferenceFrameManager, ReferenceFrameOriginChanged
+from .save_simulation import save_simulation_snapshot
+from .simulation_loader import SimulationLoader, SimulationLoadEvent
+from .snapshot import SNAPSHOT_EXTENSION, read_snapshot
+from typing import Optional, Dict, Tuple, List, TextIO
+from weakref import WeakKeyDictionary
+import pygame
+import hashlib
+import struct
+import json
+import time
+import os
+
+
+REPLAY_VERSION = 1
+REPLAY_EXTENSION = ".jsonl"
+
+_BODY_STATE = struct.Struct("<ddddd")
+
+
+def get_state_checksum(physics_manager: PhysicsManager) -> str:
+    """
+    A hash of the positions, velocities and masses of all the bodies, in the order of the physics space
+    """
+    state_hash = hashlib.sha256()
+
+    for body in physics_manager.space.bodies:
+        position = body.position
+        velocity = body.velocity
+        state_hash.update(_BODY_STATE.pack(position.x, position.y, velocity.x, velocity.y, body.mass))
+
+    return state_hash.hexdigest()
+
+
+class ReplayRecorder(GlobalBehavior):
+    """
+    Records the user's edits into a replay, that can be re-executed by play_replay.
+
+    When the recording starts, the simulation is saved into a snapshot and loaded back from it,
+    so that the recorded session starts from exactly the same state as the replay.
+    """
+    def __init__(self, directory: str, toggle_key: Optional[int] = None):
+        """
+        :param directory: the directory to save the replays into
+        :param toggle_key: a pygame key code of the key that starts and stops the recording
+        """
+        self.__directory = directory
+        self.__toggle_key = toggle_key
+
+        self.__log: Optional[TextIO] = None
+        self.__step = 0
+
+        # the commands are held back for a bit, so that repeated edits of the same attribute
+        # (e.g. dragging a body) are written as one command
+        self.__pending_command: Optional[Dict] = None
+
+        self.__body_indices: WeakKeyDictionary[RigidBody, int] = WeakKeyDictionary()
+        self.__body_count = 0
+
+        self.__physics_manager: Optional[PhysicsManager] = None
+        self.__time_settings: Optional[TimeSettings] = None
+
+        super().__init__()
+
+    @property
+    def is_recording(self) -> bool:
+        return self.__log is not None
+
+    def _start(self):
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.__time_settings = self.environment.get_component(TimeSettings)
+
+        event_system = self.environment.event_system
+        event_system.add_listener(PygameEvent, self.__handle_pygame_event)
+        event_system.add_listener(SimulationLoadEvent, self.__handle_simulation_load_event)
+
+    def start_recording(self) -> str:
+        """
+        Starts recording, returns the path to the replay log
+        """
+        if self.is_recording:
+            self.stop_recording()
+
+        os.makedirs(self.__directory, exist_ok=True)
+        base_path = os.path.join(self.__directory, time.strftime("replay_%Y%m%d_%H%M%S"))
+        snapshot_path = base_path + SNAPSHOT_EXTENSION
+        log_path = base_path + REPLAY_EXTENSION
+
+        save_simulation_snapshot(snapshot_path, self.environment, self.environment.get_component(Camera))
+        self.environment.get_component(SimulationLoader).load_simulation_from_snapshot(snapshot_path)
+
+        self.__body_indices.clear()
+        self.__body_count = 0
+        for body in self.__physics_manager.space.bodies:
+            self.__add_body(body.rigidbody)
+
+        self.__step = 0
+        self.__pending_command = None
+
+        self.__log = open(log_path, "w", encoding="utf-8")
+        self.__write({
+            "type": "header",
+            "version": REPLAY_VERSION,
+            "snapshot": os.path.basename(snapshot_path),
+            **get_simulation_settings(self.environment)
+        })
+
+        event_system = self.environment.event_system
+        event_system.add_listener(BodyCreatedEvent, self.__handle_body_created_event)
+        event_system.add_listener(BodyDeletedEvent, self.__handle_body_deleted_event)
+        event_system.add_listener(BodyStateEditedEvent, self.__handle_body_state_edited_event)
+        event_system.add_listener(TimeStepChangedEvent, self.__handle_time_step_changed_event)
+        event_system.add_listener(ReferenceFrameOriginChanged, self.__handle_origin_changed_event)
+
+        return log_path
+
+    def stop_recording(self):
+        if not self.is_recording:
+            return
+
+        event_system = self.environment.event_system
+        event_system.remove_listener(BodyCreatedEvent, self.__handle_body_created_event)
+        event_system.remove_listener(BodyDeletedEvent, self.__handle_body_deleted_event)
+        event_system.remove_listener(BodyStateEditedEvent, self.__handle_body_state_edited_event)
+        event_system.remove_listener(TimeStepChangedEvent, self.__handle_time_step_changed_event)
+        event_system.remove_listener(ReferenceFrameOriginChanged, self.__handle_origin_changed_event)
+
+        self.__flush_pending_command()
+        self.__write({"step": self.__step, "type": "end", "checksum": get_state_checksum(self.__physics_manager)})
+
+        self.__log.close()
+        self.__log = None
+        self.__body_indices.clear()
+
+    def __add_body(self, rigidbody: RigidBody):
+        self.__body_indices[rigidbody] = self.__body_count
+        self.__body_count += 1
+
+    def __write(self, command: Dict):
+        self.__log.write(json.dumps(command))
+        self.__log.write("\n")
+
+    def __flush_pending_command(self):
+        if self.__pending_command is not None:
+            self.__write(self.__pending_command)
+            self.__pending_command = None
+
+    def __add_command(self, command: Dict):
+        command["step"] = self.__step
+
+        pending = self.__pending_command
+        if pending is not None and pending["type"] == "edit" and command["type"] == "edit" and \
+                pending["step"] == command["step"] and pending["body"] == command["body"] and \
+                pending["attribute"] == command["attribute"]:
+            # only the last value matters
+            self.__pending_command = command
+            return
+
+        self.__flush_pending_command()
+        self.__pending_command = command
+
+    def __handle_body_created_event(self, event: BodyCreatedEvent):
+        parameters = dict(event.parameters)
+        parameters["color"] = list(pygame.Color(parameters["color"]))
+
+        self.__add_body(event.sim_object.get_component(RigidBody))
+        self.__add_command({"type": "create", "parameters": parameters})
+
+    def __handle_body_deleted_event(self, event: BodyDeletedEvent):
+        index = self.__body_indices.get(event.rigidbody, None)
+        if index is None:
+            return
+
+        self.__add_command({"type": "delete", "body": index})
+
+    def __handle_body_state_edited_event(self, event: BodyStateEditedEvent):
+        index = self.__body_indices.get(event.rigidbody, None)
+        if index is None:
+            return
+
+        value = event.value
+        if isinstance(value, tuple):
+            value = list(value)
+
+        self.__add_command({"type": "edit", "body": index, "attribute": event.attribute, "value": value})
+
+    def __handle_time_step_changed_event(self, event: TimeStepChangedEvent):
+        self.__add_command({"type": "dt", "value": event.dt})
+
+    def __handle_origin_changed_event(self, event: ReferenceFrameOriginChanged):
+        index = self.__body_indices.get(event.new_origin, None) if event.new_origin is not None else None
+        self.__add_command({"type": "origin", "body": index})
+
+    def __handle_simulation_load_event(self, _: SimulationLoadEvent):
+        # a loaded simulation has nothing to do with the recorded one
+        self.stop_recording()
+
+    def __handle_pygame_event(self, event: PygameEvent):
+        pygame_event = event.pygame_event
+
+        if self.__toggle_key is None or pygame_event.type != pygame.KEYDOWN or pygame_event.key != self.__toggle_key:
+            return
+
+        if self.is_recording:
+            self.stop_recording()
+        else:
+            self.start_recording()
+
+        event.consume()
+
+    def _physics_update(self):
+        if not self.is_recording:
+            return
+
+        self.__flush_pending_command()
+        self.__step += 1
+
+    def _end(self):
+        self.stop_recording()
+
+        event_system = self.environment.event_system
+        event_system.remove_listener(PygameEvent, self.__handle_pygame_event)
+        event_system.remove_listener(SimulationLoadEvent, self.__handle_simulation_load_event)
+
+        self.__physics_manager = None
+        self.__time_settings = None
+
+
+def play_replay(log_path) -> Tuple[SimEnvironment, Optional[bool]]:
+    """
+    Re-executes a recorded session without rendering, as fast as possible.
+
+    Returns the environment in the final state, and whether the final state is identical to the recorded one
+    (None if the recording wasn't finished properly).
+    """
+    with open(log_path, "r", encoding="utf-8") as log:
+        header = json.loads(log.readline())
+
+        if header.get("type") != "header" or header.get("version") != REPLAY_VERSION:
+            raise ValueError("the file is not a supported replay")
+
+        snapshot_path = os.path.join(os.path.dirname(log_path), header["snapshot"])
+        snapshot_header, columns = read_snapshot(snapshot_path)
+
+        # the older replays don't have all the settings, the missing ones get the values they used to have
+        environment = get_headless_environment(snapshot_header["time_settings"]["dt"], header)
+        time_settings = environment.get_component(TimeSettings)
+        physics_manager = environment.get_component(PhysicsManager)
+        reference_frame_manager = environment.get_component(ReferenceFrameManager)
+
+        rigidbodies: List[Optional[RigidBody]] = []
+        environment.attach_sim_objects(get_physics_bodies(columns))
+
+        for body in physics_manager.space.bodies:
+            rigidbodies.append(body.rigidbody)
+
+        step = 0
+        matched: Optional[bool] = None
+
+        for line in log:
+            command = json.loads(line)
+
+            while step < command["step"]:
+                environment.advance()
+                step += 1
+
+            command_type = command["type"]
+
+            if command_type == "create":
+                parameters = command["parameters"]
+                body = get_physics_body(
+                    name=parameters["name"],
+                    initial_position=parameters["initial_position"],
+                    initial_velocity=parameters["initial_velocity"],
+                    mass=parameters["mass"],
+                    radius=parameters["radius"],
+                    is_attractor=parameters["is_attractor"]
+                )
+                environment.attach_sim_object(body)
+                rigidbodies.append(body.get_component(RigidBody))
+
+            elif command_type == "delete":
+                rigidbodies[command["body"]].sim_object.destroy()
+
+            elif command_type == "edit":
+                _apply_edit(rigidbodies[command["body"]], command["attribute"], command["value"])
+
+            elif command_type == "dt":
+                time_settings.dt = command["value"]
+
+            elif command_type == "origin":
+                index = command["body"]
+                reference_frame_manager.origin_body = rigidbodies[index] if index is not None else None
+
+            elif command_type == "end":
+                matched = command["checksum"] == get_state_checksum(physics_manager)
+                break
+
+    return environment, matched
+
+
+def _apply_edit(rigidbody: RigidBody, attribute: str, value):
+    if attribute == BodyStateEditedEvent.POSITION:
+        rigidbody.sim_object.transform.position = tuple(value)
+    elif attribute == BodyStateEditedEvent.VELOCITY:
+        rigidbody.velocity = value
+    elif attribute == BodyStateEditedEvent.MASS:
+        set_body_mass(rigidbody, value)
+    elif attribute == BodyStateEditedEvent.RADIUS:
+        set_body_radius(rigidbody, value)
+    else:
+        raise ValueError(f"unknown attribute '{attribute}'")
@@ -3,7 +3,11 @@ from defaults import CircleRenderer, Attraction
 from .reference_frame import ReferenceFrameManager
 from .trail_renderer import TrailRenderer
 from .velocity_controller import VelocityController
-from typing import Optional, Dict, List
+from .snapshot import BodyColumns, write_snapshot
+from .snapshot_series import SnapshotSeriesWriter
+from .dt_tuner import DtTuner
+from typing import Optional, Dict, List, Tuple
+import pygame
 import json
 
 
@@ -19,7 +23,45 @@ def save_simulation_to_json(file, environment: SimEnvironment, camera: Optional[
         f.write(json_string)
 
 
-def get_simulation_dict(environment: SimEnvironment, camera: Optional[Camera]) -> Dict:
+def save_simulation_snapshot(file, environment: SimEnvironment, camera: Optional[Camera]):
+    """
+    Saves the current state of the simulation into a binary snapshot file
+    """
+    settings_dict, columns = get_snapshot_data(environment, camera)
+
+    write_snapshot(file, settings_dict, columns)
+
+
+def append_simulation_to_series(writer: SnapshotSeriesWriter, environment: SimEnvironment, camera: Optional[Camera]):
+    """
+    Appends the current state of the simulation to a snapshot series
+    """
+    settings_dict, columns = get_snapshot_data(environment, camera)
+
+    writer.append(settings_dict, columns)
+
+
+def get_snapshot_data(environment: SimEnvironment, camera: Optional[Camera]) -> Tuple[Dict, BodyColumns]:
+    """
+    Copies the current state of the simulation into the settings and the body columns of a snapshot.
+    The returned values don't reference the simulation, so they can be written from another thread.
+    """
+    settings_dict = get_settings_dict(environment, camera)
+
+    reference_frame_manager: ReferenceFrameManager = environment.get_component(ReferenceFrameManager)
+    columns = BodyColumns.from_environment(
+        environment,
+        reference_frame_manager.position_offset,
+        reference_frame_manager.velocity_offset
+    )
+
+    return settings_dict, columns
+
+
+def get_settings_dict(environment: SimEnvironment, camera: Optional[Camera]) -> Dict:
+    """
+    Returns everything that's saved about the simulation, except for the bodies
+    """
     # save the time settings
     time_settings: TimeSettings = environment.get_component(TimeSettings)
     time_settings_dict = {
@@ -28,6 +70,14 @@ def get_simulation_dict(environment: SimEnvironment, camera: Optional[Camera]) -
         "paused": time_settings.paused
     }
 
+    # remember how the time step was chosen, if it was tuned automatically
+    dt_tuner: Optional[DtTuner] = environment.try_get_component(DtTuner)
+    if dt_tuner is not None and dt_tuner.last_result is not None and dt_tuner.last_result.dt == time_settings.dt:
+        time_settings_dict["auto_tune"] = {
+            "tolerance": dt_tuner.last_result.tolerance,
+            "energy_drift": dt_tuner.last_result.energy_drift
+        }
+
     # save the camera settings
     camera_settings_dict = {
         "units_per_pixel": camera.units_per_pixel,
@@ -43,27 +93,44 @@ def get_simulation_dict(environment: SimEnvironment, camera: Optional[Camera]) -
     origin = reference_frame_manager.origin_body
     origin_id = id(origin)
 
+    settings_dict = {
+        "origin_id": origin_id,
+        "velocity_vector_scale_factor": velocity_vector_scale_factor,
+        "time_settings": time_settings_dict,
+        "camera_settings": camera_settings_dict
+    }
+
+    return settings_dict
+
+
+def get_simulation_dict(environment: SimEnvironment, camera: Optional[Camera]) -> Dict:
+    simulation_dict = get_settings_dict(environment, camera)
+
+    reference_frame_manager: ReferenceFrameManager = environment.get_component(ReferenceFrameManager)
+
     # get the bodies
     bodies = []
 
+    # bodies are saved relative to the origin
+    position_offset = reference_frame_manager.position_offset
+    velocity_offset = reference_frame_manager.velocity_offset
+
     for sim_object in environment.sim_objects:
-        body_dict = get_body_dict(sim_object)
+        body_dict = get_body_dict(sim_object, position_offset, velocity_offset)
 
         if body_dict is not None:
             bodies.append(body_dict)
 
-    simulation_dict = {
-        "origin_id": origin_id,
-        "velocity_vector_scale_factor": velocity_vector_scale_factor,
-        "time_settings": time_settings_dict,
-        "camera_settings": camera_settings_dict,
-        "bodies": bodies
-    }
+    simulation_dict["bodies"] = bodies
 
     return simulation_dict
 
 
-def get_body_dict(sim_object: SimObject) -> Optional[Dict]:
+def get_body_dict(sim_object: SimObject, position_offset: Optional[pygame.Vector2] = None,
+                  velocity_offset: Optional[pygame.Vector2] = None) -> Optional[Dict]:
+    """
+    Returns the parameters of the body, with its position and velocity relative to the given offsets
+    """
     rigidbody: Optional[RigidBody] = sim_object.try_get_component(RigidBody)
     if rigidbody is None:
         return None
@@ -82,11 +149,20 @@ def get_body_dict(sim_object: SimObject) -> Optional[Dict]:
             circle_renderer = r
             break
 
+    position = pygame.Vector2(sim_object.transform.position)
+    velocity = pygame.Vector2(rigidbody.velocity)
+
+    if position_offset is not None:
+        position -= position_offset
+
+    if velocity_offset is not None:
+        velocity -= velocity_offset
+
     # parameters
     parameters = {
         "name": sim_object.tag,
-        "initial_position": list(sim_object.transform.position),
-        "initial_velocity": list(rigidbody.velocity),
+        "initial_position": list(position),
+        "initial_velocity": list(velocity),
         "mass": rigidbody.mass,
         "radius": circle_renderer.radius,
         "min_screen_radius": circle_renderer.min_pixel_radius,
@@ -10,6 +10,7 @@ from typing import Optional, List
 
 from .select_renderer import SelectionRenderer
 from .trail_renderer import TrailRenderer
+from .body_events import BodyStateEditedEvent
 
 
 class SelectionUpdateEvent(Event):
@@ -123,7 +124,11 @@ class BodyController(CircleClickable):
     def _on_hold(self):
         self.screen_position = pygame.Vector2(pygame.mouse.get_pos()) - self.__mouse_offset_from_body
 
-        self.sim_object.environment.event_system.raise_event(SelectedBodyPositionUpdateEvent())
+        event_system = self.sim_object.environment.event_system
+        event_system.raise_event(SelectedBodyPositionUpdateEvent())
+        event_system.raise_event(BodyStateEditedEvent(
+            self.__rigidbody, BodyStateEditedEvent.POSITION, tuple(self.sim_object.transform.position)
+        ))
 
     def _on_hold_end(self):
         self.__mouse_offset_from_body = None
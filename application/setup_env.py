@@ -12,6 +12,15 @@ from .upper_panel import UpperPanel
 from .side_panel import SidePanel
 from .body_creator import BodyCreator
 from .simulation_loader import SimulationLoader
+from .trail_renderer import TrailCache
+from .trajectory_recorder import TrajectoryRecorder
+from .checkpointer import Checkpointer
+from .replay import ReplayRecorder
+from .merge_on_collision import MergeManager
+from .encounter_predictor import EncounterPredictor
+from .conservation_diagnostics import ConservationDiagnostics
+from .dt_tuner import DtTuner
+from .orbital_elements import OrbitalElementsTracker
 from typing import Dict
 
 
@@ -20,7 +29,7 @@ def get_environment_from_config(display: pygame.Surface, config: Dict) -> SimEnv
     As a config, pass it an "environmentCfg" dictionary
     """
     time_settings = TimeSettings(**config["timeSettingsArgs"])
-    physics_manager = PhysicsManager()
+    physics_manager = PhysicsManager(**config["physicsManagerArgs"])
     camera = Camera(display, **config["cameraArgs"])
     pygame_ui_manager = pygame_gui.UIManager(
         window_resolution=display.get_size(),
@@ -38,10 +47,14 @@ def get_environment_from_config(display: pygame.Surface, config: Dict) -> SimEnv
         cam_controller_config["min_camera_scale"]
     )
 
-    attraction_manager = AttractionManager(config["attractionCfg"]["attraction_coefficient"])
+    attraction_manager = AttractionManager(**config["attractionCfg"])
+    merge_manager = MergeManager()
 
     clickable_manager_config = config["clickableManagerCfg"]
-    clickable_manager = ClickableManager(pygame.Rect(clickable_manager_config["rect"]))
+    clickable_manager = ClickableManager(
+        pygame.Rect(clickable_manager_config["rect"]),
+        cell_size=clickable_manager_config["cell_size"]
+    )
 
     selection_config = config["globalSelectionCfg"]
     global_selection = GlobalSelection(
@@ -78,15 +91,30 @@ def get_environment_from_config(display: pygame.Surface, config: Dict) -> SimEnv
     body_creator_renderer = CircleRenderer(layer=body_creator_config["layer"])
     body_creator_object = SimObject("body creator", (body_creator_component,  body_creator_renderer))
 
-    sim_loader = SimulationLoader(config["celestialBodyCfg"], camera)
+    sim_loader_config = config["simulationLoaderCfg"]
+    sim_loader = SimulationLoader(
+        celestial_body_config=config["celestialBodyCfg"],
+        camera=camera,
+        streaming_threshold=sim_loader_config["streaming_threshold"],
+        bodies_per_frame=sim_loader_config["bodies_per_frame"],
+        chunk_size=sim_loader_config["chunk_size"]
+    )
 
     pause_on_spacebar = PauseOnSpacebar()
 
+    trail_cache = TrailCache()
+
+    replay_recorder_config = config["replayRecorderCfg"]
+    replay_recorder = ReplayRecorder(
+        directory=replay_recorder_config["directory"],
+        toggle_key=pygame.key.key_code(replay_recorder_config["toggle_key"])
+    )
+
     env = SimEnvironment((), (
         time_settings, physics_manager, camera, gui_manager_component,
         event_processor, time_control_panel, camera_controller, pause_on_spacebar,
-        attraction_manager, global_selection, vel_controller, reference_frame_manager,
-        camera_adjuster, clickable_manager, upper_panel, sim_loader
+        attraction_manager, merge_manager, global_selection, vel_controller, reference_frame_manager,
+        camera_adjuster, clickable_manager, upper_panel, sim_loader, trail_cache, replay_recorder
     ))
 
     env.attach_sim_object(body_creator_object)
@@ -94,4 +122,59 @@ def get_environment_from_config(display: pygame.Surface, config: Dict) -> SimEnv
     side_panel = SidePanel(config["sidePanelCfg"], body_creator_component)
     env.attach_component(side_panel)
 
+    trajectory_recorder_config = config["trajectoryRecorderCfg"]
+    if trajectory_recorder_config["enabled"]:
+        trajectory_recorder = TrajectoryRecorder(
+            path=trajectory_recorder_config["path"],
+            record_every=trajectory_recorder_config["record_every"],
+            max_bodies=trajectory_recorder_config["max_bodies"],
+            capacity=trajectory_recorder_config["capacity"],
+            flush_every=trajectory_recorder_config["flush_every"]
+        )
+        env.attach_component(trajectory_recorder)
+
+    checkpointer_config = config["checkpointerCfg"]
+    if checkpointer_config["enabled"]:
+        checkpointer = Checkpointer(
+            directory=checkpointer_config["directory"],
+            interval=checkpointer_config["interval"],
+            interval_type=checkpointer_config["interval_type"],
+            keep=checkpointer_config["keep"]
+        )
+        env.attach_component(checkpointer)
+
+    encounter_predictor_config = config["encounterPredictorCfg"]
+    if encounter_predictor_config["enabled"]:
+        encounter_predictor = EncounterPredictor(
+            close_pass_factor=encounter_predictor_config["close_pass_factor"],
+            use_substeps=encounter_predictor_config["use_substeps"]
+        )
+        env.attach_component(encounter_predictor)
+
+    diagnostics_config = config["diagnosticsCfg"]
+    if diagnostics_config["enabled"]:
+        diagnostics = ConservationDiagnostics(
+            interval=diagnostics_config["interval"],
+            threshold=diagnostics_config["threshold"]
+        )
+        env.attach_component(diagnostics)
+
+    dt_tuner_config = config["dtTunerCfg"]
+    if dt_tuner_config["enabled"]:
+        dt_tuner = DtTuner(
+            tolerance=dt_tuner_config["tolerance"],
+            candidate_factors=dt_tuner_config["candidate_factors"],
+            period_fraction=dt_tuner_config["period_fraction"],
+            probe_steps=dt_tuner_config["probe_steps"],
+            min_probe_steps=dt_tuner_config["min_probe_steps"],
+            max_probe_steps=dt_tuner_config["max_probe_steps"],
+            max_workers=dt_tuner_config["max_workers"]
+        )
+        env.attach_component(dt_tuner)
+
+    orbital_elements_config = config["orbitalElementsCfg"]
+    if orbital_elements_config["enabled"]:
+        orbital_elements_tracker = OrbitalElementsTracker(interval=orbital_elements_config["interval"])
+        env.attach_component(orbital_elements_tracker)
+
     return env
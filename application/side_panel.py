@@ -1,6 +1,5 @@
 import pygame
 import pygame_gui
-import pymunk
 import math
 
 from sophysics_engine import GUIPanel, TimeSettings, UnpauseEvent
@@ -9,7 +8,10 @@ from .velocity_controller import SelectedBodyVelocityUpdateEvent
 from .ui_elements import UIElement, TextBox, SwitchButtons
 from .reference_frame import ReferenceFrameManager
 from .body_creator import BodyCreator
-from typing import Dict, Optional, List
+from .body_events import BodyStateEditedEvent, BodyDeletedEvent
+from .celestial_body import set_body_mass, set_body_radius
+from .orbital_elements import OrbitalElementsTracker, OrbitalElements
+from typing import Dict, Optional, List, Tuple
 
 # I hate this fucking code so much, it's so fucking shitty
 # if I had more time, I'd fucking nuke it and do it the right way
@@ -23,6 +25,10 @@ class SidePanel(GUIPanel):
         self.__elements: List[UIElement] = []
         self.__selected_body: Optional[BodyController] = None
 
+        self.__orbital_elements_tracker: Optional[OrbitalElementsTracker] = None
+        # the selected body and its elements that are shown in the orbit labels
+        self.__shown_orbit: Optional[Tuple[Optional[BodyController], Optional[OrbitalElements]]] = None
+
         super().__init__()
 
     @property
@@ -711,6 +717,13 @@ class SidePanel(GUIPanel):
         )
         self.__elements.append(self.__origin_switch)
 
+        # orbit around the primary, the tracker may be attached later, so the labels are always created
+        self.__semi_major_axis_label = self.__create_orbit_label(local_config["semi_major_axis_label_rect"],
+                                                                 "#semi_major_axis_label")
+        self.__eccentricity_label = self.__create_orbit_label(local_config["eccentricity_label_rect"],
+                                                              "#eccentricity_label")
+        self.__period_label = self.__create_orbit_label(local_config["period_label_rect"], "#period_label")
+
         # delete button
         self.__delete_button = pygame_gui.elements.UIButton(
             relative_rect=pygame.Rect(local_config["delete_button_rect"]),
@@ -724,6 +737,43 @@ class SidePanel(GUIPanel):
             self.__on_delete_button_pressed
         )
 
+    def __create_orbit_label(self, rect: List[int], object_id: str) -> pygame_gui.elements.UILabel:
+        return pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(rect),
+            text="",
+            manager=self._pygame_gui_manager,
+            container=self.__info_panel,
+            object_id=pygame_gui.core.ObjectID(
+                class_id="@info_labels",
+                object_id=object_id
+            )
+        )
+
+    def __update_orbit_labels(self):
+        if self.__orbital_elements_tracker is None:
+            self.__orbital_elements_tracker = self.environment.try_get_component(OrbitalElementsTracker)
+
+        elements = None
+        if self.__orbital_elements_tracker is not None and self.__selected_body is not None:
+            elements = self.__orbital_elements_tracker.get_elements(self.__selected_body.rigidbody)
+
+        orbit = (self.__selected_body, elements)
+        if orbit == self.__shown_orbit:
+            return
+
+        self.__shown_orbit = orbit
+
+        if elements is None:
+            values = ("-", "-", "-")
+        else:
+            # the period of the unbound orbits is infinite
+            period = f"{elements.period:.6g}" if math.isfinite(elements.period) else "-"
+            values = (f"{elements.semi_major_axis:.6g}", f"{elements.eccentricity:.6g}", period)
+
+        self.__semi_major_axis_label.set_text("loc.semi_major_axis", text_kwargs={"value": values[0]})
+        self.__eccentricity_label.set_text("loc.eccentricity", text_kwargs={"value": values[1]})
+        self.__period_label.set_text("loc.period", text_kwargs={"value": values[2]})
+
     def __on_delete_button_pressed(self):
         if self.__selected_body is None:
             return
@@ -731,6 +781,7 @@ class SidePanel(GUIPanel):
         if self.__selected_body.rigidbody is self.__reference_frame_manager.origin_body:
             self.__reference_frame_manager.origin_body = None
 
+        self.environment.event_system.raise_event(BodyDeletedEvent(self.__selected_body.rigidbody))
         self.__selected_body.sim_object.destroy()
 
     def __on_origin_change(self):
@@ -781,13 +832,14 @@ class SidePanel(GUIPanel):
             if not (math.isfinite(value_x) and math.isfinite(value_y)):
                 raise ValueError()
 
-            initial_vector = tuple(rigidbody.velocity)
-            new_vector = (value_x, value_y)
+            initial_vector = self.__reference_frame_manager.to_relative_velocity(rigidbody.velocity)
+            new_vector = pygame.Vector2(value_x, value_y)
 
             if new_vector == initial_vector:
                 return
 
-            rigidbody.velocity = (value_x, value_y)
+            rigidbody.velocity = self.__reference_frame_manager.to_world_velocity(new_vector)
+            self.__raise_edit_event(BodyStateEditedEvent.VELOCITY, tuple(rigidbody.velocity))
 
         except ValueError:
             pass
@@ -802,7 +854,7 @@ class SidePanel(GUIPanel):
         rigidbody = self.__selected_body.rigidbody
 
         try:
-            initial_vector = pygame.Vector2(rigidbody.velocity)
+            initial_vector = self.__reference_frame_manager.to_relative_velocity(rigidbody.velocity)
             scalar = float(text)
 
             if not math.isfinite(scalar):
@@ -814,7 +866,8 @@ class SidePanel(GUIPanel):
             if new_vector == initial_vector:
                 return
 
-            rigidbody.velocity = new_vector
+            rigidbody.velocity = self.__reference_frame_manager.to_world_velocity(new_vector)
+            self.__raise_edit_event(BodyStateEditedEvent.VELOCITY, tuple(rigidbody.velocity))
         except ValueError:
             pass
 
@@ -824,9 +877,9 @@ class SidePanel(GUIPanel):
         if self.__selected_body is None:
             return
 
-        velocity = self.__selected_body.rigidbody.velocity
+        velocity = self.__reference_frame_manager.to_relative_velocity(self.__selected_body.rigidbody.velocity)
 
-        self.__velocity_textbox.set_text(str(velocity.length))
+        self.__velocity_textbox.set_text(str(velocity.length()))
         self.__velocity_x_textbox.set_text(str(velocity.x))
         self.__velocity_y_textbox.set_text(str(velocity.y))
 
@@ -843,7 +896,9 @@ class SidePanel(GUIPanel):
             if not (math.isfinite(value_x) and math.isfinite(value_y)):
                 raise ValueError()
 
-            self.__selected_body.sim_object.transform.position = (value_x, value_y)
+            new_position = self.__reference_frame_manager.to_world_position((value_x, value_y))
+            self.__selected_body.sim_object.transform.position = new_position
+            self.__raise_edit_event(BodyStateEditedEvent.POSITION, tuple(new_position))
 
         except ValueError:
             self.__update_position_textboxes()
@@ -852,7 +907,9 @@ class SidePanel(GUIPanel):
         if self.__selected_body is None:
             return
 
-        position = self.__selected_body.sim_object.transform.position
+        position = self.__reference_frame_manager.to_relative_position(
+            self.__selected_body.sim_object.transform.position
+        )
         if self.__position_x_textbox.text != str(position.x):
             self.__position_x_textbox.set_text(str(position.x))
 
@@ -871,11 +928,12 @@ class SidePanel(GUIPanel):
                 raise ValueError()
 
             self.__selected_body.radius = value
-            circle: pymunk.Circle = self.__selected_body.rigidbody.shapes.copy().pop()  # type: ignore
-            circle.unsafe_set_radius(value)
+            set_body_radius(self.__selected_body.rigidbody, value)
             for renderer in self.__selected_body.renderers:
                 renderer.radius = value
 
+            self.__raise_edit_event(BodyStateEditedEvent.RADIUS, value)
+
         except ValueError:
             self.__update_radius_textbox()
 
@@ -890,17 +948,18 @@ class SidePanel(GUIPanel):
             if value <= 0 or not math.isfinite(value):
                 raise ValueError()
 
-            self.__selected_body.rigidbody.mass = value
-
-            # so, changing the radius resets the mass for some obscure reason (it actually does make a little sense)
-            # so, we're gonna change the mass of the shape as well
-            circle: pymunk.Circle = self.__selected_body.rigidbody.shapes.copy().pop()  # type: ignore
-            circle.mass = value
+            set_body_mass(self.__selected_body.rigidbody, value)
+            self.__raise_edit_event(BodyStateEditedEvent.MASS, value)
         except ValueError:
             pass
 
         self.__update_mass_textbox()
 
+    def __raise_edit_event(self, attribute: str, value):
+        self.environment.event_system.raise_event(
+            BodyStateEditedEvent(self.__selected_body.rigidbody, attribute, value)
+        )
+
     def __update_mass_textbox(self):
         if self.__selected_body is None:
             return
@@ -1026,6 +1085,9 @@ class SidePanel(GUIPanel):
             for element in self.__elements:
                 element.on_step()
 
+        if self.__info_panel.is_enabled:
+            self.__update_orbit_labels()
+
     def _on_destroy(self):
         self.environment.event_system.remove_listener(SelectionUpdateEvent, self.__handle_selection_update_event)
         self.environment.event_system.remove_listener(UnpauseEvent, self.__on_unpause)
@@ -1033,5 +1095,6 @@ class SidePanel(GUIPanel):
                                                       self.__handle_position_update_event)
         self.environment.event_system.remove_listener(SelectedBodyVelocityUpdateEvent,
                                                       self.__handle_velocity_update_event)
+        self.__orbital_elements_tracker = None
 
         super()._on_destroy()
@@ -1,16 +1,21 @@
 import pygame
 import pygame_gui
 
-from sophysics_engine import EnvironmentComponent, Camera, Event, TimeSettings, GUIManager, RigidBody
+from sophysics_engine import EnvironmentComponent, Camera, Event, TimeSettings, GUIManager, RigidBody, PhysicsManager, \
+    SimObject, EnvironmentUpdateEvent
 from defaults import Attraction
-from typing import Optional, Dict, List, Union
-from .celestial_body import get_celestial_body
+from typing import Optional, Dict, List, Union, Tuple, Iterator, Any, BinaryIO
+from .celestial_body import prepare_celestial_body_config, create_celestial_body
 from .reference_frame import ReferenceFrameManager
 from defaults import VelocityVectorRenderer
 from .velocity_controller import VelocityController
 from .body_creator import BodyCreator
+from .snapshot import BodyColumns, is_snapshot_file, read_snapshot, FLAG_IS_ATTRACTOR, FLAG_DRAW_TRAIL
+from .snapshot_series import SnapshotSeriesReader, is_snapshot_series_file
+from .json_stream import JSONObjectStream
 import math
 import json
+import os
 
 
 class SimulationLoadEvent(Event):
@@ -28,18 +33,54 @@ class SimulationParametersChangedEvent(Event):
 
 class SimulationLoader(EnvironmentComponent):
     """
-    Loads the simulation from a JSON file
+    Loads the simulation from a JSON file or a binary snapshot.
+
+    Big JSON files are streamed: the bodies are parsed and created a few at a time over several frames,
+    while the simulation is paused and the progress is shown on the screen.
     """
-    def __init__(self, celestial_body_config: Dict, camera: Camera):
+    def __init__(self, celestial_body_config: Dict, camera: Camera, streaming_threshold: Optional[int] = None,
+                 bodies_per_frame: int = 1000, chunk_size: int = 1 << 16):
+        """
+        :param streaming_threshold: JSON files of at least this size in bytes are streamed, None to never stream
+        :param bodies_per_frame: the number of bodies created per frame while streaming
+        :param chunk_size: the number of bytes read from the file at once while streaming
+        """
+        if bodies_per_frame <= 0:
+            raise ValueError("bodies_per_frame must be positive")
+
         self.__camera = camera
         self.__celestial_body_config = celestial_body_config
+        self.__streaming_threshold = streaming_threshold
+        self.__bodies_per_frame = bodies_per_frame
+        self.__chunk_size = chunk_size
+
         self.__time_settings: Optional[TimeSettings] = None
         self.__gui_manager: Optional[GUIManager] = None
         self.__reference_frame_manager: Optional[ReferenceFrameManager] = None
         self.__velocity_controller: Optional[VelocityController] = None
 
+        # the state of the file that's being streamed
+        self.__stream_file: Optional[BinaryIO] = None
+        self.__stream: Optional[JSONObjectStream] = None
+        self.__stream_iterator: Optional[Iterator[Tuple[str, Any]]] = None
+        self.__stream_size = 1
+        self.__stream_settings: Dict = {}
+        self.__stream_bodies_by_id: Dict[int, RigidBody] = {}
+        self.__stream_body_count = 0
+        self.__was_paused = False
+
+        self.__progress_panel: Optional[pygame_gui.elements.UIPanel] = None
+        self.__progress_bar: Optional[pygame_gui.elements.UIProgressBar] = None
+
         super().__init__()
 
+    @property
+    def is_streaming(self) -> bool:
+        """
+        Whether a JSON file is being loaded over several frames right now
+        """
+        return self.__stream_iterator is not None
+
     def setup(self):
         self.__time_settings = self.environment.get_component(TimeSettings)
         self.__gui_manager = self.environment.get_component(GUIManager)
@@ -51,10 +92,69 @@ class SimulationLoader(EnvironmentComponent):
         super().setup()
 
     def __handle_simulation_load_event(self, event: SimulationLoadEvent):
-        self.load_simulation_from_json(event.path)
+        self.load_simulation(event.path)
+
+    def load_simulation(self, path):
+        """
+        Loads the simulation from a snapshot, a snapshot series (the last frame of it) or a JSON file,
+        depending on the contents of the file
+        """
+        self.__stop_streaming()
+
+        try:
+            is_snapshot = is_snapshot_file(path)
+            is_series = not is_snapshot and is_snapshot_series_file(path)
+        except OSError as e:
+            self.__create_warning_window("loc.error", f"Could not load the file. {repr(e)}")
+            return
+
+        if is_snapshot:
+            self.load_simulation_from_snapshot(path)
+        elif is_series:
+            self.load_simulation_from_series(path)
+        else:
+            self.load_simulation_from_json(path)
+
+    def load_simulation_from_snapshot(self, path):
+        self.__stop_streaming()
+
+        try:
+            header, columns = read_snapshot(path)
+            self.__load_from_snapshot(header, columns)
+
+            self.environment.event_system.raise_event(SimulationParametersChangedEvent())
+
+        except (ValueError, TypeError, KeyError) as e:
+            self.__create_warning_window("loc.error", f"Could not load the file. {repr(e)}")
+
+    def load_simulation_from_series(self, path, index: int = -1):
+        """
+        Loads a frame of a snapshot series, the last one by default
+        """
+        self.__stop_streaming()
+
+        try:
+            with SnapshotSeriesReader(path) as reader:
+                if len(reader) == 0:
+                    raise ValueError("the snapshot series is empty")
+
+                header, columns = reader.get_frame(index)
+
+            self.__load_from_snapshot(header, columns)
+
+            self.environment.event_system.raise_event(SimulationParametersChangedEvent())
+
+        except (ValueError, TypeError, KeyError, IndexError, OSError) as e:
+            self.__create_warning_window("loc.error", f"Could not load the file. {repr(e)}")
 
     def load_simulation_from_json(self, path):
+        self.__stop_streaming()
+
         try:
+            if self.__streaming_threshold is not None and os.path.getsize(path) >= self.__streaming_threshold:
+                self.__start_streaming(path)
+                return
+
             with open(path, "r", encoding="utf-8") as file:
                 json_string = file.read()
 
@@ -63,29 +163,177 @@ class SimulationLoader(EnvironmentComponent):
 
             self.environment.event_system.raise_event(SimulationParametersChangedEvent())
 
-        except (ValueError, TypeError, KeyError) as e:
+        except (ValueError, TypeError, KeyError, OSError) as e:
             self.__create_warning_window("loc.error", f"Could not load the file. {repr(e)}")
 
-    def __load_from_dict(self, simulation_dict: Dict):
+    def __start_streaming(self, path):
+        """
+        Starts loading a JSON file over several frames. The current simulation is cleared right away.
+        """
+        self.__stream_file = open(path, "rb")
+        self.__stream_size = max(os.path.getsize(path), 1)
+        self.__stream = JSONObjectStream(self.__stream_file, "bodies", self.__chunk_size)
+        self.__stream_iterator = iter(self.__stream)
+        self.__stream_settings = {}
+        self.__stream_bodies_by_id = {}
+        self.__stream_body_count = 0
+
         self.__clear_current_simulation()
 
-        origin_id: Optional[int] = simulation_dict.get("origin_id", None)
-        time_settings_config: Optional[Dict] = simulation_dict.get("time_settings", None)
-        camera_settings: Optional[Dict] = simulation_dict.get("camera_settings", None)
-        velocity_scale_factor: Optional[float] = simulation_dict.get("velocity_vector_scale_factor", None)
+        # the bodies shouldn't move until all of them are there
+        self.__was_paused = self.__time_settings.paused
+        self.__time_settings.paused = True
 
-        if time_settings_config is not None:
-            self.__set_time_settings(time_settings_config)
+        self.__create_progress_bar()
+        self.environment.event_system.add_listener(EnvironmentUpdateEvent, self.__handle_update_event)
 
-        if camera_settings is not None:
-            self.__set_camera(camera_settings)
+    def __handle_update_event(self, _: EnvironmentUpdateEvent):
+        try:
+            self.__stream_next_bodies()
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            # not leaving a half loaded simulation
+            self.__stop_streaming()
+            self.__clear_current_simulation()
+            self.__create_warning_window("loc.error", f"Could not load the file. {repr(e)}")
+
+    def __stream_next_bodies(self):
+        body_dicts = []
+        is_finished = True
+
+        for key, value in self.__stream_iterator:
+            if key != "bodies":
+                self.__stream_settings[key] = value
+                continue
+
+            body_dicts.append(value)
+
+            if len(body_dicts) >= self.__bodies_per_frame:
+                is_finished = False
+                break
+
+        columns = BodyColumns.from_body_dicts(body_dicts, index_offset=self.__stream_body_count)
+        columns.validate(index_offset=self.__stream_body_count)
+        self.__stream_body_count += len(columns)
+
+        new_bodies = self.__create_bodies_from_columns(columns)
+        self.environment.attach_sim_objects(new_bodies)
+
+        for body_id, body in zip(columns["id"], new_bodies):
+            self.__stream_bodies_by_id[body_id] = body.get_component(RigidBody)
+
+        self.__progress_bar.set_current_progress(100 * self.__stream.bytes_read / self.__stream_size)
+
+        if is_finished:
+            self.__finish_streaming()
+
+    def __finish_streaming(self):
+        settings = self.__stream_settings
+        bodies_by_id = self.__stream_bodies_by_id
+
+        if not self.__stream.has_streamed_array:
+            raise KeyError("bodies")
+
+        self.__stop_streaming()
+
+        self.__load_time_settings(settings)
+
+        origin_id: Optional[int] = settings.get("origin_id", None)
+        self.__reference_frame_manager.origin_body = bodies_by_id.get(origin_id, None) \
+            if origin_id is not None else None
+
+        self.__load_view_settings(settings)
 
+        self.environment.event_system.raise_event(SimulationParametersChangedEvent())
+
+    def __stop_streaming(self):
+        """
+        Stops streaming the current file, the bodies that were already loaded are left in the simulation
+        """
+        if not self.is_streaming:
+            return
+
+        self.environment.event_system.remove_listener(EnvironmentUpdateEvent, self.__handle_update_event)
+
+        self.__stream_file.close()
+        self.__stream_file = None
+        self.__stream = None
+        self.__stream_iterator = None
+        self.__stream_settings = {}
+        self.__stream_bodies_by_id = {}
+
+        self.__progress_panel.kill()
+        self.__progress_panel = None
+        self.__progress_bar = None
+
+        self.__time_settings.paused = self.__was_paused
+
+    def __create_progress_bar(self):
+        screen_width, screen_height = self.__gui_manager.ui_manager.window_resolution
+        rect = pygame.Rect(0, 0, 400, 75)
+        rect.center = (screen_width // 2, screen_height // 2)
+
+        self.__progress_panel = pygame_gui.elements.UIPanel(
+            relative_rect=rect,
+            starting_layer_height=10,
+            manager=self.__gui_manager.ui_manager
+        )
+
+        pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(10, 5, 374, 25),
+            text="loc.loading",
+            manager=self.__gui_manager.ui_manager,
+            container=self.__progress_panel
+        )
+
+        self.__progress_bar = pygame_gui.elements.UIProgressBar(
+            relative_rect=pygame.Rect(10, 35, 374, 25),
+            manager=self.__gui_manager.ui_manager,
+            container=self.__progress_panel
+        )
+
+    def __load_from_dict(self, simulation_dict: Dict):
         bodies = simulation_dict["bodies"]
 
         if not isinstance(bodies, list):
             raise TypeError("'bodies' attribute must be a list")
 
-        self.__load_bodies(bodies, origin_id)
+        # validating before clearing, so that a broken file doesn't leave an empty simulation
+        columns = BodyColumns.from_body_dicts(bodies)
+        columns.validate()
+
+        self.__clear_current_simulation()
+
+        origin_id: Optional[int] = simulation_dict.get("origin_id", None)
+
+        self.__load_time_settings(simulation_dict)
+        self.__load_bodies_from_columns(columns, origin_id)
+        self.__load_view_settings(simulation_dict)
+
+    def __load_from_snapshot(self, header: Dict, columns: BodyColumns):
+        # validating before clearing, so that a broken file doesn't leave an empty simulation
+        columns.validate()
+
+        self.__clear_current_simulation()
+
+        origin_id: Optional[int] = header.get("origin_id", None)
+
+        self.__load_time_settings(header)
+        self.__load_bodies_from_columns(columns, origin_id)
+        self.__load_view_settings(header)
+
+    def __load_time_settings(self, settings: Dict):
+        time_settings_config: Optional[Dict] = settings.get("time_settings", None)
+
+        if time_settings_config is not None:
+            self.__set_time_settings(time_settings_config)
+
+    def __load_view_settings(self, settings: Dict):
+        camera_settings: Optional[Dict] = settings.get("camera_settings", None)
+        velocity_scale_factor: Optional[float] = settings.get("velocity_vector_scale_factor", None)
+
+        # the camera is set after the origin, so that the saved camera position isn't adjusted to the new origin
+        if camera_settings is not None:
+            self.__set_camera(camera_settings)
 
         if velocity_scale_factor is not None:
             self.__set_scale_factor(velocity_scale_factor)
@@ -110,72 +358,57 @@ class SimulationLoader(EnvironmentComponent):
 
             velocity_renderer.scale_factor = velocity_scale_factor
 
-    def __load_bodies(self, bodies: List, origin_id: Optional[int]):
-        new_bodies = []
+    def __load_bodies_from_columns(self, columns: BodyColumns, origin_id: Optional[int]):
+        new_bodies = self.__create_bodies_from_columns(columns)
         new_origin = None
 
-        for body in bodies:
-            body_id = body.get("id", None)
-            body_parameters = body["parameters"]
-            self.__validate_body_parameters(body_parameters)
-
-            body = get_celestial_body(
-                config=self.__celestial_body_config,
-                camera=self.__camera,
-                **body_parameters
-            )
-
-            new_bodies.append(body)
-
-            if origin_id is not None and body_id is not None and origin_id == body_id:
-                rigidbody = body.get_component(RigidBody)
-                new_origin = rigidbody
+        if origin_id is not None:
+            for body_id, body in zip(columns["id"], new_bodies):
+                if body_id == origin_id:
+                    new_origin = body.get_component(RigidBody)
+                    break
 
-        for body in new_bodies:
-            self.environment.attach_sim_object(body)
+        self.environment.attach_sim_objects(new_bodies)
 
         self.__reference_frame_manager.origin_body = new_origin
 
-    def __validate_body_parameters(self, parameters: Dict):
-        if not isinstance(parameters["name"], str):
-            raise TypeError("'name' parameter must be a string")
-
-        if not self.__is_vector_compatible(parameters["initial_position"]):
-            raise TypeError("'initial_position' parameter must be a vector-like")
-
-        if not self.__is_vector_compatible(parameters["initial_velocity"]):
-            raise TypeError("'initial_velocity' parameter must be a vector-like")
-
-        if not self.__is_positive_number(parameters["mass"]):
-            raise TypeError("'mass' parameter must be a positive number")
-
-        if not self.__is_positive_number(parameters["radius"]):
-            raise TypeError("'radius' parameter must be a positive number")
-
-        if not isinstance(parameters["is_attractor"], bool):
-            raise TypeError("'is_attractor' parameter must be a bool")
-
-        if not isinstance(parameters["min_screen_radius"], int):
-            raise TypeError("'min_screen_radius' must be an int")
-
-        if not parameters["min_screen_radius"] >= 0:
-            raise ValueError("'min_screen_radius' parameter can't be negative")
-
-        if not isinstance(parameters["draw_layer"], int):
-            raise TypeError("'draw_layer' parameter must be an int")
-
-        if not 1 <= parameters["draw_layer"] <= 3:
-            raise ValueError("the only allowed values for draw layer are 1, 2, or 3")
+    def __create_bodies_from_columns(self, columns: BodyColumns) -> List[SimObject]:
+        new_bodies = []
 
-        if parameters.get("draw_trail", None) is not None and not isinstance(parameters["draw_trail"], bool):
-            raise TypeError("'draw_trail' parameter must be a bool")
+        position_x = columns["position_x"]
+        position_y = columns["position_y"]
+        velocity_x = columns["velocity_x"]
+        velocity_y = columns["velocity_y"]
+        mass = columns["mass"]
+        radius = columns["radius"]
+        min_screen_radius = columns["min_screen_radius"]
+        draw_layer = columns["draw_layer"]
+        flags = columns["flags"]
+        trail_vertex_distance = columns["trail_vertex_distance"]
+
+        # the config is the same for all the bodies, so it's only read once
+        config = prepare_celestial_body_config(self.__celestial_body_config)
+
+        for i in range(len(columns)):
+            body = create_celestial_body(
+                config=config,
+                camera=self.__camera,
+                name=columns.get_name(i),
+                initial_position=[position_x[i], position_y[i]],
+                initial_velocity=[velocity_x[i], velocity_y[i]],
+                mass=mass[i],
+                radius=radius[i],
+                is_attractor=bool(flags[i] & FLAG_IS_ATTRACTOR),
+                min_screen_radius=min_screen_radius[i],
+                color=columns.get_color(i),
+                draw_layer=draw_layer[i],
+                draw_trail=bool(flags[i] & FLAG_DRAW_TRAIL),
+                trail_vertex_distance=trail_vertex_distance[i]
+            )
 
-        if parameters.get("trail_vertex_distance", None) is not None and\
-                not self.__is_positive_number(parameters["trail_vertex_distance"]):
-            raise ValueError("'trail_vertex_distance' parameter must be a positive number")
+            new_bodies.append(body)
 
-        # make sure it converts
-        pygame.Color(parameters["color"])
+        return new_bodies
 
     @staticmethod
     def __is_positive_number(number: Union[int, float]) -> bool:
@@ -190,28 +423,18 @@ class SimulationLoader(EnvironmentComponent):
 
         return True
 
-    @staticmethod
-    def __is_vector_compatible(value: List) -> bool:
-        if not isinstance(value, list):
-            return False
-
-        if not len(value) == 2:
-            return False
-
-        if not (math.isfinite(value[0]) and math.isfinite(value[1])):
-            return False
-
-        return True
-
     def __clear_current_simulation(self):
         """
         Destroys all objects that have an Attraction component.
         """
-        for sim_object in self.environment.sim_objects.copy():
-            if not sim_object.has_component(Attraction):
-                continue
+        self.environment.destroy_sim_objects(
+            [sim_object for sim_object in self.environment.sim_objects if sim_object.has_component(Attraction)]
+        )
 
-            sim_object.destroy()
+        # a fresh space makes the loaded simulation reproducible, regardless of what was simulated before
+        physics_manager: PhysicsManager = self.environment.get_component(PhysicsManager)
+        if not physics_manager.space.bodies and not physics_manager.space.shapes:
+            physics_manager.reset_space()
 
     def __set_time_settings(self, time_settings: Dict):
         dt = time_settings.get("dt", None)
@@ -264,6 +487,7 @@ class SimulationLoader(EnvironmentComponent):
         )
 
     def _on_destroy(self):
+        self.__stop_streaming()
         self.environment.event_system.remove_listener(SimulationLoadEvent, self.__handle_simulation_load_event)
         self.__time_settings = None
         self.__gui_manager = None
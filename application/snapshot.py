@@ -0,0 +1,555 @@
+"""
+A binary columnar format for simulation saves.
+
+The file starts with a magic string, followed by the format version and the length of a JSON header.
+The header holds the simulation settings and the description of the columns. The columns follow the header,
+each one is a little-endian typed array with one value per body (or several, for the color).
+"""
+from sophysics_engine import SimEnvironment, RigidBody
+from defaults import CircleRenderer, Attraction
+from .trail_renderer import TrailRenderer
+from .celestial_body import get_default_trail_vertex_distance
+from array import array
+from itertools import accumulate, chain, repeat
+from operator import itemgetter
+from typing import Dict, Tuple, Optional, List, Sequence, Any
+import pygame
+import struct
+import json
+import math
+import sys
+
+
+SNAPSHOT_MAGIC = b"SOPHSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".sophsnap"
+
+# magic, version, header length
+_PREAMBLE = struct.Struct(f"<{len(SNAPSHOT_MAGIC)}sII")
+
+# bit flags stored in the "flags" column
+FLAG_IS_ATTRACTOR = 1
+FLAG_DRAW_TRAIL = 2
+
+
+class BodyValidationError(ValueError):
+    """
+    Raised when some of the bodies have invalid parameters, lists every problem with all the bodies that have it
+    """
+    # the number of indices per problem, that are put into the message
+    MAX_LISTED_INDICES = 10
+
+    def __init__(self, problems: Dict[str, List[int]]):
+        """
+        :param problems: the descriptions of the problems and the indices of the bodies that have them
+        """
+        self.__problems = problems
+
+        messages = []
+        for description, indices in problems.items():
+            listed = ", ".join(map(str, indices[:self.MAX_LISTED_INDICES]))
+            if len(indices) > self.MAX_LISTED_INDICES:
+                listed += f" and {len(indices) - self.MAX_LISTED_INDICES} more"
+
+            messages.append(f"{description} (bodies {listed})")
+
+        super().__init__("; ".join(messages))
+
+    @property
+    def problems(self) -> Dict[str, List[int]]:
+        return self.__problems
+
+
+class BodyColumns:
+    """
+    The parameters of the bodies stored column by column in typed arrays
+    """
+    # name, typecode, values per body
+    COLUMNS: Tuple[Tuple[str, str, int], ...] = (
+        ("id", "q", 1),
+        ("position_x", "d", 1),
+        ("position_y", "d", 1),
+        ("velocity_x", "d", 1),
+        ("velocity_y", "d", 1),
+        ("mass", "d", 1),
+        ("radius", "d", 1),
+        ("min_screen_radius", "i", 1),
+        ("color", "B", 4),
+        ("draw_layer", "b", 1),
+        ("flags", "B", 1),
+        ("trail_vertex_distance", "d", 1)
+    )
+
+    # the columns that change as the simulation runs
+    DYNAMIC_COLUMNS: Tuple[str, ...] = ("position_x", "position_y", "velocity_x", "velocity_y", "mass")
+
+    def __init__(self):
+        self.__columns: Dict[str, array] = {name: array(typecode) for name, typecode, _ in self.COLUMNS}
+
+        # names are stored as one utf-8 blob, the offsets mark where each name starts and ends
+        self.__name_offsets = array("I", [0])
+        self.__names = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.__columns["id"])
+
+    def __getitem__(self, column: str) -> array:
+        return self.__columns[column]
+
+    @property
+    def name_offsets(self) -> array:
+        return self.__name_offsets
+
+    @property
+    def names(self) -> bytearray:
+        return self.__names
+
+    def get_name(self, index: int) -> str:
+        return self.__names[self.__name_offsets[index]:self.__name_offsets[index + 1]].decode("utf-8")
+
+    def get_color(self, index: int) -> Tuple[int, int, int, int]:
+        color = self.__columns["color"]
+        return color[4 * index], color[4 * index + 1], color[4 * index + 2], color[4 * index + 3]
+
+    def append(self, body_id: int, name: str, position: Sequence[float], velocity: Sequence[float], mass: float,
+               radius: float, min_screen_radius: int, color: Sequence[int], draw_layer: int, is_attractor: bool,
+               draw_trail: bool, trail_vertex_distance: float):
+        columns = self.__columns
+
+        columns["id"].append(body_id)
+        columns["position_x"].append(position[0])
+        columns["position_y"].append(position[1])
+        columns["velocity_x"].append(velocity[0])
+        columns["velocity_y"].append(velocity[1])
+        columns["mass"].append(mass)
+        columns["radius"].append(radius)
+        columns["min_screen_radius"].append(min_screen_radius)
+        columns["color"].extend(pygame.Color(color))
+        columns["draw_layer"].append(draw_layer)
+        columns["flags"].append(FLAG_IS_ATTRACTOR * bool(is_attractor) | FLAG_DRAW_TRAIL * bool(draw_trail))
+        columns["trail_vertex_distance"].append(trail_vertex_distance)
+
+        self.__names.extend(name.encode("utf-8"))
+        self.__name_offsets.append(len(self.__names))
+
+    @classmethod
+    def from_body_dicts(cls, bodies: Sequence[Dict], index_offset: int = 0) -> "BodyColumns":
+        """
+        Converts the bodies of a JSON save into columns. The values are converted field by field,
+        a body without an id gets the id of -1.
+
+        Raises BodyValidationError listing all the bodies with values that have wrong types,
+        the ranges of the values are checked by validate().
+
+        :param index_offset: added to the indices of the bodies in the error, the same as in validate()
+        """
+        problems: Dict[str, List[int]] = {}
+
+        if set(map(type, bodies)) <= {dict}:
+            parameters = _get_field(bodies, "parameters")
+        else:
+            parameters = [body.get("parameters", None) if type(body) is dict else None for body in bodies]
+
+        if not set(map(type, parameters)) <= {dict}:
+            raise BodyValidationError(_offset_problems({
+                "a body must be an object with the 'parameters' object":
+                    [i for i, body_parameters in enumerate(parameters) if type(body_parameters) is not dict]
+            }, index_offset))
+
+        columns = cls()
+        arrays = columns.__columns
+
+        arrays["id"] = _convert_column("q", _get_field(bodies, "id", -1), "'id' must be an integer", problems)
+
+        for vector_name, x_column, y_column in (("initial_position", "position_x", "position_y"),
+                                                ("initial_velocity", "velocity_x", "velocity_y")):
+            vectors = _get_field(parameters, vector_name)
+            description = f"'{vector_name}' must be a list of 2 numbers"
+
+            if set(map(type, vectors)) != {list} or set(map(len, vectors)) != {2}:
+                bad_vectors = [i for i, vector in enumerate(vectors) if type(vector) is not list or len(vector) != 2]
+                _add_problem(problems, description, bad_vectors)
+                vectors = [vector if type(vector) is list and len(vector) == 2 else (0, 0) for vector in vectors]
+
+            arrays[x_column] = _convert_column("d", list(map(itemgetter(0), vectors)), description, problems)
+            arrays[y_column] = _convert_column("d", list(map(itemgetter(1), vectors)), description, problems)
+
+        radius = _get_field(parameters, "radius")
+
+        arrays["mass"] = _convert_column("d", _get_field(parameters, "mass"), "'mass' must be a number", problems)
+        arrays["radius"] = _convert_column("d", radius, "'radius' must be a number", problems)
+        arrays["min_screen_radius"] = _convert_column("i", _get_field(parameters, "min_screen_radius"),
+                                                      "'min_screen_radius' must be an int", problems)
+        arrays["draw_layer"] = _convert_column("b", _get_field(parameters, "draw_layer"),
+                                               "the only allowed values for draw layer are 1, 2, or 3", problems)
+
+        trail_vertex_distance = _get_field(parameters, "trail_vertex_distance")
+        if None in trail_vertex_distance:
+            trail_vertex_distance = [
+                distance if distance is not None else
+                get_default_trail_vertex_distance(body_radius) if type(body_radius) in (int, float) else 0
+                for distance, body_radius in zip(trail_vertex_distance, radius)
+            ]
+
+        arrays["trail_vertex_distance"] = _convert_column("d", trail_vertex_distance,
+                                                          "'trail_vertex_distance' must be a number", problems)
+
+        is_attractor = _get_field(parameters, "is_attractor")
+        draw_trail = _get_field(parameters, "draw_trail")
+        if None in draw_trail:
+            draw_trail = [value if value is not None else True for value in draw_trail]
+
+        _check_types(is_attractor, bool, "'is_attractor' parameter must be a bool", problems)
+        _check_types(draw_trail, bool, "'draw_trail' parameter must be a bool", problems)
+
+        arrays["flags"] = array("B", [
+            FLAG_IS_ATTRACTOR * (attractor is True) | FLAG_DRAW_TRAIL * (trail is True)
+            for attractor, trail in zip(is_attractor, draw_trail)
+        ])
+
+        arrays["color"] = _convert_colors(_get_field(parameters, "color"), problems)
+
+        names = _get_field(parameters, "name")
+        if _check_types(names, str, "'name' parameter must be a string", problems):
+            encoded_names = list(map(str.encode, names))
+        else:
+            encoded_names = [name.encode("utf-8") if type(name) is str else b"" for name in names]
+
+        columns.__name_offsets.extend(accumulate(map(len, encoded_names)))
+        columns.__names = bytearray(b"".join(encoded_names))
+
+        if problems:
+            raise BodyValidationError(_offset_problems(problems, index_offset))
+
+        return columns
+
+    def validate(self, index_offset: int = 0):
+        """
+        Checks that the values are in the allowed ranges.
+        Raises BodyValidationError listing all the bodies with values out of range.
+
+        :param index_offset: added to the indices of the bodies in the error, e.g. when the columns are a part of
+                             a bigger set of bodies
+        """
+        columns = self.__columns
+        problems: Dict[str, List[int]] = {}
+
+        for name in ("position_x", "position_y", "velocity_x", "velocity_y"):
+            # a single NaN or infinity makes the whole sum non finite,
+            # the indices are only looked for when there's something to find
+            values = columns[name]
+            if not math.isfinite(sum(values)):
+                _add_problem(problems, f"'{name}' must be finite",
+                             [i for i, value in enumerate(values) if not -math.inf < value < math.inf])
+
+        for name in ("mass", "radius", "trail_vertex_distance"):
+            values = columns[name]
+            if values and not (min(values) > 0 and math.isfinite(sum(values))):
+                _add_problem(problems, f"'{name}' must be a positive number",
+                             [i for i, value in enumerate(values) if not 0 < value < math.inf])
+
+        values = columns["min_screen_radius"]
+        if values and min(values) < 0:
+            _add_problem(problems, "'min_screen_radius' parameter can't be negative",
+                         [i for i, value in enumerate(values) if value < 0])
+
+        values = columns["draw_layer"]
+        if values and not (min(values) >= 1 and max(values) <= 3):
+            _add_problem(problems, "the only allowed values for draw layer are 1, 2, or 3",
+                         [i for i, value in enumerate(values) if not 1 <= value <= 3])
+
+        if problems:
+            raise BodyValidationError(_offset_problems(problems, index_offset))
+
+    @classmethod
+    def from_environment(cls, environment: SimEnvironment, position_offset: Optional[pygame.Vector2] = None,
+                         velocity_offset: Optional[pygame.Vector2] = None) -> "BodyColumns":
+        """
+        Collects the bodies of the environment, with positions and velocities relative to the given offsets
+        """
+        columns = cls()
+
+        offset_x, offset_y = position_offset if position_offset is not None else (0, 0)
+        velocity_offset_x, velocity_offset_y = velocity_offset if velocity_offset is not None else (0, 0)
+
+        for sim_object in environment.sim_objects:
+            rigidbody: Optional[RigidBody] = sim_object.try_get_component(RigidBody)
+            if rigidbody is None:
+                continue
+
+            circle_renderer = None
+
+            # because both selection and circle renderers are circle renderers we need to filter them
+            for r in sim_object.get_components(CircleRenderer):
+                if type(r) is CircleRenderer:
+                    circle_renderer = r
+                    break
+
+            trail_renderer: TrailRenderer = sim_object.get_component(TrailRenderer)
+            attraction: Attraction = sim_object.get_component(Attraction)
+
+            position = sim_object.transform.position
+            velocity = rigidbody.velocity
+
+            columns.append(
+                body_id=id(rigidbody),
+                name=sim_object.tag,
+                position=(position.x - offset_x, position.y - offset_y),
+                velocity=(velocity.x - velocity_offset_x, velocity.y - velocity_offset_y),
+                mass=rigidbody.mass,
+                radius=circle_renderer.radius,
+                min_screen_radius=circle_renderer.min_pixel_radius,
+                color=circle_renderer.color,
+                draw_layer=circle_renderer.layer,
+                is_attractor=attraction.is_attractor,
+                draw_trail=trail_renderer.is_active,
+                trail_vertex_distance=trail_renderer.point_distance
+            )
+
+        return columns
+
+    def get_arrays(self) -> List[Tuple[str, array]]:
+        """
+        All the arrays in the order they are written to a file
+        """
+        arrays = [(name, self.__columns[name]) for name, _, _ in self.COLUMNS]
+        arrays.append(("name_offsets", self.__name_offsets))
+        arrays.append(("names", array("B", self.__names)))
+
+        return arrays
+
+    def set_array(self, name: str, values: array):
+        """
+        Replaces a column, used when reading the columns from a file
+        """
+        if name == "name_offsets":
+            self.__name_offsets = values
+        elif name == "names":
+            self.__names = bytearray(values.tobytes())
+        elif name in self.__columns:
+            self.__columns[name] = values
+        else:
+            raise ValueError(f"unknown column '{name}'")
+
+    def check_lengths(self):
+        """
+        Makes sure that all the columns describe the same number of bodies
+        """
+        count = len(self)
+
+        for name, _, width in self.COLUMNS:
+            if len(self.__columns[name]) != count * width:
+                raise ValueError(f"column '{name}' has {len(self.__columns[name])} values, expected {count * width}")
+
+        if len(self.__name_offsets) != count + 1 or self.__name_offsets[-1] != len(self.__names):
+            raise ValueError("the name offsets don't match the names")
+
+
+def _add_problem(problems: Dict[str, List[int]], description: str, indices: List[int]):
+    if not indices:
+        return
+
+    if description not in problems:
+        problems[description] = []
+
+    problems[description].extend(indices)
+
+
+def _offset_problems(problems: Dict[str, List[int]], index_offset: int) -> Dict[str, List[int]]:
+    if index_offset == 0:
+        return problems
+
+    return {description: [i + index_offset for i in indices] for description, indices in problems.items()}
+
+
+def _fits(typecode: str, value: Any) -> bool:
+    # bools are ints in python, but they aren't numbers in JSON
+    if type(value) is bool:
+        return False
+
+    try:
+        array(typecode, (value, ))
+    except (TypeError, OverflowError):
+        return False
+
+    return True
+
+
+def _convert_column(typecode: str, values: List, description: str, problems: Dict[str, List[int]]) -> array:
+    """
+    Converts the values into a typed array all at once, only if that fails, the values are checked one by one
+    to find the ones that don't fit. They are reported as problems and replaced with zeros.
+    """
+    if bool not in set(map(type, values)):
+        try:
+            return array(typecode, values)
+        except (TypeError, OverflowError):
+            pass
+
+    bad_indices = [i for i, value in enumerate(values) if not _fits(typecode, value)]
+    _add_problem(problems, description, bad_indices)
+
+    for i in bad_indices:
+        values[i] = 0
+
+    return array(typecode, values)
+
+
+def _get_field(dicts: Sequence[Dict], key: str, default: Any = None) -> List:
+    """
+    The values of the key in every dict
+    """
+    # map with a builtin doesn't run any python code per dict
+    return list(map(dict.get, dicts, repeat(key), repeat(default)))
+
+
+def _check_types(values: List, value_type: type, description: str, problems: Dict[str, List[int]]) -> bool:
+    """
+    Reports the values that aren't of the exact type as a problem, returns True if there were none
+    """
+    if set(map(type, values)) <= {value_type}:
+        return True
+
+    _add_problem(problems, description, [i for i, value in enumerate(values) if type(value) is not value_type])
+    return False
+
+
+def _convert_colors(colors: List, problems: Dict[str, List[int]]) -> array:
+    """
+    Converts the colors into a flat RGBA array. Sequences of 3 or 4 bytes are converted directly,
+    anything else goes through pygame.Color
+    """
+    # the common case of all the colors being lists of the same length is converted in one go
+    if set(map(type, colors)) == {list}:
+        lengths = set(map(len, colors))
+
+        if lengths == {3} or lengths == {4}:
+            try:
+                components = array("B", chain.from_iterable(colors))
+            except (TypeError, OverflowError):
+                components = None
+
+            if components is not None and lengths == {4}:
+                return components
+
+            if components is not None:
+                result = array("B", b"\xff") * (4 * len(colors))
+                for i in range(3):
+                    result[i::4] = components[i::3]
+
+                return result
+
+    result = array("B")
+    bad_indices = []
+
+    for i, color in enumerate(colors):
+        try:
+            rgba = array("B", color)
+            if len(rgba) == 3:
+                rgba.append(255)
+            elif len(rgba) != 4:
+                raise ValueError("wrong number of color components")
+
+        except (TypeError, ValueError, OverflowError):
+            try:
+                rgba = array("B", pygame.Color(color))
+            except (TypeError, ValueError, OverflowError):
+                bad_indices.append(i)
+                rgba = array("B", (0, 0, 0, 0))
+
+        result.extend(rgba)
+
+    _add_problem(problems, "'color' parameter must be a color", bad_indices)
+
+    return result
+
+
+def is_snapshot_file(path) -> bool:
+    """
+    Checks whether the file starts with the snapshot magic string
+    """
+    with open(path, "rb") as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def _to_little_endian(values: array) -> array:
+    if sys.byteorder == "little" or values.itemsize == 1:
+        return values
+
+    values = array(values.typecode, values)
+    values.byteswap()
+
+    return values
+
+
+def write_snapshot(path, header: Dict, columns: BodyColumns):
+    """
+    Writes the header and the columns into a snapshot file
+
+    :param header: the simulation settings, must be serializable to JSON
+    """
+    arrays = columns.get_arrays()
+
+    header = dict(header)
+    header["body_count"] = len(columns)
+    header["columns"] = [
+        {"name": name, "type": values.typecode, "itemsize": values.itemsize, "length": len(values)}
+        for name, values in arrays
+    ]
+
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    with open(path, "wb") as file:
+        file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+        file.write(header_bytes)
+
+        for _, values in arrays:
+            file.write(_to_little_endian(values).tobytes())
+
+
+def read_snapshot(path) -> Tuple[Dict, BodyColumns]:
+    """
+    Reads the header and the columns from a snapshot file
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if len(data) < _PREAMBLE.size:
+        raise ValueError("the file is too short to be a snapshot")
+
+    magic, version, header_length = _PREAMBLE.unpack_from(data)
+
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("the file is not a snapshot")
+
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+
+    offset = _PREAMBLE.size
+    header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+    offset += header_length
+
+    columns = BodyColumns()
+    view = memoryview(data)
+
+    for column in header["columns"]:
+        values = array(column["type"])
+
+        if values.itemsize != column["itemsize"]:
+            raise ValueError(f"column '{column['name']}' has an unsupported item size")
+
+        size = column["length"] * values.itemsize
+        if offset + size > len(data):
+            raise ValueError("the file is truncated")
+
+        values.frombytes(view[offset:offset + size])
+        offset += size
+
+        if sys.byteorder != "little":
+            values.byteswap()
+
+        columns.set_array(column["name"], values)
+
+    columns.check_lengths()
+
+    return header, columns
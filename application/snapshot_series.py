@@ -0,0 +1,416 @@
+"""
+A format for long series of snapshots of the same simulation.
+
+The attributes of the bodies that rarely change (names, colors, radii, layers, trail settings) are only written
+in keyframes. Every other frame only holds the positions, velocities and masses, optionally XOR-ed with the previous
+frame and compressed. A keyframe is written whenever the set of bodies or any of their static attributes change,
+e.g. when bodies merge or are added by the user.
+
+The file starts with a magic string and the format version, followed by the frames.
+Each frame starts with a frame header (kind, encoding flags, body count, settings length, payload length),
+followed by the simulation settings as JSON and the payload. Everything is little-endian.
+"""
+from .snapshot import BodyColumns, _to_little_endian
+from array import array
+from typing import Dict, Tuple, Optional, List, BinaryIO
+import struct
+import json
+import zlib
+import sys
+import os
+
+
+SERIES_MAGIC = b"SOPHSERI"
+SERIES_VERSION = 1
+SERIES_EXTENSION = ".sophseries"
+
+# magic, version
+_PREAMBLE = struct.Struct(f"<{len(SERIES_MAGIC)}sI")
+
+# kind, encoding flags, body count, settings length, payload length
+_FRAME_HEADER = struct.Struct("<BBIII")
+
+KEYFRAME = 0
+DELTA_FRAME = 1
+
+# encoding flags
+_COMPRESSED = 1
+_XOR_DELTA = 2
+
+# the length of each array of a keyframe is stored before it
+_ARRAY_LENGTH = struct.Struct("<I")
+
+
+def is_snapshot_series_file(path) -> bool:
+    """
+    Checks whether the file starts with the snapshot series magic string
+    """
+    with open(path, "rb") as file:
+        return file.read(len(SERIES_MAGIC)) == SERIES_MAGIC
+
+
+def _shuffle_bytes(data: bytes, width: int) -> bytes:
+    """
+    Groups the bytes of the values by their position in the value,
+    the high bytes of similar floats are mostly the same, so they compress a lot better that way
+    """
+    return b"".join(data[i::width] for i in range(width))
+
+
+def _unshuffle_bytes(data: bytes, width: int) -> bytes:
+    count = len(data) // width
+    result = bytearray(len(data))
+
+    for i in range(width):
+        result[i::width] = data[i * count:(i + 1) * count]
+
+    return bytes(result)
+
+
+def _get_dynamic_bytes(columns: BodyColumns) -> bytes:
+    """
+    All the dynamic columns one after another, as little-endian bytes
+    """
+    return b"".join(_to_little_endian(columns[name]).tobytes() for name in BodyColumns.DYNAMIC_COLUMNS)
+
+
+def _xor_bytes(data: bytes, other: bytes) -> bytes:
+    return (int.from_bytes(data, "little") ^ int.from_bytes(other, "little")).to_bytes(len(data), "little")
+
+
+def _has_same_static_columns(columns: BodyColumns, other: BodyColumns) -> bool:
+    if len(columns) != len(other):
+        return False
+
+    for name, _, _ in BodyColumns.COLUMNS:
+        if name not in BodyColumns.DYNAMIC_COLUMNS and columns[name] != other[name]:
+            return False
+
+    return columns.name_offsets == other.name_offsets and columns.names == other.names
+
+
+class SnapshotSeriesWriter:
+    """
+    Appends snapshots of a simulation to a snapshot series file
+    """
+    def __init__(self, path, compression_level: Optional[int] = 6, delta_encoding: bool = True,
+                 keyframe_interval: Optional[int] = None):
+        """
+        :param compression_level: the zlib compression level of the frames, None to not compress them
+        :param delta_encoding: whether to XOR the dynamic columns with the ones from the previous frame
+        :param keyframe_interval: a keyframe is forced every keyframe_interval frames, so that reading a frame
+                                  doesn't require decoding the whole series. None to only write keyframes
+                                  when the bodies change
+        """
+        if compression_level is not None and not 0 <= compression_level <= 9:
+            raise ValueError("compression_level must be between 0 and 9")
+
+        if keyframe_interval is not None and keyframe_interval <= 0:
+            raise ValueError("keyframe_interval must be positive")
+
+        self.__compression_level = compression_level
+        self.__delta_encoding = delta_encoding
+        self.__keyframe_interval = keyframe_interval
+
+        self.__file: Optional[BinaryIO] = open(path, "wb")
+        self.__file.write(_PREAMBLE.pack(SERIES_MAGIC, SERIES_VERSION))
+
+        self.__frame_count = 0
+        self.__frames_since_keyframe = 0
+        self.__previous_columns: Optional[BodyColumns] = None
+        self.__previous_dynamic_bytes: Optional[bytes] = None
+
+    @property
+    def frame_count(self) -> int:
+        return self.__frame_count
+
+    def __enter__(self) -> "SnapshotSeriesWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def append(self, settings: Dict, columns: BodyColumns):
+        """
+        Writes the next snapshot
+
+        :param settings: the simulation settings, must be serializable to JSON
+        """
+        if self.__file is None:
+            raise ValueError("the series is closed")
+
+        dynamic_bytes = _get_dynamic_bytes(columns)
+
+        is_keyframe = self.__previous_columns is None or \
+            not _has_same_static_columns(columns, self.__previous_columns) or \
+            (self.__keyframe_interval is not None and self.__frames_since_keyframe >= self.__keyframe_interval)
+
+        flags = 0
+
+        if is_keyframe:
+            kind = KEYFRAME
+            payload = self.__get_keyframe_payload(columns, dynamic_bytes)
+            self.__frames_since_keyframe = 0
+        else:
+            kind = DELTA_FRAME
+            payload = dynamic_bytes
+
+            if self.__delta_encoding:
+                payload = _xor_bytes(payload, self.__previous_dynamic_bytes)
+                flags |= _XOR_DELTA
+
+            payload = _shuffle_bytes(payload, 8)
+
+        if self.__compression_level is not None:
+            payload = zlib.compress(payload, self.__compression_level)
+            flags |= _COMPRESSED
+
+        settings_bytes = json.dumps(settings).encode("utf-8")
+
+        self.__file.write(_FRAME_HEADER.pack(kind, flags, len(columns), len(settings_bytes), len(payload)))
+        self.__file.write(settings_bytes)
+        self.__file.write(payload)
+
+        self.__previous_columns = columns
+        self.__previous_dynamic_bytes = dynamic_bytes
+        self.__frame_count += 1
+        self.__frames_since_keyframe += 1
+
+    @staticmethod
+    def __get_keyframe_payload(columns: BodyColumns, dynamic_bytes: bytes) -> bytes:
+        parts = [_ARRAY_LENGTH.pack(len(dynamic_bytes)), _shuffle_bytes(dynamic_bytes, 8)]
+
+        for name, values in columns.get_arrays():
+            if name in BodyColumns.DYNAMIC_COLUMNS:
+                continue
+
+            data = _to_little_endian(values).tobytes()
+            parts.append(_ARRAY_LENGTH.pack(len(data)))
+            parts.append(data)
+
+        return b"".join(parts)
+
+    def close(self):
+        if self.__file is None:
+            return
+
+        self.__file.close()
+        self.__file = None
+        self.__previous_columns = None
+        self.__previous_dynamic_bytes = None
+
+
+class SnapshotSeriesReader:
+    """
+    Reads the frames of a snapshot series file.
+
+    The frames are indexed when the file is opened, decoding a frame only decodes the frames
+    since the keyframe before it (or continues from the previously read frame, when reading in order).
+    """
+    def __init__(self, path):
+        self.__file: Optional[BinaryIO] = open(path, "rb")
+
+        try:
+            self.__read_index()
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+        self.__decoded_index: Optional[int] = None
+        self.__decoded_static: Optional[BodyColumns] = None
+        self.__decoded_dynamic_bytes: Optional[bytes] = None
+
+    def __read_index(self):
+        preamble = self.__file.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError("the file is too short to be a snapshot series")
+
+        magic, version = _PREAMBLE.unpack(preamble)
+
+        if magic != SERIES_MAGIC:
+            raise ValueError("the file is not a snapshot series")
+
+        if version != SERIES_VERSION:
+            raise ValueError(f"unsupported snapshot series version {version}")
+
+        # kind, flags, body count, offset of the settings, settings length, payload length
+        self.__frames: List[Tuple[int, int, int, int, int, int]] = []
+        self.__keyframes: List[int] = []
+
+        file_size = os.fstat(self.__file.fileno()).st_size
+        offset = _PREAMBLE.size
+        while True:
+            frame_header = self.__file.read(_FRAME_HEADER.size)
+
+            # a frame that wasn't written completely is ignored
+            if len(frame_header) < _FRAME_HEADER.size:
+                break
+
+            kind, flags, body_count, settings_length, payload_length = _FRAME_HEADER.unpack(frame_header)
+            offset += _FRAME_HEADER.size
+
+            if offset + settings_length + payload_length > file_size:
+                break
+
+            if kind == KEYFRAME:
+                self.__keyframes.append(len(self.__frames))
+            elif kind != DELTA_FRAME:
+                raise ValueError(f"unknown frame kind {kind}")
+            elif not self.__keyframes:
+                raise ValueError("the series doesn't start with a keyframe")
+
+            self.__frames.append((kind, flags, body_count, offset, settings_length, payload_length))
+
+            offset += settings_length + payload_length
+            self.__file.seek(offset)
+
+    def __len__(self) -> int:
+        return len(self.__frames)
+
+    def __enter__(self) -> "SnapshotSeriesReader":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get_frame(self, index: int) -> Tuple[Dict, BodyColumns]:
+        """
+        Returns the settings and the columns of the frame
+        """
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+
+        # continuing from the last decoded frame if possible
+        start = None
+        for keyframe_index in self.__keyframes:
+            if keyframe_index > index:
+                break
+
+            start = keyframe_index
+
+        if self.__decoded_index is not None and start <= self.__decoded_index <= index:
+            start = self.__decoded_index + 1
+
+        settings = None
+        for i in range(start, index + 1):
+            settings = self.__decode_frame(i, read_settings=i == index)
+
+        if settings is None:
+            settings = self.__read_settings(index)
+
+        columns = BodyColumns()
+
+        for name, values in self.__decoded_static.get_arrays():
+            if name not in BodyColumns.DYNAMIC_COLUMNS:
+                columns.set_array(name, array(values.typecode, values))
+
+        dynamic_bytes = memoryview(self.__decoded_dynamic_bytes)
+        offset = 0
+        count = len(self.__decoded_static)
+        for name in BodyColumns.DYNAMIC_COLUMNS:
+            values = array("d")
+            values.frombytes(dynamic_bytes[offset:offset + 8 * count])
+            offset += 8 * count
+
+            if sys.byteorder != "little":
+                values.byteswap()
+
+            columns.set_array(name, values)
+
+        columns.check_lengths()
+
+        return settings, columns
+
+    def __read_settings(self, index: int) -> Dict:
+        _, _, _, offset, settings_length, _ = self.__frames[index]
+
+        self.__file.seek(offset)
+        return json.loads(self.__file.read(settings_length).decode("utf-8"))
+
+    def __decode_frame(self, index: int, read_settings: bool) -> Optional[Dict]:
+        """
+        Decodes the frame into the current state, returns the settings if they were requested
+        """
+        kind, flags, body_count, offset, settings_length, payload_length = self.__frames[index]
+
+        self.__file.seek(offset)
+        settings_bytes = self.__file.read(settings_length)
+        payload = self.__file.read(payload_length)
+
+        if flags & _COMPRESSED:
+            try:
+                payload = zlib.decompress(payload)
+            except zlib.error as e:
+                raise ValueError(f"frame {index} is corrupted") from e
+
+        if kind == KEYFRAME:
+            self.__decode_keyframe(payload, body_count)
+        else:
+            if len(payload) != 8 * len(BodyColumns.DYNAMIC_COLUMNS) * body_count or \
+                    body_count != len(self.__decoded_static):
+                raise ValueError(f"frame {index} has the wrong size")
+
+            dynamic_bytes = _unshuffle_bytes(payload, 8)
+
+            if flags & _XOR_DELTA:
+                dynamic_bytes = _xor_bytes(dynamic_bytes, self.__decoded_dynamic_bytes)
+
+            self.__decoded_dynamic_bytes = dynamic_bytes
+
+        self.__decoded_index = index
+
+        if read_settings:
+            return json.loads(settings_bytes.decode("utf-8"))
+
+        return None
+
+    def __decode_keyframe(self, payload: bytes, body_count: int):
+        view = memoryview(payload)
+        offset = 0
+
+        def read_part() -> bytes:
+            nonlocal offset
+
+            length, = _ARRAY_LENGTH.unpack_from(view, offset)
+            offset += _ARRAY_LENGTH.size
+
+            if offset + length > len(view):
+                raise ValueError("the keyframe is truncated")
+
+            part = bytes(view[offset:offset + length])
+            offset += length
+
+            return part
+
+        dynamic_bytes = _unshuffle_bytes(read_part(), 8)
+        if len(dynamic_bytes) != 8 * len(BodyColumns.DYNAMIC_COLUMNS) * body_count:
+            raise ValueError("the keyframe has the wrong size")
+
+        static = BodyColumns()
+
+        for name, values in static.get_arrays():
+            if name in BodyColumns.DYNAMIC_COLUMNS:
+                # the dynamic columns of the static part are left empty
+                continue
+
+            values = array(values.typecode)
+            values.frombytes(read_part())
+
+            if sys.byteorder != "little":
+                values.byteswap()
+
+            static.set_array(name, values)
+
+        if len(static["id"]) != body_count:
+            raise ValueError("the keyframe has the wrong number of bodies")
+
+        self.__decoded_static = static
+        self.__decoded_dynamic_bytes = dynamic_bytes
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
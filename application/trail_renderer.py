@@ -1,7 +1,11 @@
-from sophysics_engine import Renderer, Event, PostPhysicsUpdateEvent, Camera
+from __future__ import annotations
+from sophysics_engine import Renderer, Event, PostPhysicsUpdateEvent, Camera, Color, EnvironmentComponent, \
+    CameraPostRenderEvent
 from collections import deque
+from itertools import islice
 import pygame
 from math import sqrt
+from typing import List, Tuple, Optional, Sequence, Dict, Set
 
 
 class TrailResetEvent(Event):
@@ -11,12 +15,203 @@ class TrailResetEvent(Event):
     pass
 
 
+def simplify_polyline(points: Sequence[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """
+    Simplifies a polyline using the Douglas-Peucker algorithm.
+
+    Every removed vertex lies within the tolerance of the simplified polyline. The first and the last
+    vertices are always kept.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(points)
+
+    tolerance_squared = tolerance * tolerance
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+
+    # using an explicit stack instead of recursion, since trails can get long enough to hit the recursion limit
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        x1, y1 = points[first]
+        x2, y2 = points[last]
+        dx, dy = x2 - x1, y2 - y1
+        segment_length_squared = dx * dx + dy * dy
+
+        max_distance_squared = -1.0
+        max_index = first
+        for i in range(first + 1, last):
+            px, py = points[i]
+
+            # squared distance from the point to the segment
+            if segment_length_squared == 0:
+                distance_squared = (px - x1) ** 2 + (py - y1) ** 2
+            else:
+                cross = dx * (py - y1) - dy * (px - x1)
+                distance_squared = cross * cross / segment_length_squared
+
+            if distance_squared > max_distance_squared:
+                max_distance_squared = distance_squared
+                max_index = i
+
+        if max_distance_squared > tolerance_squared:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [point for point, is_kept in zip(points, keep) if is_kept]
+
+
+class TrailCache(EnvironmentComponent):
+    """
+    Keeps the already drawn parts of the trails on separate surfaces, so that the trail renderers
+    only have to draw the segments that were added since the last frame.
+
+    The cache is cleared whenever the camera moves or zooms, or when the trails are reset.
+    The segments that were pushed out of the trails stay in the cache until there's too many of them
+    compared to the rest of the cached segments of all the trails, so the cost of keeping the cache clean
+    grows with the number of new segments, not with the number of trails.
+    """
+    def __init__(self, max_stale_ratio: float = 0.5):
+        """
+        :param max_stale_ratio: the cache is cleared once the segments that aren't part of the trails anymore
+                                outnumber the ones that are by this factor
+        """
+        if max_stale_ratio <= 0:
+            raise ValueError("max_stale_ratio must be positive")
+
+        self.__max_stale_ratio = max_stale_ratio
+        # a surface for every layer the trails are drawn on
+        self.__surfaces: Dict[int, pygame.Surface] = {}
+        # layers that have something drawn on them since the last invalidation
+        self.__drawn_layers: Set[int] = set()
+
+        # the camera state, for which the contents of the cache are valid
+        self.__camera_state: Optional[Tuple] = None
+        self.__generation = 0
+        self.__is_validated = False
+        self.__invalidation_requested = False
+
+        # the number of the trail vertices drawn into the cache since it was cleared, and how many of them
+        # aren't part of the trails anymore
+        self.__cached_points = 0
+        self.__stale_points = 0
+
+        super().__init__()
+
+    @property
+    def generation(self) -> int:
+        """
+        Gets incremented every time the cache is cleared.
+
+        Renderers compare it to the generation they've drawn into to know when they need to redraw everything.
+        """
+        return self.__generation
+
+    def setup(self):
+        self.environment.event_system.add_listener(TrailResetEvent, self.__handle_reset_event)
+        self.environment.event_system.add_listener(CameraPostRenderEvent, self.__handle_post_render_event)
+
+        super().setup()
+
+    def __handle_reset_event(self, _: TrailResetEvent):
+        self.request_invalidation()
+
+    def request_invalidation(self):
+        """
+        Clears the cache before the trails are drawn next frame
+        """
+        # clearing the cache in the middle of a frame would erase the segments of the renderers, that have already
+        # been drawn this frame, so we just postpone it
+        self.__invalidation_requested = True
+
+    def add_cached_points(self, amount: int):
+        """
+        Tells the cache that a trail has drawn this many new vertices into it
+        """
+        self.__cached_points += amount
+
+    def add_stale_points(self, amount: int):
+        """
+        Tells the cache that this many of the vertices drawn into it aren't part of a trail anymore.
+        Once there's too many of them, the cache is cleared
+        """
+        self.__stale_points += amount
+
+        if self.__stale_points > (self.__cached_points - self.__stale_points) * self.__max_stale_ratio:
+            self.request_invalidation()
+
+    def get_surface(self, camera: Camera, layer: int) -> pygame.Surface:
+        """
+        Returns the cached surface for the layer. Makes sure the cache is still valid for the camera.
+        """
+        if not self.__is_validated:
+            self.__validate(camera)
+
+        surface = self.__surfaces.get(layer, None)
+        if surface is None:
+            surface = pygame.Surface(camera.display.get_size(), pygame.SRCALPHA)
+            surface.fill(Color.TRANSPARENT)
+            self.__surfaces[layer] = surface
+
+        self.__drawn_layers.add(layer)
+        return surface
+
+    def __validate(self, camera: Camera):
+        camera_state = (camera.position.x, camera.position.y, camera.units_per_pixel, camera.display.get_size())
+
+        if self.__invalidation_requested or camera_state != self.__camera_state:
+            self.__invalidate()
+            self.__camera_state = camera_state
+
+        self.__is_validated = True
+
+    def __invalidate(self):
+        for layer in self.__drawn_layers:
+            self.__surfaces[layer].fill(Color.TRANSPARENT)
+
+        self.__drawn_layers.clear()
+        self.__generation += 1
+        self.__invalidation_requested = False
+        self.__cached_points = 0
+        self.__stale_points = 0
+
+    def __handle_post_render_event(self, event: CameraPostRenderEvent):
+        # if no trail has been drawn this frame, the cached segments might belong to trails that aren't there anymore
+        if not self.__is_validated:
+            self.__invalidate()
+
+        for layer in self.__drawn_layers:
+            event.camera.get_layer_for_rendering(layer).blit(self.__surfaces[layer], (0, 0))
+
+        self.__is_validated = False
+
+    def _on_destroy(self):
+        self.environment.event_system.remove_listener(TrailResetEvent, self.__handle_reset_event)
+        self.environment.event_system.remove_listener(CameraPostRenderEvent, self.__handle_post_render_event)
+        self.__surfaces.clear()
+        self.__drawn_layers.clear()
+
+        super()._on_destroy()
+
+
 class TrailRenderer(Renderer):
     """
     Renders a curve that follows the object's trajectory
     """
 
-    def __init__(self, point_distance: float, max_points: int, thickness: int, color, layer: int):
+    def __init__(self, point_distance: float, max_points: int, thickness: int, color, layer: int,
+                 min_pixel_distance: float = 1, simplification_tolerance: float = 0.5):
+        """
+        :param min_pixel_distance: vertices that are closer than that to the previous drawn vertex on the screen
+        are skipped when drawing
+        :param simplification_tolerance: how far (in pixels) the trail is allowed to deviate from the actual
+        trajectory when it is compacted to fit into max_points. 0 disables the compaction.
+        """
         # to draw the trail, we will add points to a deque, new points will be added, when the object goes
         # beyond a certain distance from the last point
         # to optimize that comparison, we will compare the squares of those distances, instead of
@@ -27,8 +222,34 @@ class TrailRenderer(Renderer):
         self.__thickness = thickness
         self.__points = deque(maxlen=max_points)
 
+        self.__min_pixel_distance_squared = min_pixel_distance * min_pixel_distance
+        self.simplification_tolerance = simplification_tolerance
+
+        # the compaction needs to know the current zoom, so we remember it from the last render
+        self.__units_per_pixel: Optional[float] = None
+        # running Douglas-Peucker on every new point would be wasteful, so after each compaction
+        # we wait until a portion of the budget is filled up again
+        self.__points_since_compaction = 0
+
+        # the trail is stored relative to the camera's origin, so that it follows the reference frame
+        self.__camera: Optional[Camera] = None
+
+        # the parts of the trail that have been drawn are kept by the trail cache
+        self.__cache: Optional[TrailCache] = None
+        # the generation of the cache the trail was drawn into and how many points of the trail it already has
+        self.__cache_generation: Optional[int] = None
+        self.__cached_points = 0
+
         super().__init__(color, layer)
 
+    @Renderer.is_active.setter
+    def is_active(self, value: bool):
+        Renderer.is_active.fset(self, value)
+
+        # the cache still has the trail in it, it has to be cleared to make the trail disappear
+        if self.__cache is not None:
+            self.__cache.request_invalidation()
+
     @property
     def point_distance(self) -> float:
         """
@@ -40,9 +261,27 @@ class TrailRenderer(Renderer):
     def point_distance(self, value: float):
         self.__point_distance_squared = value * value
 
+    @property
+    def min_pixel_distance(self) -> float:
+        """
+        Minimal distance (in pixels) between the vertices that are drawn on the screen
+        """
+        return sqrt(self.__min_pixel_distance_squared)
+
+    @min_pixel_distance.setter
+    def min_pixel_distance(self, value: float):
+        self.__min_pixel_distance_squared = value * value
+
     def setup(self):
         super().setup()
 
+        self.__camera = self.sim_object.environment.try_get_component(Camera)
+        self.__cache = self.sim_object.environment.try_get_component(TrailCache)
+
+        if self.__cache is None:
+            self.__cache = TrailCache()
+            self.sim_object.environment.attach_component(self.__cache)
+
         self.sim_object.environment.event_system.add_listener(TrailResetEvent, self.__handle_reset_event)
         self.sim_object.environment.event_system.add_listener(PostPhysicsUpdateEvent, self.__handle_post_physics_event)
 
@@ -53,33 +292,137 @@ class TrailRenderer(Renderer):
         if not self.is_active:
             return
 
+        position = self.__get_local_position()
+
         # if there are no points, we just add one
         if len(self.__points) == 0:
-            self.__points.append(tuple(self.sim_object.transform.position))
+            self.__points.append(position)
             return
 
-        dist_to_last_point = pygame.Vector2(self.__points[-1]).distance_squared_to(self.sim_object.transform.position)
+        dist_to_last_point = pygame.Vector2(self.__points[-1]).distance_squared_to(position)
 
         if dist_to_last_point >= self.__point_distance_squared:
-            self.__points.append(tuple(self.sim_object.transform.position))
+            if len(self.__points) == self.__points.maxlen:
+                self.__compact()
+
+            if len(self.__points) == self.__points.maxlen:
+                # the oldest point is gonna be pushed out of the deque, but it stays in the cache
+                self.__mark_stale(1)
+
+            self.__points.append(position)
+            self.__points_since_compaction += 1
+
+    def __get_local_position(self) -> Tuple[float, float]:
+        """
+        The position of the object relative to the origin
+        """
+        if self.__camera is None:
+            return tuple(self.sim_object.transform.position)
+
+        return self.__camera.world_to_local(self.sim_object.transform.position)
+
+    def __mark_stale(self, amount: int):
+        """
+        Tells the cache that this many of the oldest cached vertices of the trail aren't part of it anymore
+        """
+        # the trail isn't in the cache at all if it hasn't been drawn since the cache was cleared
+        if self.__cache_generation != self.__cache.generation:
+            return
+
+        amount = min(amount, self.__cached_points)
+        self.__cached_points -= amount
+        self.__cache.add_stale_points(amount)
+
+    def __compact(self):
+        """
+        Simplifies the stored trail, so that it takes fewer points to represent the same trajectory
+        """
+        if self.simplification_tolerance <= 0 or self.__units_per_pixel is None:
+            return
+
+        if self.__points_since_compaction < self.__points.maxlen // 4:
+            return
+
+        self.__points_since_compaction = 0
+
+        tolerance = self.simplification_tolerance * self.__units_per_pixel
+        simplified = simplify_polyline(self.__points, tolerance)
+
+        # the simplified trail stays within the tolerance of the cached one, so the cache is still good,
+        # only the number of the cached vertices that are left has to be counted
+        cached_points = 0
+        for point in islice(self.__points, self.__cached_points):
+            if cached_points < len(simplified) and simplified[cached_points] is point:
+                cached_points += 1
+
+        self.__cached_points = cached_points
+
+        self.__points.clear()
+        self.__points.extend(simplified)
 
     def reset_trail(self):
         self.__points.clear()
+        self.__points_since_compaction = 0
+
+        if self.__cache is not None:
+            self.__cache.request_invalidation()
+
+    def __get_screen_points(self, camera: Camera, start: int = 0) -> List[Tuple[float, float]]:
+        """
+        Converts the trail (starting from the given vertex) into screen coordinates,
+        skipping the vertices that would be too close to each other
+        """
+        screen_points = []
+        last_x = last_y = None
+        min_distance_squared = self.__min_pixel_distance_squared
+
+        for point in islice(self.__points, start, None):
+            x, y = camera.local_to_screen(point)
+
+            if last_x is not None and (x - last_x) ** 2 + (y - last_y) ** 2 < min_distance_squared:
+                continue
+
+            screen_points.append((x, y))
+            last_x, last_y = x, y
+
+        # the last vertex has to stay where it is, since the line to the object starts there
+        last_point = camera.local_to_screen(self.__points[-1])
+        if screen_points[-1] != last_point:
+            screen_points.append(last_point)
+
+        return screen_points
 
     def render(self, surface: pygame.Surface, camera: Camera):
-        if len(self.__points) >= 2:
-            pygame.draw.lines(
-                surface=surface,
-                color=self.color,
-                closed=False,
-                points=[camera.world_to_screen(point) for point in self.__points],
-                width=self.__thickness
-            )
+        self.__units_per_pixel = camera.units_per_pixel
+        cache_surface = self.__cache.get_surface(camera, self.layer)
+
+        if self.__cache_generation != self.__cache.generation:
+            # the cache has been cleared, need to redraw the whole trail
+            self.__cache_generation = self.__cache.generation
+            self.__cached_points = 0
+
+        # only the segments that aren't in the cache yet are drawn, starting from the last cached vertex
+        if len(self.__points) >= 2 and self.__cached_points < len(self.__points):
+            screen_points = self.__get_screen_points(camera, max(self.__cached_points - 1, 0))
+
+            if len(screen_points) >= 2:
+                pygame.draw.lines(
+                    surface=cache_surface,
+                    color=self.color,
+                    closed=False,
+                    points=screen_points,
+                    width=self.__thickness
+                )
+
+            self.__cache.add_cached_points(len(self.__points) - self.__cached_points)
+            self.__cached_points = len(self.__points)
+
+        # the segment to the object itself changes every frame, so it isn't cached
         if len(self.__points) >= 1:
             pygame.draw.line(
                 surface=surface,
                 color=self.color,
-                start_pos=camera.world_to_screen(self.__points[-1]),
+                start_pos=camera.local_to_screen(self.__points[-1]),
                 end_pos=camera.world_to_screen(self.sim_object.transform.position),
                 width=self.__thickness
             )
@@ -89,4 +432,30 @@ class TrailRenderer(Renderer):
         self.sim_object.environment.event_system.remove_listener(PostPhysicsUpdateEvent,
                                                                  self.__handle_post_physics_event)
 
+        # erasing the trail from the cache
+        self.__cache.request_invalidation()
+        self.__cache = None
+        self.__camera = None
+
         super()._on_destroy()
+
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[TrailRenderer]):
+        if cls._on_destroy is not TrailRenderer._on_destroy or not components:
+            cls._on_destroy_each(components)
+            return
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.remove_listeners(TrailResetEvent, (trail.__handle_reset_event for trail in components))
+        event_system.remove_listeners(PostPhysicsUpdateEvent,
+                                      (trail.__handle_post_physics_event for trail in components))
+
+        # the trails share the cache, so it's invalidated only once
+        for cache in {trail.__cache for trail in components}:
+            cache.request_invalidation()
+
+        for trail in components:
+            trail.__cache = None
+            trail.__camera = None
+
+        cls._batch_on_destroy_renderers(components)
@@ -0,0 +1,309 @@
+"""
+Recording of the trajectories of the bodies into a memory-mapped file.
+
+The file starts with a fixed size header, followed by records of a fixed size, one per recorded step.
+Each record holds the step number, the simulated time and the number of bodies, followed by the ids of the bodies
+and their states (x, y, velocity x, velocity y). Everything is little-endian.
+
+The number of complete records is stored in the header and is only updated after the records are flushed,
+so the file can be read while it's still being written.
+"""
+from sophysics_engine import GlobalBehavior, PhysicsManager, TimeSettings
+from array import array
+from typing import Optional, NamedTuple
+import struct
+import mmap
+import sys
+import os
+
+
+TRAJECTORY_MAGIC = b"SOPHTRAJ"
+TRAJECTORY_VERSION = 1
+TRAJECTORY_EXTENSION = ".sophtraj"
+
+# magic, version, max bodies per record, record every k steps, reserved, number of complete records
+_HEADER = struct.Struct("<8sIIIIQ")
+_HEADER_SIZE = 64
+_RECORD_COUNT_OFFSET = 24
+
+# step, simulated time, number of bodies, reserved
+_RECORD_HEADER = struct.Struct("<QdII")
+
+# x, y, velocity x, velocity y
+STATE_SIZE = 4
+
+
+def _get_record_size(max_bodies: int) -> int:
+    return _RECORD_HEADER.size + max_bodies * (8 + 8 * STATE_SIZE)
+
+
+class TrajectoryRecord(NamedTuple):
+    step: int
+    time: float
+    ids: array
+    # x, y, velocity x, velocity y of every body, one after another
+    states: array
+
+
+class TrajectoryRecorder(GlobalBehavior):
+    """
+    Writes the state of all the bodies into a memory-mapped file every k-th physics step.
+
+    The file is preallocated and grows by the same number of records when it's full. The bodies are copied into
+    buffers of a fixed size, so the recording doesn't allocate memory as it goes.
+    If there are more bodies than max_bodies, only the first max_bodies are recorded.
+    """
+    def __init__(self, path: str, record_every: int = 1, max_bodies: int = 1024,
+                 capacity: int = 1024, flush_every: int = 64):
+        """
+        :param path: the file to write the trajectories into
+        :param record_every: the state is recorded every k-th physics step
+        :param max_bodies: the maximum number of bodies in a record
+        :param capacity: the number of records to preallocate, the file grows by the same amount when it's full
+        :param flush_every: the number of records that are flushed to the disk at once
+        """
+        if record_every <= 0:
+            raise ValueError("record_every must be positive")
+
+        if max_bodies <= 0:
+            raise ValueError("max_bodies must be positive")
+
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        if flush_every <= 0:
+            raise ValueError("flush_every must be positive")
+
+        self.__path = path
+        self.__record_every = record_every
+        self.__max_bodies = max_bodies
+        self.__capacity_increment = capacity
+        self.__flush_every = flush_every
+
+        self.__record_size = _get_record_size(max_bodies)
+        self.__capacity = 0
+
+        self.__file = None
+        self.__map: Optional[mmap.mmap] = None
+
+        self.__step = 0
+        self.__time = 0.0
+        self.__record_count = 0
+        self.__flushed_count = 0
+
+        self.__ids = array("q", bytes(8 * max_bodies))
+        self.__states = array("d", bytes(8 * STATE_SIZE * max_bodies))
+
+        self.__physics_manager: Optional[PhysicsManager] = None
+        self.__time_settings: Optional[TimeSettings] = None
+
+        super().__init__()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def record_count(self) -> int:
+        return self.__record_count
+
+    def _start(self):
+        self.__physics_manager = self.environment.get_component(PhysicsManager)
+        self.__time_settings = self.environment.get_component(TimeSettings)
+
+        directory = os.path.dirname(self.__path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.__file = open(self.__path, "w+b")
+        self.__file.write(
+            _HEADER.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION, self.__max_bodies, self.__record_every, 0, 0)
+        )
+        self.__grow()
+
+    def __grow(self):
+        """
+        Extends the file by capacity_increment records and maps it again
+        """
+        if self.__map is not None:
+            self.__map.flush()
+            self.__map.close()
+
+        self.__capacity += self.__capacity_increment
+        size = _HEADER_SIZE + self.__capacity * self.__record_size
+
+        self.__file.truncate(size)
+        self.__map = mmap.mmap(self.__file.fileno(), size)
+
+    def _physics_update(self):
+        self.__time += self.__time_settings.dt
+        self.__step += 1
+
+        if self.__step % self.__record_every != 0:
+            return
+
+        self.record()
+
+    def record(self):
+        """
+        Writes the current state of the bodies as a new record
+        """
+        if self.__record_count == self.__capacity:
+            self.flush()
+            self.__grow()
+
+        bodies = self.__physics_manager.space.bodies
+        count = min(len(bodies), self.__max_bodies)
+
+        ids = self.__ids
+        states = self.__states
+
+        for i in range(count):
+            body = bodies[i]
+            position = body.position
+            velocity = body.velocity
+
+            ids[i] = id(body.rigidbody)
+
+            j = STATE_SIZE * i
+            states[j] = position.x
+            states[j + 1] = position.y
+            states[j + 2] = velocity.x
+            states[j + 3] = velocity.y
+
+        if sys.byteorder != "little":
+            ids.byteswap()
+            states.byteswap()
+
+        offset = _HEADER_SIZE + self.__record_count * self.__record_size
+        _RECORD_HEADER.pack_into(self.__map, offset, self.__step, self.__time, count, 0)
+        offset += _RECORD_HEADER.size
+
+        ids_size = 8 * count
+        self.__map[offset:offset + ids_size] = memoryview(ids).cast("B")[:ids_size]
+        offset += 8 * self.__max_bodies
+
+        states_size = 8 * STATE_SIZE * count
+        self.__map[offset:offset + states_size] = memoryview(states).cast("B")[:states_size]
+
+        if sys.byteorder != "little":
+            ids.byteswap()
+            states.byteswap()
+
+        self.__record_count += 1
+
+        if self.__record_count - self.__flushed_count >= self.__flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Flushes the new records to the disk and makes them visible to the readers
+        """
+        if self.__map is None or self.__flushed_count == self.__record_count:
+            return
+
+        start = _HEADER_SIZE + self.__flushed_count * self.__record_size
+        end = _HEADER_SIZE + self.__record_count * self.__record_size
+
+        # the offset of the flushed region has to be aligned
+        start -= start % mmap.ALLOCATIONGRANULARITY
+        self.__map.flush(start, end - start)
+
+        # the count is updated only after the records themselves are on the disk
+        struct.pack_into("<Q", self.__map, _RECORD_COUNT_OFFSET, self.__record_count)
+        self.__map.flush(0, _HEADER_SIZE)
+
+        self.__flushed_count = self.__record_count
+
+    def _end(self):
+        if self.__map is not None:
+            self.flush()
+            self.__map.close()
+            self.__map = None
+
+        if self.__file is not None:
+            # the unused preallocated records are cut off
+            self.__file.truncate(_HEADER_SIZE + self.__record_count * self.__record_size)
+            self.__file.close()
+            self.__file = None
+
+        self.__physics_manager = None
+        self.__time_settings = None
+
+
+class TrajectoryReader:
+    """
+    Reads the records of a trajectory file. The file can still be written to by a recorder.
+    """
+    def __init__(self, path: str):
+        self.__file = open(path, "rb")
+        self.__map: Optional[mmap.mmap] = None
+        self.__remap()
+
+        magic, version, max_bodies, record_every, _, _ = _HEADER.unpack_from(self.__map)
+
+        if magic != TRAJECTORY_MAGIC:
+            self.close()
+            raise ValueError("the file is not a trajectory file")
+
+        if version != TRAJECTORY_VERSION:
+            self.close()
+            raise ValueError(f"unsupported trajectory version {version}")
+
+        self.__max_bodies = max_bodies
+        self.__record_every = record_every
+        self.__record_size = _get_record_size(max_bodies)
+
+    def __remap(self):
+        if self.__map is not None:
+            self.__map.close()
+
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def max_bodies(self) -> int:
+        return self.__max_bodies
+
+    @property
+    def record_every(self) -> int:
+        return self.__record_every
+
+    def __len__(self) -> int:
+        """
+        The number of complete records, read from the file every time
+        """
+        count, = struct.unpack_from("<Q", self.__map, _RECORD_COUNT_OFFSET)
+        return count
+
+    def get_record(self, index: int) -> TrajectoryRecord:
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+
+        offset = _HEADER_SIZE + index * self.__record_size
+
+        # the file might have grown since it was mapped
+        if offset + self.__record_size > len(self.__map):
+            self.__remap()
+
+        step, time, count, _ = _RECORD_HEADER.unpack_from(self.__map, offset)
+        offset += _RECORD_HEADER.size
+
+        ids = array("q")
+        ids.frombytes(self.__map[offset:offset + 8 * count])
+        offset += 8 * self.__max_bodies
+
+        states = array("d")
+        states.frombytes(self.__map[offset:offset + 8 * STATE_SIZE * count])
+
+        if sys.byteorder != "little":
+            ids.byteswap()
+            states.byteswap()
+
+        return TrajectoryRecord(step, time, ids, states)
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+        self.__file.close()
@@ -3,7 +3,9 @@ import pygame_gui
 
 from sophysics_engine import GUIPanel, Camera
 from .simulation_loader import SimulationLoadEvent
-from .save_simulation import save_simulation_to_json
+from .save_simulation import save_simulation_to_json, save_simulation_snapshot
+from .snapshot import SNAPSHOT_EXTENSION
+from .snapshot_series import SERIES_EXTENSION
 from typing import Dict
 import tkinter.filedialog
 
@@ -64,15 +66,22 @@ class UpperPanel(GUIPanel):
     def __on_save_file_button_click(self):
         filepath = tkinter.filedialog.asksaveasfilename(confirmoverwrite=True,
                                                         defaultextension=".json",
-                                                        filetypes=[("JSON", "*.json")])
+                                                        filetypes=[("JSON", "*.json"),
+                                                                   ("Snapshot", f"*{SNAPSHOT_EXTENSION}")])
 
         if filepath == "":
             return
 
-        save_simulation_to_json(filepath, self.environment, self.environment.get_component(Camera))
+        if filepath.endswith(SNAPSHOT_EXTENSION):
+            save_simulation_snapshot(filepath, self.environment, self.environment.get_component(Camera))
+        else:
+            save_simulation_to_json(filepath, self.environment, self.environment.get_component(Camera))
 
     def __on_open_file_button_click(self):
-        filepath = tkinter.filedialog.askopenfilename(filetypes=[("JSON", "*.json")], initialdir="saves")
+        filepath = tkinter.filedialog.askopenfilename(filetypes=[("JSON", "*.json"),
+                                                                 ("Snapshot", f"*{SNAPSHOT_EXTENSION}"),
+                                                                 ("Snapshot series", f"*{SERIES_EXTENSION}")],
+                                                      initialdir="saves")
 
         # if the user pressed cancel
         if filepath == "":
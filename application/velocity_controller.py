@@ -1,4 +1,6 @@
 from .selection import GlobalSelection, BodyController
+from .reference_frame import ReferenceFrameManager
+from .body_events import BodyStateEditedEvent
 from defaults import GlobalClickable
 from sophysics_engine import Camera, TimeSettings, Event
 from typing import Optional
@@ -22,12 +24,14 @@ class VelocityController(GlobalClickable):
 
         self.__global_selection: Optional[GlobalSelection] = None
         self.__time_settings: Optional[TimeSettings] = None
+        self.__reference_frame_manager: Optional[ReferenceFrameManager] = None
 
         super().__init__(button, hold_time)
 
     def _clickable_start(self):
         self.__time_settings = self.environment.get_component(TimeSettings)
         self.__global_selection = self.environment.get_component(GlobalSelection)
+        self.__reference_frame_manager = self.environment.try_get_component(ReferenceFrameManager)
 
     def __get_selected_body(self) -> Optional[BodyController]:
         return self.__global_selection.selected_body
@@ -65,9 +69,16 @@ class VelocityController(GlobalClickable):
         # flipping the y axis, coz in the screen coordinates it points downwards
         new_velocity.y = -new_velocity.y
 
+        # the arrow shows the velocity relative to the origin
+        if self.__reference_frame_manager is not None:
+            new_velocity = self.__reference_frame_manager.to_world_velocity(new_velocity)
+
         # applying the new velocity
         rigidbody = self.__get_selected_body().rigidbody
 
         rigidbody.velocity = new_velocity
 
         self.environment.event_system.raise_event(SelectedBodyVelocityUpdateEvent())
+        self.environment.event_system.raise_event(
+            BodyStateEditedEvent(rigidbody, BodyStateEditedEvent.VELOCITY, tuple(rigidbody.velocity))
+        )
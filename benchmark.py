@@ -0,0 +1,237 @@
+"""
+Measures the gravity solvers on a random disk of bodies.
+
+Usage: python benchmark.py parallel [--bodies N [N ...]] [--workers W [W ...]] [--repeat R] [--seed S]
+       python benchmark.py fmm [--bodies N [N ...]] [--orders P [P ...]] [--opening-angle A] [--leaf-size L]
+                               [--sample K] [--seed S]
+       python benchmark.py broadphase [--bodies N [N ...]] [--steps T] [--repeat R] [--seed S]
+
+parallel times the direct solver, then the parallel solver for every worker count,
+the speedup is relative to the direct solver.
+fmm times the FMM solver for every expansion order and measures the error of its fields against the direct sum,
+which is only computed for a random sample of K bodies, since it takes O(N^2)
+broadphase times the pymunk steps with the bounding box tree, the spatial hash and the bounding box tree
+with 2 threads on a sparse scene, a scene with the radii spread over 4 orders of magnitude and a dense scene,
+the speedup is relative to the bounding box tree. There is no gravity, only the collisions are timed
+"""
+from defaults import DirectSolver, ParallelDirectSolver, FMMSolver, GravitySolver
+from sophysics_engine import SimEnvironment, SimObject, Transform, TimeSettings, PhysicsManager, RigidBody
+from typing import List, Tuple
+import argparse
+import pygame
+import pymunk
+import random
+import time
+import math
+
+
+def get_disk(body_count: int, seed: int) -> Tuple[List[float], List[float], List[float]]:
+    """
+    The positions and the masses of the bodies spread uniformly over a unit disk
+    """
+    generator = random.Random(seed)
+    xs = []
+    ys = []
+    masses = []
+
+    for _ in range(body_count):
+        radius = math.sqrt(generator.random())
+        angle = generator.uniform(0, 2 * math.pi)
+
+        xs.append(radius * math.cos(angle))
+        ys.append(radius * math.sin(angle))
+        masses.append(generator.uniform(0.5, 1.5))
+
+    return xs, ys, masses
+
+
+def time_solver(solver: GravitySolver, xs: List[float], ys: List[float], masses: List[float],
+                repeat: int) -> Tuple[float, List[float]]:
+    """
+    The best time of the given number of runs, and the x components of the field from the last one
+    """
+    excluded = [-1] * len(xs)
+    best_time = math.inf
+    field = None
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        field = solver.compute(xs, ys, excluded, xs, ys, masses)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, field.x
+
+
+def benchmark_parallel(arguments: argparse.Namespace):
+    solvers = [("direct", DirectSolver())]
+    # min_parallel_pairs is 0, so that even the small runs are sent to the workers
+    solvers += [(f"parallel x{workers}", ParallelDirectSolver(workers, min_parallel_pairs=0))
+                for workers in arguments.workers]
+
+    print(f"{'bodies':>8} {'solver':>14} {'time, s':>10} {'speedup':>8} {'identical':>10}")
+
+    try:
+        for body_count in arguments.bodies:
+            xs, ys, masses = get_disk(body_count, arguments.seed)
+            direct_time = None
+            direct_field = None
+
+            for name, solver in solvers:
+                # the first call starts the workers, so it isn't timed
+                solver.compute(xs[:2], ys[:2], [-1, -1], xs[:2], ys[:2], masses[:2])
+                elapsed_time, field = time_solver(solver, xs, ys, masses, arguments.repeat)
+
+                if direct_time is None:
+                    direct_time = elapsed_time
+                    direct_field = field
+
+                print(f"{body_count:>8} {name:>14} {elapsed_time:>10.4f} {direct_time / elapsed_time:>8.2f} "
+                      f"{str(field == direct_field):>10}")
+    finally:
+        for _, solver in solvers:
+            solver.close()
+
+
+def benchmark_fmm(arguments: argparse.Namespace):
+    print(f"{'bodies':>8} {'order':>6} {'time, s':>10} {'direct, s':>10} {'rms error':>10} {'max error':>10}")
+
+    for body_count in arguments.bodies:
+        xs, ys, masses = get_disk(body_count, arguments.seed)
+        excluded = [-1] * body_count
+
+        sample = random.Random(arguments.seed).sample(range(body_count), min(arguments.sample, body_count))
+        sample_xs = [xs[i] for i in sample]
+        sample_ys = [ys[i] for i in sample]
+
+        start_time = time.perf_counter()
+        reference = DirectSolver().compute(sample_xs, sample_ys, [-1] * len(sample), xs, ys, masses)
+        # the time the direct sum would take for all the bodies
+        direct_time = (time.perf_counter() - start_time) * body_count / len(sample)
+
+        for order in arguments.orders:
+            solver = FMMSolver(order, arguments.opening_angle, arguments.leaf_size)
+
+            start_time = time.perf_counter()
+            field = solver.compute(xs, ys, excluded, xs, ys, masses)
+            elapsed_time = time.perf_counter() - start_time
+
+            # the size of the difference relative to the size of the field
+            errors = [math.hypot(field.x[i] - reference_x, field.y[i] - reference_y)
+                      / math.hypot(reference_x, reference_y)
+                      for i, reference_x, reference_y in zip(sample, reference.x, reference.y)]
+            rms_error = math.sqrt(math.fsum(error * error for error in errors) / len(errors))
+
+            print(f"{body_count:>8} {order:>6} {elapsed_time:>10.3f} {direct_time:>10.3f} "
+                  f"{rms_error:>10.2e} {max(errors):>10.2e}")
+
+
+# the name of the scene, the spread of the positions and the range of the radii, relative to the radius
+# of the disk the bodies are spread over
+BROADPHASE_SCENES = [
+    ("sparse", 1.0, (1e-4, 1e-4)),
+    ("wide radius", 1.0, (1e-6, 1e-2)),
+    ("dense", 0.02, (1e-4, 1e-4)),
+]
+
+# the parameters of the physics manager for every broadphase
+BROADPHASES = [
+    ("bbtree", {"broadphase": PhysicsManager.BOUNDING_BOX_TREE}),
+    ("spatial_hash", {"broadphase": PhysicsManager.SPATIAL_HASH}),
+    ("bbtree x2", {"broadphase": PhysicsManager.BOUNDING_BOX_TREE, "threads": 2}),
+]
+
+BROADPHASE_DISK_RADIUS = 1e10
+BROADPHASE_DT = 15
+
+
+def get_broadphase_environment(body_count: int, spread: float, radius_range: Tuple[float, float], seed: int,
+                               **physics_manager_args) -> SimEnvironment:
+    """
+    An environment with only the pymunk physics and the bodies at rest on a random disk.
+    The bodies don't merge, so the overlapping ones keep pushing each other apart
+    """
+    xs, ys, masses = get_disk(body_count, seed)
+    generator = random.Random(seed)
+    min_radius, max_radius = radius_range
+    scale = BROADPHASE_DISK_RADIUS * spread
+
+    bodies = []
+    for i, (x, y, mass) in enumerate(zip(xs, ys, masses)):
+        # the radii are spread uniformly on the logarithmic scale
+        radius = math.exp(generator.uniform(math.log(min_radius), math.log(max_radius))) * BROADPHASE_DISK_RADIUS
+        shape = pymunk.Circle(None, radius)
+        shape.mass = mass
+        shape.elasticity = 0.0
+        bodies.append(SimObject(str(i), (Transform(pygame.Vector2(x * scale, y * scale)), RigidBody((shape, )))))
+
+    environment = SimEnvironment((), (TimeSettings(dt=BROADPHASE_DT), PhysicsManager(**physics_manager_args)))
+    environment.attach_sim_objects(bodies)
+
+    return environment
+
+
+def benchmark_broadphase(arguments: argparse.Namespace):
+    print(f"{'bodies':>8} {'scene':>12} {'broadphase':>14} {'step, ms':>10} {'speedup':>8}")
+
+    for body_count in arguments.bodies:
+        for scene_name, spread, radius_range in BROADPHASE_SCENES:
+            bbtree_time = None
+
+            for name, physics_manager_args in BROADPHASES:
+                environment = get_broadphase_environment(body_count, spread, radius_range, arguments.seed,
+                                                         **physics_manager_args)
+                # the first step builds the spatial index, so it isn't timed
+                environment.advance()
+
+                best_time = math.inf
+                for _ in range(arguments.repeat):
+                    start_time = time.perf_counter()
+                    for _ in range(arguments.steps):
+                        environment.advance()
+                    best_time = min(best_time, (time.perf_counter() - start_time) / arguments.steps)
+
+                environment.destroy()
+
+                if bbtree_time is None:
+                    bbtree_time = best_time
+
+                print(f"{body_count:>8} {scene_name:>12} {name:>14} {best_time * 1000:>10.3f} "
+                      f"{bbtree_time / best_time:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    parallel_parser = subparsers.add_parser("parallel", help="compare the parallel solver to the direct one")
+    parallel_parser.add_argument("--bodies", type=int, nargs="+", default=[1000, 2000, 4000])
+    parallel_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parallel_parser.add_argument("--repeat", type=int, default=3)
+    parallel_parser.add_argument("--seed", type=int, default=0)
+
+    fmm_parser = subparsers.add_parser("fmm", help="measure the time and the error of the FMM solver")
+    fmm_parser.add_argument("--bodies", type=int, nargs="+", default=[10000, 100000])
+    fmm_parser.add_argument("--orders", type=int, nargs="+", default=[4, 6, 8])
+    fmm_parser.add_argument("--opening-angle", type=float, default=0.5)
+    fmm_parser.add_argument("--leaf-size", type=int, default=32)
+    fmm_parser.add_argument("--sample", type=int, default=500)
+    fmm_parser.add_argument("--seed", type=int, default=0)
+
+    broadphase_parser = subparsers.add_parser("broadphase", help="compare the broadphases of the pymunk physics")
+    broadphase_parser.add_argument("--bodies", type=int, nargs="+", default=[500, 2000, 5000])
+    broadphase_parser.add_argument("--steps", type=int, default=20)
+    broadphase_parser.add_argument("--repeat", type=int, default=3)
+    broadphase_parser.add_argument("--seed", type=int, default=0)
+
+    arguments = parser.parse_args()
+
+    if arguments.mode == "parallel":
+        benchmark_parallel(arguments)
+    elif arguments.mode == "fmm":
+        benchmark_fmm(arguments)
+    else:
+        benchmark_broadphase(arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,3 +14,6 @@ from .global_clickable import GlobalClickable
 from .pause_on_spacebar import PauseOnSpacebar
 from .attraction import AttractionManager, Attraction
 from .global_clickable import ClickableManager
+from .kepler import propagate_kepler
+from .gravity_solvers import GravitySolver, GravityField, DirectSolver, ParallelDirectSolver, FMMSolver, \
+    get_gravity_solver
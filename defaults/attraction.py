@@ -1,26 +1,420 @@
 from __future__ import annotations
 
-from sophysics_engine import Force, EnvironmentComponent
-from typing import Optional, Set
+from sophysics_engine import Force, EnvironmentComponent, RigidBody, RigidBodyExertArrayForcesEvent, \
+    PrePhysicsUpdateEvent, PostIntegrationEvent, TimeSettings, PhysicsManager
+from .kepler import propagate_kepler
+from .gravity_solvers import GravitySolver, get_gravity_solver, force_factor, potential_factor, \
+    NO_SOFTENING, PLUMMER, SPLINE, SPLINE_RADIUS_FACTOR, NAIVE_SUMMATION, NEUMAIER_SUMMATION, SUMMATION_FUNCTIONS
+from typing import Optional, Dict, KeysView, Sequence, List, Tuple
+import logging
 import pygame
+import pymunk
+import math
+
+
+_logger = logging.getLogger(__name__)
 
 
 class AttractionManager(EnvironmentComponent):
-    def __init__(self, attraction_coefficient: float):
+    """
+    Keeps track of the Attraction forces.
+
+    The force can be softened, so that the bodies that get very close to each other don't get enormous forces:
+    "plummer" replaces r^2 with r^2 + softening_length^2, "spline" uses the cubic spline kernel,
+    which is exactly Newtonian beyond 2.8 * softening_length.
+
+    With the regularization, the tight pairs of attractors are moved along their Kepler orbits instead,
+    and only the forces from the rest of the bodies are integrated for them.
+
+    In the gravity only mode of the PhysicsManager, the forces of all the bodies are computed at once by the solver,
+    one of the gravity_solvers.SOLVERS
+    """
+    NO_SOFTENING = NO_SOFTENING
+    PLUMMER = PLUMMER
+    SPLINE = SPLINE
+    SPLINE_RADIUS_FACTOR = SPLINE_RADIUS_FACTOR
+
+    def __init__(self, attraction_coefficient: float, softening: str = NO_SOFTENING, softening_length: float = 0.0,
+                 regularization: bool = False, regularization_steps: float = 100, solver: str = "direct",
+                 solver_settings: Optional[Dict] = None, summation: str = NAIVE_SUMMATION):
+        """
+        :param softening: "none", "plummer" or "spline"
+        :param softening_length: the length the force is softened at
+        :param regularization: whether to move the tight pairs of attractors along their Kepler orbits
+        :param regularization_steps: a bound pair of attractors that are the closest attractors to each other
+                                     is regularized if it makes an orbit in fewer steps than this
+        :param solver: the name of the gravity solver, "direct", "parallel" or "fmm" (see get_gravity_solver()).
+                       Only the gravity only mode of the PhysicsManager uses it, a warning is logged otherwise
+        :param solver_settings: the arguments of the gravity solver's constructor: workers, tiles_per_worker and
+                                min_parallel_pairs for ParallelDirectSolver, order, opening_angle and leaf_size
+                                for FMMSolver
+        :param summation: how the forces from the attractors are summed up, "naive", "neumaier" or "fsum"
+                          (see GravitySolver)
+        """
+        if softening not in (self.NO_SOFTENING, self.PLUMMER, self.SPLINE):
+            raise ValueError(f"softening must be one of '{self.NO_SOFTENING}', '{self.PLUMMER}', '{self.SPLINE}'")
+
+        if softening_length < 0:
+            raise ValueError("softening_length can't be negative")
+
+        if regularization_steps <= 0:
+            raise ValueError("regularization_steps must be positive")
+
+        if summation not in SUMMATION_FUNCTIONS:
+            raise ValueError(f"summation must be one of {', '.join(SUMMATION_FUNCTIONS)}")
+
         self.attraction_coefficient = attraction_coefficient
-        self.__attractors: Set[Attraction] = set()
+        self.__softening = softening
+        self.__softening_length = softening_length
+        self.__regularization = regularization
+        self.__regularization_steps = regularization_steps
+        self.__solver_name = solver
+        self.__solver_settings = dict(solver_settings or {})
+        self.__solver = get_gravity_solver(solver, **self.__solver_settings)
+        self.__summation = summation
+
+        # a dict is used as an ordered set, so that the forces are always summed up in the same order
+        self.__attractors: Dict[Attraction, None] = {}
+        # all attraction forces, including the ones that don't attract
+        self.__attractions: Dict[Attraction, None] = {}
+
+        # the regularized pairs in both directions, their mutual force isn't applied
+        self.__binary_partners: Dict[Attraction, Attraction] = {}
+        # the pairs and their relative positions and velocities from the start of the step
+        self.__binaries: List[Tuple[Attraction, Attraction, float, float, float, float]] = []
+
+        # the potential energy of every body with the attractors, while it's computed with the forces
+        self.__potential_terms: Optional[Dict[Attraction, float]] = None
+        self.__potential_energy: Optional[float] = None
+
+        self.__time_settings: Optional[TimeSettings] = None
 
         super().__init__()
 
+    def setup(self):
+        super().setup()
+        self.__time_settings = self.environment.get_component(TimeSettings)
+
+        # the solver only computes the forces in the gravity only mode, the pymunk mode sums them up directly
+        physics_manager = self.environment.try_get_component(PhysicsManager)
+        if self.__solver_name != "direct" and physics_manager is not None \
+                and physics_manager.mode != PhysicsManager.GRAVITY_ONLY:
+            _logger.warning("The '%s' gravity solver is ignored in the '%s' physics mode, it's only used in the '%s' "
+                            "mode", self.__solver_name, physics_manager.mode, PhysicsManager.GRAVITY_ONLY)
+
+        event_system = self.environment.event_system
+        event_system.add_listener(RigidBodyExertArrayForcesEvent, self.__handle_exert_array_forces_event)
+        event_system.add_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+        event_system.add_listener(PostIntegrationEvent, self.__handle_post_integration_event)
+
+    @property
+    def softening(self) -> str:
+        return self.__softening
+
+    @property
+    def softening_length(self) -> float:
+        return self.__softening_length
+
+    @property
+    def regularization(self) -> bool:
+        return self.__regularization
+
+    @property
+    def regularization_steps(self) -> float:
+        return self.__regularization_steps
+
+    @property
+    def solver_name(self) -> str:
+        return self.__solver_name
+
+    @property
+    def solver_settings(self) -> Dict:
+        return dict(self.__solver_settings)
+
     @property
-    def attractors(self) -> Set[Attraction]:
-        return self.__attractors
+    def solver(self) -> GravitySolver:
+        return self.__solver
+
+    @property
+    def summation(self) -> str:
+        return self.__summation
+
+    @property
+    def binary_partners(self) -> Dict[Attraction, Attraction]:
+        """
+        The regularized pairs of the current step, in both directions
+        """
+        return self.__binary_partners
+
+    @property
+    def potential_terms(self) -> Optional[Dict[Attraction, float]]:
+        """
+        The potential energy terms the bodies have added during the current step, None if it's not requested
+        """
+        return self.__potential_terms
+
+    @property
+    def potential_energy(self) -> Optional[float]:
+        """
+        The total potential energy at the start of the last step it was requested for,
+        None if it was never requested
+        """
+        return self.__potential_energy
+
+    def request_potential_energy(self):
+        """
+        Makes the next step sum up the potential energy from the same pairs of bodies it computes the forces for.
+
+        The result is in potential_energy after the bodies are integrated
+        """
+        self.__potential_terms = {}
+
+    def get_potential_factor(self, distance_squared: float) -> float:
+        """
+        The potential energy of 2 bodies divided by -G * m1 * m2, consistent with get_force_factor()
+        """
+        return potential_factor(distance_squared, self.__softening, self.__softening_length)
+
+    def get_force_factor(self, distance_squared: float) -> float:
+        """
+        The force between 2 bodies divided by G * m1 * m2 * distance,
+        multiplying it by the vector between the bodies gives the force vector
+        """
+        return force_factor(distance_squared, self.__softening, self.__softening_length)
+
+    @property
+    def attractors(self) -> KeysView[Attraction]:
+        return self.__attractors.keys()
+
+    @property
+    def attractions(self) -> KeysView[Attraction]:
+        return self.__attractions.keys()
+
+    def add_attraction(self, attraction: Attraction):
+        self.__attractions[attraction] = None
+
+        if attraction.is_attractor:
+            self.__attractors[attraction] = None
+
+    def add_attractions(self, attractions: Sequence[Attraction]):
+        self.__attractions.update(dict.fromkeys(attractions))
+        self.__attractors.update(dict.fromkeys(attraction for attraction in attractions if attraction.is_attractor))
+
+    def remove_attraction(self, attraction: Attraction):
+        del self.__attractions[attraction]
+
+        if attraction.is_attractor:
+            del self.__attractors[attraction]
+
+    def remove_attractions(self, attractions: Sequence[Attraction]):
+        for attraction in attractions:
+            self.remove_attraction(attraction)
 
     def add_attractor(self, attractor: Attraction):
-        self.__attractors.add(attractor)
+        self.__attractors[attractor] = None
 
     def remove_attractor(self, attractor: Attraction):
-        self.__attractors.remove(attractor)
+        del self.__attractors[attractor]
+
+    def __handle_exert_array_forces_event(self, event: RigidBodyExertArrayForcesEvent):
+        """
+        Applies the gravity to all the bodies at once, in the gravity only mode of the PhysicsManager
+        """
+        bodies = event.bodies
+        index_of = bodies.index_of
+        xs, ys, masses = bodies.x, bodies.y, bodies.mass
+        force_x, force_y = bodies.force_x, bodies.force_y
+
+        # the attractors are the sources of the field, every attraction is a target
+        source_indices: Dict[Attraction, int] = {}
+        source_xs = []
+        source_ys = []
+        source_masses = []
+        for attractor in self.__attractors:
+            index = index_of.get(attractor.rigidbody, None)
+
+            if index is not None:
+                source_indices[attractor] = len(source_xs)
+                source_xs.append(xs[index])
+                source_ys.append(ys[index])
+                source_masses.append(masses[index])
+
+        binary_partners = self.__binary_partners
+        targets = []
+        target_xs = []
+        target_ys = []
+        # the force from the regularized partner is replaced by the Kepler orbit
+        excluded = []
+        for attraction in self.__attractions:
+            index = index_of.get(attraction.rigidbody, None)
+
+            if index is not None:
+                targets.append((attraction, index))
+                target_xs.append(xs[index])
+                target_ys.append(ys[index])
+                excluded.append(source_indices.get(binary_partners.get(attraction, None), -1))
+
+        # the potential is only computed in the first substep
+        potential_terms = self.__potential_terms
+        compute_potential = potential_terms is not None and not potential_terms
+
+        field = self.__solver.compute(target_xs, target_ys, excluded, source_xs, source_ys, source_masses,
+                                      self.__softening, self.__softening_length, compute_potential,
+                                      self.__summation)
+        coefficient = self.attraction_coefficient
+
+        for i, (attraction, index) in enumerate(targets):
+            # G * m1, the field already has the rest of the Newton's law of Gravitation
+            this_coefficient = coefficient * masses[index]
+
+            force_x[index] += this_coefficient * field.x[i]
+            force_y[index] += this_coefficient * field.y[i]
+
+            if not compute_potential:
+                continue
+
+            potential = -this_coefficient * field.potential[i]
+
+            partner_index = excluded[i]
+            if partner_index >= 0:
+                distance = math.hypot(source_xs[partner_index] - target_xs[i], source_ys[partner_index] - target_ys[i])
+                if distance > 0:
+                    potential -= this_coefficient * source_masses[partner_index] / distance
+
+            # the pairs of attractors are counted from both sides
+            potential_terms[attraction] = potential / 2 if attraction.is_attractor else potential
+
+        event.mark_handled(Attraction)
+
+    def __handle_pre_physics_update_event(self, _: PrePhysicsUpdateEvent):
+        if self.__regularization:
+            self.__find_binaries()
+
+    def __find_binaries(self):
+        """
+        Finds the bound pairs of attractors that are the closest attractors to each other
+        and orbit each other too fast for the time step
+        """
+        dynamic = pymunk.Body.DYNAMIC
+        attractors = [attractor for attractor in self.__attractors
+                      if attractor.sim_object is not None and attractor.rigidbody.body.body_type == dynamic]
+        positions = [tuple(attractor.sim_object.transform.position) for attractor in attractors]
+
+        nearest = []
+        for i, (x, y) in enumerate(positions):
+            nearest_index = None
+            nearest_distance_squared = math.inf
+
+            for j, (other_x, other_y) in enumerate(positions):
+                distance_squared = (other_x - x) ** 2 + (other_y - y) ** 2
+
+                if i != j and 0 < distance_squared < nearest_distance_squared:
+                    nearest_index = j
+                    nearest_distance_squared = distance_squared
+
+            nearest.append(nearest_index)
+
+        max_period = self.__regularization_steps * self.__time_settings.dt
+
+        for i, j in enumerate(nearest):
+            if j is None or j <= i or nearest[j] != i:
+                continue
+
+            attractor1 = attractors[i]
+            attractor2 = attractors[j]
+            velocity1 = attractor1.rigidbody.velocity
+            velocity2 = attractor2.rigidbody.velocity
+
+            rx = positions[j][0] - positions[i][0]
+            ry = positions[j][1] - positions[i][1]
+            vx = velocity2.x - velocity1.x
+            vy = velocity2.y - velocity1.y
+
+            mu = self.attraction_coefficient * (attractor1.rigidbody.mass + attractor2.rigidbody.mass)
+            inverse_semi_major_axis = 2 / math.hypot(rx, ry) - (vx * vx + vy * vy) / mu if mu > 0 else 0
+
+            # unbound
+            if inverse_semi_major_axis <= 0:
+                continue
+
+            period = 2 * math.pi * math.sqrt(1 / (inverse_semi_major_axis ** 3 * mu))
+            if period >= max_period:
+                continue
+
+            self.__binary_partners[attractor1] = attractor2
+            self.__binary_partners[attractor2] = attractor1
+            self.__binaries.append((attractor1, attractor2, rx, ry, vx, vy))
+
+    def __handle_post_integration_event(self, _: PostIntegrationEvent):
+        if self.__potential_terms is not None:
+            self.__potential_energy = math.fsum(self.__potential_terms.values())
+            self.__potential_terms = None
+
+        self.__integrate_binaries()
+
+    def __integrate_binaries(self):
+        """
+        Replaces the relative motion of the regularized pairs with their Kepler orbits,
+        keeping the changes made by the other forces
+        """
+        dt = self.__time_settings.dt
+
+        for attractor1, attractor2, rx, ry, vx, vy in self.__binaries:
+            if attractor1.sim_object is None or attractor2.sim_object is None:
+                continue
+
+            rigidbody1 = attractor1.rigidbody
+            rigidbody2 = attractor2.rigidbody
+            position1 = rigidbody1.sim_object.transform.position
+            position2 = rigidbody2.sim_object.transform.position
+            velocity1 = rigidbody1.velocity
+            velocity2 = rigidbody2.velocity
+
+            # without the mutual force, the relative motion is a straight line plus what the other forces did
+            external_rx = position2.x - position1.x - (rx + vx * dt)
+            external_ry = position2.y - position1.y - (ry + vy * dt)
+            external_vx = velocity2.x - velocity1.x - vx
+            external_vy = velocity2.y - velocity1.y - vy
+
+            mass1 = rigidbody1.mass
+            mass2 = rigidbody2.mass
+            total_mass = mass1 + mass2
+            kepler_rx, kepler_ry, kepler_vx, kepler_vy = propagate_kepler(
+                self.attraction_coefficient * total_mass, rx, ry, vx, vy, dt
+            )
+            new_rx = kepler_rx + external_rx
+            new_ry = kepler_ry + external_ry
+            new_vx = kepler_vx + external_vx
+            new_vy = kepler_vy + external_vy
+
+            # the center of mass and the momentum stay the same
+            center_x = (mass1 * position1.x + mass2 * position2.x) / total_mass
+            center_y = (mass1 * position1.y + mass2 * position2.y) / total_mass
+            center_vx = (mass1 * velocity1.x + mass2 * velocity2.x) / total_mass
+            center_vy = (mass1 * velocity1.y + mass2 * velocity2.y) / total_mass
+
+            for rigidbody, share in ((rigidbody1, -mass2 / total_mass), (rigidbody2, mass1 / total_mass)):
+                position = (center_x + share * new_rx, center_y + share * new_ry)
+                rigidbody.sim_object.transform.position = position
+                rigidbody.body.position = pymunk.Vec2d(*position)
+                rigidbody.velocity = (center_vx + share * new_vx, center_vy + share * new_vy)
+
+        self.__binaries.clear()
+        self.__binary_partners.clear()
+
+    def _on_destroy(self):
+        event_system = self.environment.event_system
+        event_system.remove_listener(RigidBodyExertArrayForcesEvent, self.__handle_exert_array_forces_event)
+        event_system.remove_listener(PrePhysicsUpdateEvent, self.__handle_pre_physics_update_event)
+        event_system.remove_listener(PostIntegrationEvent, self.__handle_post_integration_event)
+
+        self.__binaries.clear()
+        self.__binary_partners.clear()
+        self.__potential_terms = None
+        self.__time_settings = None
+        self.__solver.close()
+
+        super()._on_destroy()
 
 
 class Attraction(Force):
@@ -40,17 +434,54 @@ class Attraction(Force):
     def is_attractor(self) -> bool:
         return self.__is_attractor
 
+    @property
+    def rigidbody(self) -> RigidBody:
+        return self._rigidbody
+
     def setup(self):
         super().setup()
         self.__attraction_manager: AttractionManager = self.sim_object.environment.get_component(AttractionManager)
+        self.__attraction_manager.add_attraction(self)
+
+    @classmethod
+    def batch_setup(cls, components: Sequence[Attraction]):
+        if cls.setup is not Attraction.setup or not components:
+            cls._setup_each(components)
+            return
+
+        cls._batch_setup_forces(components)
 
-        if self.__is_attractor:
-            self.__attraction_manager.add_attractor(self)
+        attraction_manager = components[0].sim_object.environment.get_component(AttractionManager)
+
+        for attraction in components:
+            attraction.__attraction_manager = attraction_manager
+
+        attraction_manager.add_attractions(components)
 
     def exert(self):
         total_force = pygame.Vector2()
+        attraction_manager = self.__attraction_manager
+        # the force from the regularized partner is replaced by the Kepler orbit
+        partner = attraction_manager.binary_partners.get(self, None)
+
+        # the potential is only computed in the first substep
+        potential_terms = attraction_manager.potential_terms
+        compute_potential = potential_terms is not None and self not in potential_terms
+        potential = 0.0
+
+        # the forces are collected to be summed up exactly at the end,
+        # the compensated summation carries the rounding errors over in the loop instead
+        summation = attraction_manager.summation
+        is_naive = summation == NAIVE_SUMMATION
+        is_compensated = summation == NEUMAIER_SUMMATION
+        forces_x = []
+        forces_y = []
+        total_x = 0.0
+        total_y = 0.0
+        error_x = 0.0
+        error_y = 0.0
 
-        for other in self.__attraction_manager.attractors:
+        for other in attraction_manager.attractors:
             if self is other:
                 continue
 
@@ -66,24 +497,70 @@ class Attraction(Force):
 
             # this is more efficient than computing the actual distance (since we don't need the sqrt)
             # (we still need the sqrt later tho)
-            distance_squared = this_pos.distance_squared_to(other_pos)
+            distance = other_pos - this_pos
+            distance_squared = distance.length_squared()
 
-            coefficient = self.__attraction_manager.attraction_coefficient
+            coefficient = attraction_manager.attraction_coefficient
+
+            if other is partner:
+                if compute_potential:
+                    potential -= coefficient * this_mass * other_mass / math.sqrt(distance_squared)
+
+                continue
+
+            if compute_potential:
+                potential -= coefficient * this_mass * other_mass * attraction_manager.get_potential_factor(
+                    distance_squared
+                )
 
             # The Newton's law of Gravitation
             # F = G * m1 * m2 / r^2
-            force_scalar = coefficient * this_mass * other_mass / distance_squared
+            # the factor is 1 / r^3 without softening, multiplying it by the vector between the bodies gives
+            # the force vector
+            force_vector = coefficient * this_mass * other_mass * attraction_manager.get_force_factor(
+                distance_squared
+            ) * distance
 
-            # to find the vector of the force, multiply the scalar by the direction
-            direction = (other_pos - this_pos).normalize()
-            force_vector = force_scalar * direction
+            if is_naive:
+                total_force += force_vector
+            elif is_compensated:
+                # the exact rounding errors of the additions, without the branches (Knuth's two-sum)
+                force_x, force_y = force_vector
+                total = total_x + force_x
+                rounded = total - total_x
+                error_x += (total_x - (total - rounded)) + (force_x - rounded)
+                total_x = total
 
-            total_force += force_vector
+                total = total_y + force_y
+                rounded = total - total_y
+                error_y += (total_y - (total - rounded)) + (force_y - rounded)
+                total_y = total
+            else:
+                forces_x.append(force_vector.x)
+                forces_y.append(force_vector.y)
+
+        if is_compensated:
+            total_force = pygame.Vector2(total_x + error_x, total_y + error_y)
+        elif not is_naive:
+            sum_terms = SUMMATION_FUNCTIONS[summation]
+            total_force = pygame.Vector2(sum_terms(forces_x), sum_terms(forces_y))
+
+        if compute_potential:
+            # the pairs of attractors are counted from both sides
+            potential_terms[self] = potential / 2 if self.__is_attractor else potential
 
         self._rigidbody.apply_force(total_force)
 
     def _on_destroy(self):
-        if self.__is_attractor:
-            self.__attraction_manager.remove_attractor(self)
+        self.__attraction_manager.remove_attraction(self)
 
         super()._on_destroy()
+
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[Attraction]):
+        if cls._on_destroy is not Attraction._on_destroy or not components:
+            cls._on_destroy_each(components)
+            return
+
+        components[0].__attraction_manager.remove_attractions(components)
+        cls._batch_on_destroy_forces(components)
@@ -1,5 +1,6 @@
 from .clickable import Clickable
 from sophysics_engine import Camera
+from typing import Optional, Tuple
 import pygame
 
 
@@ -8,16 +9,27 @@ class CircleClickable(Clickable):
                  radius: float,
                  button: int = 1,
                  min_pixel_radius: int = 0,
-                 hold_time = 0):
+                 hold_time = 0,
+                 layer: int = 0):
         """
         :param radius: radius of the object in world units
         :param min_pixel_radius: minimal radius of the object in screen units
+        :param layer: when objects overlap, the one on the highest layer gets clicked
         """
         self._camera = camera
         self.radius = radius
         self.min_pixel_radius = min_pixel_radius
 
-        super().__init__(button, hold_time)
+        super().__init__(button, hold_time, layer)
+
+    def _is_hit_testable(self) -> bool:
+        return True
+
+    def _get_hit_circle(self) -> Optional[Tuple[Tuple[float, float], float]]:
+        screen_radius = max(self.radius * self._camera.pixels_per_unit, self.min_pixel_radius)
+        screen_position = self._camera.world_to_screen(self.sim_object.transform.position)
+
+        return screen_position, screen_radius
 
     def _mouse_on_object(self):
         # doing squared distances since it's less computationally intensive than doing square roots
@@ -1,7 +1,7 @@
-from .global_clickable import ClickEvent
+from .global_clickable import ClickEvent, ClickableManager
 from sophysics_engine import MonoBehavior
 from time import process_time
-from typing import Optional
+from typing import Optional, Tuple
 from abc import ABC, abstractmethod
 import pygame
 
@@ -9,16 +9,29 @@ import pygame
 class Clickable(MonoBehavior, ABC):
     """
     Note, that, in order for this component to work, the environment must have a global clickable component
+
+    Clickables that can be hit tested (see _is_hit_testable) are registered with the clickable manager, which
+    only passes the click to the topmost one under the cursor. The rest listen to click events.
     """
-    def __init__(self, button: int = 1, hold_time: float = 0):
+    def __init__(self, button: int = 1, hold_time: float = 0, layer: int = 0):
+        """
+        :param layer: clickables on higher layers take the click first, when they overlap
+        """
         self.__button = button
         self.__hold_time = hold_time
+        self.layer = layer
 
         self.__hold_start_time: Optional[float] = None
         self.__was_holding = False
 
+        self.__clickable_manager: Optional[ClickableManager] = None
+
         super().__init__()
 
+    @property
+    def button(self) -> int:
+        return self.__button
+
     @abstractmethod
     def _mouse_on_object(self) -> bool:
         """
@@ -26,13 +39,40 @@ class Clickable(MonoBehavior, ABC):
         """
         pass
 
+    def _is_hit_testable(self) -> bool:
+        """
+        Returns True if the clickable can be put into the hit test index of the clickable manager,
+        in which case _get_hit_circle has to be implemented
+        """
+        return False
+
+    def _get_hit_circle(self) -> Optional[Tuple[Tuple[float, float], float]]:
+        """
+        Returns the center and the radius of the clickable area in screen coordinates,
+        or None if it can't be clicked on right now
+        """
+        return None
+
     def _start(self):
-        self.sim_object.environment.event_system.add_listener(ClickEvent, self.__handle_click_event)
+        if self._is_hit_testable():
+            self.__clickable_manager = self.sim_object.environment.try_get_component(ClickableManager)
+
+        if self.__clickable_manager is not None:
+            self.__clickable_manager.register(self)
+        else:
+            self.sim_object.environment.event_system.add_listener(ClickEvent, self.__handle_click_event)
+
         self._clickable_start()
 
     def _clickable_start(self):
         pass
 
+    def process_click(self, event: ClickEvent):
+        """
+        Handles a click event. Called by the clickable manager, or by the event system
+        """
+        self.__handle_click_event(event)
+
     def __handle_click_event(self, event: ClickEvent):
         if event.consumed:
             return
@@ -112,5 +152,10 @@ class Clickable(MonoBehavior, ABC):
         pass
 
     def _end(self):
-        self.sim_object.environment.event_system.remove_listener(ClickEvent, self.__handle_click_event)
+        if self.__clickable_manager is not None:
+            self.__clickable_manager.unregister(self)
+            self.__clickable_manager = None
+        else:
+            self.sim_object.environment.event_system.remove_listener(ClickEvent, self.__handle_click_event)
+
         self._clickable_end()
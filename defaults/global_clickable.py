@@ -1,9 +1,13 @@
+from __future__ import annotations
 import pygame
 
 from sophysics_engine import Event, PygameEvent, GlobalBehavior
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Set, TYPE_CHECKING
 from time import process_time
 
+if TYPE_CHECKING:
+    from .clickable import Clickable
+
 
 class ClickEvent(Event):
     """
@@ -38,18 +42,131 @@ class ClickEvent(Event):
 
 
 class ClickableManager(GlobalBehavior):
-    def __init__(self, rect: pygame.Rect):
+    """
+    Turns mouse button events inside the rect into click events.
+
+    Clickables that occupy an area on the screen register with the manager, which keeps them in a uniform grid
+    in screen space. A mouse down is dispatched only to the topmost registered clickable under the cursor:
+    the one on the highest layer, then the one whose center is closest to the cursor, then the one that
+    registered first. After that, the click event is raised for the rest of the listeners.
+    """
+    def __init__(self, rect: pygame.Rect, cell_size: int = 64):
+        """
+        :param rect: the area of the screen where clicks are registered
+        :param cell_size: the size of a cell of the hit test grid in pixels
+        """
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+
         self.__rect = rect
+        self.__cell_size = cell_size
+
+        # the values are the order of registration, used to break ties
+        self.__clickables: Dict[Clickable, int] = {}
+        self.__registration_counter = 0
+
+        # cell -> (clickable, screen center, squared screen radius, layer, registration order)
+        self.__grid: Dict[Tuple[int, int], List[Tuple[Clickable, pygame.Vector2, float, int, int]]] = {}
+        self.__index_is_valid = False
+
+        # clickables that received a mouse down, and are waiting for the mouse up, by button
+        self.__pressed: Dict[int, Set[Clickable]] = {}
 
         super().__init__()
 
     def _start(self):
         self.environment.event_system.add_listener(PygameEvent, self.__handle_pygame_event)
 
+    def register(self, clickable: Clickable):
+        """
+        Adds a clickable to the hit test index
+        """
+        if clickable in self.__clickables:
+            return
+
+        self.__clickables[clickable] = self.__registration_counter
+        self.__registration_counter += 1
+        self.__index_is_valid = False
+
+    def unregister(self, clickable: Clickable):
+        """
+        Removes a clickable from the hit test index
+        """
+        if self.__clickables.pop(clickable, None) is None:
+            return
+
+        for pressed in self.__pressed.values():
+            pressed.discard(clickable)
+
+        self.__index_is_valid = False
+
+    def get_clickable_at(self, screen_position: Tuple[float, float], button: int) -> Optional[Clickable]:
+        """
+        Returns the topmost registered clickable at the given screen position, that reacts to the given button
+        """
+        if not self.__index_is_valid:
+            self.__rebuild_index()
+
+        position = pygame.Vector2(screen_position)
+        cell = self.__get_cell(position.x, position.y)
+
+        best_clickable = None
+        best_key = None
+
+        for clickable, center, radius_squared, layer, order in self.__grid.get(cell, ()):
+            if clickable.button != button:
+                continue
+
+            distance_squared = center.distance_squared_to(position)
+            if distance_squared > radius_squared:
+                continue
+
+            key = (-layer, distance_squared, order)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_clickable = clickable
+
+        return best_clickable
+
     def _mouse_inside_the_rect(self) -> bool:
         mouse_pos = pygame.mouse.get_pos()
         return self.__rect.collidepoint(mouse_pos)
 
+    def __get_cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int((x - self.__rect.left) // self.__cell_size), int((y - self.__rect.top) // self.__cell_size)
+
+    def __rebuild_index(self):
+        self.__grid.clear()
+
+        rect = self.__rect
+
+        for clickable, order in self.__clickables.items():
+            hit_circle = clickable._get_hit_circle()
+            if hit_circle is None:
+                continue
+
+            center, radius = hit_circle
+
+            # only the part of the circle inside the rect can be clicked on
+            min_x = max(center[0] - radius, rect.left)
+            max_x = min(center[0] + radius, rect.right - 1)
+            min_y = max(center[1] - radius, rect.top)
+            max_y = min(center[1] + radius, rect.bottom - 1)
+
+            if min_x > max_x or min_y > max_y:
+                continue
+
+            entry = (clickable, pygame.Vector2(center), radius ** 2, clickable.layer, order)
+
+            min_cell_x, min_cell_y = self.__get_cell(min_x, min_y)
+            max_cell_x, max_cell_y = self.__get_cell(max_x, max_y)
+
+            for cell_x in range(min_cell_x, max_cell_x + 1):
+                for cell_y in range(min_cell_y, max_cell_y + 1):
+                    self.__grid.setdefault((cell_x, cell_y), []).append(entry)
+
+        self.__index_is_valid = True
+
     def __handle_pygame_event(self, event: PygameEvent):
         if not self._mouse_inside_the_rect():
             return
@@ -58,10 +175,42 @@ class ClickableManager(GlobalBehavior):
         if not (pygame_event.type == pygame.MOUSEBUTTONUP or pygame_event.type == pygame.MOUSEBUTTONDOWN):
             return
         click_event = ClickEvent(pygame_event)
+
+        if pygame_event.type == pygame.MOUSEBUTTONDOWN:
+            self.__dispatch_mouse_down(click_event)
+        else:
+            self.__dispatch_mouse_up(click_event)
+
         self.environment.event_system.raise_event(click_event)
 
+    def __dispatch_mouse_down(self, click_event: ClickEvent):
+        button = click_event.pygame_event.button
+        clickable = self.get_clickable_at(click_event.pygame_event.pos, button)
+
+        if clickable is None:
+            return
+
+        self.__pressed.setdefault(button, set()).add(clickable)
+        clickable.process_click(click_event)
+
+    def __dispatch_mouse_up(self, click_event: ClickEvent):
+        pressed = self.__pressed.pop(click_event.pygame_event.button, None)
+
+        if pressed is None:
+            return
+
+        for clickable in pressed:
+            clickable.process_click(click_event)
+
+    def _update(self):
+        # the objects and the camera might have moved since the last frame
+        self.__index_is_valid = False
+
     def _end(self):
         self.environment.event_system.remove_listener(PygameEvent, self.__handle_pygame_event)
+        self.__clickables.clear()
+        self.__grid.clear()
+        self.__pressed.clear()
 
 
 class GlobalClickable(GlobalBehavior):
@@ -0,0 +1,1073 @@
+"""
+The backends that sum up the gravitational fields of the attractors at the positions of the bodies
+"""
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+from sophysics_engine.helper_functions import neumaier_sum
+from typing import NamedTuple, Optional, Dict, List, Sequence, Tuple, Iterable, Callable
+from operator import itemgetter, mul
+import multiprocessing
+import weakref
+import queue
+import array
+import math
+import os
+
+NO_SOFTENING = "none"
+PLUMMER = "plummer"
+SPLINE = "spline"
+
+# how the terms of the fields are summed up
+NAIVE_SUMMATION = "naive"
+NEUMAIER_SUMMATION = "neumaier"
+EXACT_SUMMATION = "fsum"
+SUMMATION_FUNCTIONS: Dict[str, Callable[[Iterable[float]], float]] = {
+    NAIVE_SUMMATION: sum,
+    NEUMAIER_SUMMATION: neumaier_sum,
+    EXACT_SUMMATION: math.fsum
+}
+
+# the spline kernel reaches the Newtonian force at this many softening lengths,
+# its potential at 0 is the same as Plummer's
+SPLINE_RADIUS_FACTOR = 2.8
+
+
+def force_factor(distance_squared: float, softening: str, softening_length: float) -> float:
+    """
+    The force between 2 bodies divided by G * m1 * m2 * distance,
+    multiplying it by the vector between the bodies gives the force vector
+    """
+    if distance_squared == 0:
+        return 0.0
+
+    if softening == PLUMMER:
+        softened_squared = distance_squared + softening_length ** 2
+        return 1 / (softened_squared * math.sqrt(softened_squared))
+
+    distance = math.sqrt(distance_squared)
+
+    if softening == SPLINE:
+        h = softening_length * SPLINE_RADIUS_FACTOR
+
+        if distance < h:
+            u = distance / h
+            inverse_h_cubed = 1 / (h * h * h)
+
+            if u < 0.5:
+                return inverse_h_cubed * (32 / 3 + u * u * (32 * u - 38.4))
+
+            return inverse_h_cubed * (64 / 3 - 48 * u + 38.4 * u * u - 32 / 3 * u * u * u - 1 / 15 / (u * u * u))
+
+    return 1 / (distance_squared * distance)
+
+
+def potential_factor(distance_squared: float, softening: str, softening_length: float) -> float:
+    """
+    The potential energy of 2 bodies divided by -G * m1 * m2, consistent with force_factor()
+    """
+    if distance_squared == 0 and softening == NO_SOFTENING:
+        return 0.0
+
+    if softening == PLUMMER:
+        return 1 / math.sqrt(distance_squared + softening_length ** 2)
+
+    distance = math.sqrt(distance_squared)
+
+    if softening == SPLINE:
+        h = softening_length * SPLINE_RADIUS_FACTOR
+
+        if distance < h:
+            u = distance / h
+
+            if u < 0.5:
+                return (2.8 - u * u * (16 / 3 + u * u * (6.4 * u - 9.6))) / h
+
+            return (3.2 - 1 / 15 / u - u * u * (32 / 3 + u * (-16 + u * (9.6 - 32 / 15 * u)))) / h
+
+    return 1 / distance
+
+
+class GravityField(NamedTuple):
+    # the field at every target, the acceleration divided by G
+    x: List[float]
+    y: List[float]
+    # the sum of m * potential_factor() over the sources for every target, None if it wasn't requested
+    potential: Optional[List[float]]
+
+
+class GravitySolver(ABC):
+    """
+    Computes the gravitational field of a set of point masses (the sources) at a set of positions (the targets).
+
+    The sources at exactly the same position as the target are skipped, so the targets can be the sources themselves.
+    Every target can also skip one more source, given by its index in the excluded sequence (-1 for none).
+
+    The summation is one of SUMMATION_FUNCTIONS: "naive" adds the terms up one by one, "neumaier" compensates
+    the rounding errors and "fsum" rounds the sum only once. The small terms (e.g. the moons next to the Sun)
+    are lost to the rounding with the naive summation
+    """
+    @abstractmethod
+    def compute(self, target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                source_xs: Sequence[float], source_ys: Sequence[float], source_masses: Sequence[float],
+                softening: str = NO_SOFTENING, softening_length: float = 0.0,
+                compute_potential: bool = False, summation: str = NAIVE_SUMMATION) -> GravityField:
+        pass
+
+    def close(self):
+        """
+        Frees the resources held by the solver, it can still be used afterwards
+        """
+        pass
+
+
+def _compute_fields(target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                    sources: Sequence[Tuple[float, float, float]], targets: Iterable[int],
+                    softening: str, softening_length: float, compute_potential: bool,
+                    summation: str = NAIVE_SUMMATION) -> Tuple[List[float], List[float], Optional[List[float]]]:
+    """
+    Sums up the fields of the sources at the targets with the given indices, every target in the same order,
+    so that the result doesn't depend on how the targets are split between the workers
+    """
+    if summation == NEUMAIER_SUMMATION:
+        return _compute_compensated_fields(target_xs, target_ys, excluded, sources, targets, softening,
+                                           softening_length, compute_potential)
+
+    if summation != NAIVE_SUMMATION:
+        return _compute_summed_fields(target_xs, target_ys, excluded, sources, targets, softening, softening_length,
+                                      compute_potential, SUMMATION_FUNCTIONS[summation])
+
+    sqrt = math.sqrt
+    is_softened = softening != NO_SOFTENING
+
+    fields_x = []
+    fields_y = []
+    potentials = [] if compute_potential else None
+
+    for i in targets:
+        x = target_xs[i]
+        y = target_ys[i]
+        skipped = int(excluded[i])
+        field_x = 0.0
+        field_y = 0.0
+        potential = 0.0
+
+        if not is_softened and skipped < 0:
+            # the most common case, without the function calls
+            for source_x, source_y, source_mass in sources:
+                dx = source_x - x
+                dy = source_y - y
+                distance_squared = dx * dx + dy * dy
+
+                # skips the body itself and the bodies that overlap perfectly
+                if distance_squared == 0:
+                    continue
+
+                distance = sqrt(distance_squared)
+                if compute_potential:
+                    potential += source_mass / distance
+
+                factor = source_mass / (distance_squared * distance)
+                field_x += factor * dx
+                field_y += factor * dy
+        else:
+            for j, (source_x, source_y, source_mass) in enumerate(sources):
+                dx = source_x - x
+                dy = source_y - y
+                distance_squared = dx * dx + dy * dy
+
+                if distance_squared == 0 or j == skipped:
+                    continue
+
+                if compute_potential:
+                    potential += source_mass * potential_factor(distance_squared, softening, softening_length)
+
+                factor = source_mass * force_factor(distance_squared, softening, softening_length)
+                field_x += factor * dx
+                field_y += factor * dy
+
+        fields_x.append(field_x)
+        fields_y.append(field_y)
+
+        if compute_potential:
+            potentials.append(potential)
+
+    return fields_x, fields_y, potentials
+
+
+def _compute_compensated_fields(target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                                sources: Sequence[Tuple[float, float, float]], targets: Iterable[int],
+                                softening: str, softening_length: float, compute_potential: bool
+                                ) -> Tuple[List[float], List[float], Optional[List[float]]]:
+    """
+    The same as _compute_fields(), but the rounding errors are carried over to the end of the sums.
+
+    The error of every addition is found without the branches of neumaier_sum() (Knuth's two-sum),
+    it's exactly the same error, so the result is the same as well
+    """
+    sqrt = math.sqrt
+    is_softened = softening != NO_SOFTENING
+
+    fields_x = []
+    fields_y = []
+    potentials = [] if compute_potential else None
+
+    for i in targets:
+        x = target_xs[i]
+        y = target_ys[i]
+        skipped = int(excluded[i])
+        field_x = 0.0
+        field_y = 0.0
+        potential = 0.0
+        error_x = 0.0
+        error_y = 0.0
+        potential_error = 0.0
+
+        if not is_softened and skipped < 0 and not compute_potential:
+            # the most common case, without the function calls
+            for source_x, source_y, source_mass in sources:
+                dx = source_x - x
+                dy = source_y - y
+                distance_squared = dx * dx + dy * dy
+
+                if distance_squared == 0:
+                    continue
+
+                factor = source_mass / (distance_squared * sqrt(distance_squared))
+
+                term = factor * dx
+                total = field_x + term
+                rounded = total - field_x
+                error_x += (field_x - (total - rounded)) + (term - rounded)
+                field_x = total
+
+                term = factor * dy
+                total = field_y + term
+                rounded = total - field_y
+                error_y += (field_y - (total - rounded)) + (term - rounded)
+                field_y = total
+        else:
+            for j, (source_x, source_y, source_mass) in enumerate(sources):
+                dx = source_x - x
+                dy = source_y - y
+                distance_squared = dx * dx + dy * dy
+
+                if distance_squared == 0 or j == skipped:
+                    continue
+
+                if is_softened:
+                    factor = source_mass * force_factor(distance_squared, softening, softening_length)
+
+                    if compute_potential:
+                        term = source_mass * potential_factor(distance_squared, softening, softening_length)
+                else:
+                    distance = sqrt(distance_squared)
+                    factor = source_mass / (distance_squared * distance)
+
+                    if compute_potential:
+                        term = source_mass / distance
+
+                if compute_potential:
+                    total = potential + term
+                    rounded = total - potential
+                    potential_error += (potential - (total - rounded)) + (term - rounded)
+                    potential = total
+
+                term = factor * dx
+                total = field_x + term
+                rounded = total - field_x
+                error_x += (field_x - (total - rounded)) + (term - rounded)
+                field_x = total
+
+                term = factor * dy
+                total = field_y + term
+                rounded = total - field_y
+                error_y += (field_y - (total - rounded)) + (term - rounded)
+                field_y = total
+
+        fields_x.append(field_x + error_x)
+        fields_y.append(field_y + error_y)
+
+        if compute_potential:
+            potentials.append(potential + potential_error)
+
+    return fields_x, fields_y, potentials
+
+
+def _compute_summed_fields(target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                           sources: Sequence[Tuple[float, float, float]], targets: Iterable[int],
+                           softening: str, softening_length: float, compute_potential: bool,
+                           sum_terms: Callable[[Iterable[float]], float]
+                           ) -> Tuple[List[float], List[float], Optional[List[float]]]:
+    """
+    The same as _compute_fields(), but the terms of every target are collected and summed up with sum_terms
+    """
+    sqrt = math.sqrt
+    is_softened = softening != NO_SOFTENING
+
+    fields_x = []
+    fields_y = []
+    potentials = [] if compute_potential else None
+
+    for i in targets:
+        x = target_xs[i]
+        y = target_ys[i]
+        skipped = int(excluded[i])
+        terms_x = []
+        terms_y = []
+        potential_terms = []
+
+        for j, (source_x, source_y, source_mass) in enumerate(sources):
+            dx = source_x - x
+            dy = source_y - y
+            distance_squared = dx * dx + dy * dy
+
+            if distance_squared == 0 or j == skipped:
+                continue
+
+            if is_softened:
+                factor = source_mass * force_factor(distance_squared, softening, softening_length)
+
+                if compute_potential:
+                    potential_terms.append(source_mass * potential_factor(distance_squared, softening,
+                                                                          softening_length))
+            else:
+                distance = sqrt(distance_squared)
+                factor = source_mass / (distance_squared * distance)
+
+                if compute_potential:
+                    potential_terms.append(source_mass / distance)
+
+            terms_x.append(factor * dx)
+            terms_y.append(factor * dy)
+
+        fields_x.append(sum_terms(terms_x))
+        fields_y.append(sum_terms(terms_y))
+
+        if compute_potential:
+            potentials.append(sum_terms(potential_terms))
+
+    return fields_x, fields_y, potentials
+
+
+class DirectSolver(GravitySolver):
+    """
+    Sums up the fields of all the sources for every target in the current process
+    """
+    def compute(self, target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                source_xs: Sequence[float], source_ys: Sequence[float], source_masses: Sequence[float],
+                softening: str = NO_SOFTENING, softening_length: float = 0.0,
+                compute_potential: bool = False, summation: str = NAIVE_SUMMATION) -> GravityField:
+        sources = list(zip(source_xs, source_ys, source_masses))
+        fields_x, fields_y, potentials = _compute_fields(target_xs, target_ys, excluded, sources,
+                                                         range(len(target_xs)), softening, softening_length,
+                                                         compute_potential, summation)
+
+        return GravityField(fields_x, fields_y, potentials)
+
+
+# the layout of the shared block, in doubles: the sources (x, y, mass), the targets (x, y, excluded),
+# then the results for the targets (field x, field y, potential)
+def _get_layout(source_capacity: int, target_capacity: int) -> Tuple[int, int, int]:
+    """
+    The offsets of the target inputs and the outputs, and the total size in doubles
+    """
+    targets_offset = 3 * source_capacity
+    outputs_offset = targets_offset + 3 * target_capacity
+
+    return targets_offset, outputs_offset, outputs_offset + 3 * target_capacity
+
+
+def _run_worker(tasks: multiprocessing.Queue, results: multiprocessing.Queue):
+    """
+    The loop of a worker process of the ParallelDirectSolver, takes the tiles of the targets from the tasks queue
+    and writes their fields into the shared block
+    """
+    block: Optional[shared_memory.SharedMemory] = None
+    values: Optional[memoryview] = None
+    generation = None
+    sources = []
+    target_xs = target_ys = excluded = None
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            (name, task_generation, source_count, target_count, source_capacity, target_capacity,
+             start, end, softening, softening_length, compute_potential, summation) = task
+
+            try:
+                if block is None or block.name != name:
+                    if block is not None:
+                        values.release()
+                        block.close()
+
+                    # the spawned processes share the resource tracker of the solver's process,
+                    # so attaching doesn't make the block theirs to unlink
+                    block = shared_memory.SharedMemory(name)
+                    values = block.buf.cast("d")
+                    generation = None
+
+                targets_offset, outputs_offset, _ = _get_layout(source_capacity, target_capacity)
+
+                # the inputs only change between the calls to compute(), not between the tiles
+                if task_generation != generation:
+                    generation = task_generation
+                    sources = list(zip(values[0:source_count],
+                                       values[source_capacity:source_capacity + source_count],
+                                       values[2 * source_capacity:2 * source_capacity + source_count]))
+                    target_xs = values[targets_offset:targets_offset + target_count].tolist()
+                    target_ys = values[targets_offset + target_capacity:
+                                       targets_offset + target_capacity + target_count].tolist()
+                    excluded = values[targets_offset + 2 * target_capacity:
+                                      targets_offset + 2 * target_capacity + target_count].tolist()
+
+                fields_x, fields_y, potentials = _compute_fields(target_xs, target_ys, excluded, sources,
+                                                                 range(start, end), softening, softening_length,
+                                                                 compute_potential, summation)
+
+                values[outputs_offset + start:outputs_offset + end] = array.array("d", fields_x)
+                values[outputs_offset + target_capacity + start:
+                       outputs_offset + target_capacity + end] = array.array("d", fields_y)
+
+                if compute_potential:
+                    values[outputs_offset + 2 * target_capacity + start:
+                           outputs_offset + 2 * target_capacity + end] = array.array("d", potentials)
+
+                results.put((start, None))
+            except Exception as exception:
+                results.put((start, repr(exception)))
+    finally:
+        if block is not None:
+            values.release()
+            block.close()
+
+
+# how often the solver checks that the workers are alive while it waits for the results, in seconds
+_WORKER_POLL_INTERVAL = 1.0
+
+
+def _shut_down_workers(state: Dict):
+    """
+    Stops the workers and frees the shared block, kept outside the solver so that it can be its finalizer
+    """
+    tasks = state["tasks"]
+    processes = state["processes"]
+
+    for _ in processes:
+        tasks.put(None)
+
+    for process in processes:
+        process.join(1.0)
+
+        if process.is_alive():
+            process.terminate()
+
+    processes.clear()
+
+    block = state["block"]
+    if block is not None:
+        state["values"].release()
+        block.close()
+        block.unlink()
+
+    state["block"] = None
+    state["values"] = None
+
+
+class ParallelDirectSolver(GravitySolver):
+    """
+    Sums up the fields of all the sources for every target, with the targets split into tiles
+    between a pool of worker processes.
+
+    The positions and the masses are written into a shared memory block that the workers read,
+    and the workers write the fields back into it, so only the small task messages are pickled.
+    The workers are started on the first call that is big enough for them and are kept until close().
+    Every target is summed up in the same order as by the DirectSolver, so the results are identical to its results.
+    If a worker dies, the pool is shut down and compute() raises a RuntimeError, the next call starts a new pool
+    """
+    def __init__(self, workers: Optional[int] = None, tiles_per_worker: int = 4, min_parallel_pairs: int = 250000):
+        """
+        :param workers: the number of worker processes, None for the number of processors
+        :param tiles_per_worker: the targets are split into this many tiles per worker, so that a worker
+                                 that gets slowed down by something else doesn't hold up the rest
+        :param min_parallel_pairs: the calls with fewer target-source pairs than this are computed in this process,
+                                   since sending them to the workers would take longer
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+
+        if tiles_per_worker <= 0:
+            raise ValueError("tiles_per_worker must be positive")
+
+        if min_parallel_pairs < 0:
+            raise ValueError("min_parallel_pairs can't be negative")
+
+        self.__workers = workers
+        self.__tiles_per_worker = tiles_per_worker
+        self.__min_parallel_pairs = min_parallel_pairs
+
+        self.__source_capacity = 0
+        self.__target_capacity = 0
+        self.__generation = 0
+
+        self.__state = {
+            "tasks": None,
+            "results": None,
+            "processes": [],
+            "block": None,
+            "values": None
+        }
+        self.__finalizer = weakref.finalize(self, _shut_down_workers, self.__state)
+
+        self.__direct_solver = DirectSolver()
+
+    @property
+    def workers(self) -> int:
+        return self.__workers
+
+    @property
+    def tiles_per_worker(self) -> int:
+        return self.__tiles_per_worker
+
+    @property
+    def min_parallel_pairs(self) -> int:
+        return self.__min_parallel_pairs
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self.__state["processes"])
+
+    def compute(self, target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                source_xs: Sequence[float], source_ys: Sequence[float], source_masses: Sequence[float],
+                softening: str = NO_SOFTENING, softening_length: float = 0.0,
+                compute_potential: bool = False, summation: str = NAIVE_SUMMATION) -> GravityField:
+        target_count = len(target_xs)
+        source_count = len(source_xs)
+
+        if target_count * source_count < self.__min_parallel_pairs or target_count < 2:
+            return self.__direct_solver.compute(target_xs, target_ys, excluded, source_xs, source_ys, source_masses,
+                                                softening, softening_length, compute_potential, summation)
+
+        self.__start_workers()
+        self.__reserve(source_count, target_count)
+
+        state = self.__state
+        values: memoryview = state["values"]
+        source_capacity = self.__source_capacity
+        target_capacity = self.__target_capacity
+        targets_offset, outputs_offset, _ = _get_layout(source_capacity, target_capacity)
+
+        values[0:source_count] = array.array("d", source_xs)
+        values[source_capacity:source_capacity + source_count] = array.array("d", source_ys)
+        values[2 * source_capacity:2 * source_capacity + source_count] = array.array("d", source_masses)
+        values[targets_offset:targets_offset + target_count] = array.array("d", target_xs)
+        values[targets_offset + target_capacity:
+               targets_offset + target_capacity + target_count] = array.array("d", target_ys)
+        values[targets_offset + 2 * target_capacity:
+               targets_offset + 2 * target_capacity + target_count] = array.array("d", excluded)
+
+        self.__generation += 1
+        name = state["block"].name
+        tile_size = math.ceil(target_count / (self.__workers * self.__tiles_per_worker))
+
+        tile_count = 0
+        for start in range(0, target_count, tile_size):
+            state["tasks"].put((name, self.__generation, source_count, target_count, source_capacity, target_capacity,
+                                start, min(start + tile_size, target_count), softening, softening_length,
+                                compute_potential, summation))
+            tile_count += 1
+
+        errors = []
+        for _ in range(tile_count):
+            _, error = self.__get_result()
+
+            if error is not None:
+                errors.append(error)
+
+        if errors:
+            raise RuntimeError(f"a gravity worker failed: {errors[0]}")
+
+        fields_x = values[outputs_offset:outputs_offset + target_count].tolist()
+        fields_y = values[outputs_offset + target_capacity:outputs_offset + target_capacity + target_count].tolist()
+        potentials = None
+        if compute_potential:
+            potentials = values[outputs_offset + 2 * target_capacity:
+                                outputs_offset + 2 * target_capacity + target_count].tolist()
+
+        return GravityField(fields_x, fields_y, potentials)
+
+    def __get_result(self) -> Tuple[int, Optional[str]]:
+        """
+        Waits for the next finished tile, checking that the workers are still alive meanwhile,
+        so that a worker that crashed doesn't make the solver wait forever
+        """
+        state = self.__state
+
+        while True:
+            try:
+                return state["results"].get(timeout=_WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+            dead_workers = [process for process in state["processes"] if not process.is_alive()]
+            if dead_workers:
+                exit_code = dead_workers[0].exitcode
+                self.close()
+                raise RuntimeError(f"a gravity worker exited unexpectedly with the exit code {exit_code}")
+
+    def __start_workers(self):
+        state = self.__state
+        if state["processes"]:
+            return
+
+        # spawned workers don't inherit the window and the rest of the state of this process
+        context = multiprocessing.get_context("spawn")
+        state["tasks"] = context.Queue()
+        state["results"] = context.Queue()
+
+        for _ in range(self.__workers):
+            process = context.Process(target=_run_worker, args=(state["tasks"], state["results"]), daemon=True)
+            process.start()
+            state["processes"].append(process)
+
+    def __reserve(self, source_count: int, target_count: int):
+        """
+        Makes sure the shared block fits the given numbers of sources and targets,
+        the capacities are doubled, so that the block isn't reallocated every time a body is added
+        """
+        if source_count <= self.__source_capacity and target_count <= self.__target_capacity:
+            return
+
+        state = self.__state
+        source_capacity = max(source_count, 2 * self.__source_capacity, 64)
+        target_capacity = max(target_count, 2 * self.__target_capacity, 64)
+        size = _get_layout(source_capacity, target_capacity)[2]
+
+        if state["block"] is not None:
+            state["values"].release()
+            state["block"].close()
+            state["block"].unlink()
+
+        block = shared_memory.SharedMemory(create=True, size=size * 8)
+        state["block"] = block
+        state["values"] = block.buf.cast("d")
+
+        self.__source_capacity = source_capacity
+        self.__target_capacity = target_capacity
+
+    def close(self):
+        _shut_down_workers(self.__state)
+        self.__source_capacity = 0
+        self.__target_capacity = 0
+
+
+class _ExpansionTables:
+    """
+    The index tables of the Cartesian expansions up to the given order.
+    The coefficient of x^a * y^b is at the index of (a, b), the indices go by the total order a + b.
+    The lists of coefficients have an extra 0 at the end, the missing indices point at it
+    """
+    def __init__(self, order: int):
+        powers = [(total - b, b) for total in range(order + 1) for b in range(total + 1)]
+        index_of = {power: i for i, power in enumerate(powers)}
+        count = len(powers)
+        factorials = [math.factorial(i) for i in range(order + 1)]
+
+        self.order = order
+        self.count = count
+        self.powers = powers
+        # a! * b!
+        self.factorials = [factorials[a] * factorials[b] for a, b in powers]
+        self.inverse_factorials = [1 / factorial for factorial in self.factorials]
+
+        # the Taylor coefficients T of 1 / r satisfy
+        # r^2 * n * T_(a, b) + (2n - 1) * (x * T_(a - 1, b) + y * T_(a, b - 1))
+        #     + (n - 1) * (T_(a - 2, b) + T_(a, b - 2)) = 0
+        # where n = a + b, the Plummer softening only adds its length squared to r^2
+        self.recurrence = []
+        for i, (a, b) in enumerate(powers[1:], 1):
+            n = a + b
+            self.recurrence.append((
+                i, 2 * n - 1, n - 1, 1 / n,
+                index_of.get((a - 1, b), count), index_of.get((a, b - 1), count),
+                index_of.get((a - 2, b), count), index_of.get((a, b - 2), count)
+            ))
+
+        # multipole to multipole: M_n += the sum over m <= n of M'_m * (-d)^(n - m) / (n - m)!
+        self.multipole_shifts = [
+            [(index_of[(c, d)], a - c, b - d, 1 / (factorials[a - c] * factorials[b - d]))
+             for c in range(a + 1) for d in range(b + 1)]
+            for a, b in powers
+        ]
+
+        # multipole to local: L_k += the sum over |n| <= order - |k| of D_(k + n) * M_n
+        self.conversions = []
+        for k, (a, b) in enumerate(powers):
+            derivative_indices = [index_of[(a + c, b + d)] for c, d in powers if a + b + c + d <= order]
+            multipole_indices = [index_of[(c, d)] for c, d in powers if a + b + c + d <= order]
+
+            # itemgetter returns a single item instead of a tuple for a single index
+            if len(derivative_indices) == 1:
+                derivative_indices.append(count)
+                multipole_indices.append(count)
+
+            self.conversions.append((k, itemgetter(*derivative_indices), itemgetter(*multipole_indices)))
+
+        # local to local: L'_k = the sum over |k| + |j| <= order of L_(k + j) * d^j / j!
+        self.local_shifts = [
+            [(index_of[(a + c, b + d)], c, d, 1 / (factorials[c] * factorials[d]))
+             for c, d in powers if a + b + c + d <= order]
+            for a, b in powers
+        ]
+
+        # the local expansion at a point is the potential, its gradient is the field
+        self.potential_terms = [(i, a, b, 1 / (factorials[a] * factorials[b])) for i, (a, b) in enumerate(powers)]
+        self.gradient_x = [(index_of[(a + 1, b)], a, b, 1 / (factorials[a] * factorials[b]))
+                           for a, b in powers if a + b < order]
+        self.gradient_y = [(index_of[(a, b + 1)], a, b, 1 / (factorials[a] * factorials[b]))
+                           for a, b in powers if a + b < order]
+
+    def get_powers(self, x: float, y: float) -> Tuple[List[float], List[float]]:
+        """
+        x^0...x^order and y^0...y^order
+        """
+        powers_x = [1.0]
+        powers_y = [1.0]
+
+        for _ in range(self.order):
+            powers_x.append(powers_x[-1] * x)
+            powers_y.append(powers_y[-1] * y)
+
+        return powers_x, powers_y
+
+    def get_derivatives(self, x: float, y: float, distance_squared: float) -> List[float]:
+        """
+        The partial derivatives of 1 / r at (x, y), with the sentinel 0 at the end
+        """
+        taylor = [0.0] * (self.count + 1)
+        taylor[0] = 1 / math.sqrt(distance_squared)
+        inverse_distance_squared = 1 / distance_squared
+
+        for i, first, second, inverse_n, previous_x, previous_y, second_x, second_y in self.recurrence:
+            taylor[i] = -(first * (x * taylor[previous_x] + y * taylor[previous_y])
+                          + second * (taylor[second_x] + taylor[second_y])) * inverse_n * inverse_distance_squared
+
+        derivatives = [coefficient * factorial for coefficient, factorial in zip(taylor, self.factorials)]
+        derivatives.append(0.0)
+
+        return derivatives
+
+
+class _Cell:
+    """
+    A square of a quadtree, the expansions are around the point (x, y), which starts at its center
+    """
+    __slots__ = ("x", "y", "radius", "indices", "bodies", "children", "expansion")
+
+    def __init__(self, x: float, y: float):
+        self.x = x
+        self.y = y
+        # the distance from (x, y) to the furthest body in the cell
+        self.radius = 0.0
+        # the bodies of a leaf
+        self.indices: List[int] = []
+        self.bodies: List[Tuple[float, float, float]] = []
+        self.children: List[_Cell] = []
+        self.expansion: Optional[List[float]] = None
+
+
+def _build_tree(xs: Sequence[float], ys: Sequence[float], indices: List[int], x: float, y: float,
+                half_size: float, leaf_size: int, depth: int = 0) -> _Cell:
+    cell = _Cell(x, y)
+
+    # the bodies that overlap perfectly can't be split, so the depth is limited
+    if len(indices) <= leaf_size or depth >= 48:
+        cell.indices = indices
+        cell.radius = max(math.hypot(xs[i] - x, ys[i] - y) for i in indices)
+        return cell
+
+    quadrants = ([], [], [], [])
+    for i in indices:
+        quadrants[(xs[i] >= x) + 2 * (ys[i] >= y)].append(i)
+
+    quarter_size = half_size / 2
+    radius = 0.0
+    for quadrant, quadrant_indices in enumerate(quadrants):
+        if not quadrant_indices:
+            continue
+
+        child_x = x + quarter_size if quadrant & 1 else x - quarter_size
+        child_y = y + quarter_size if quadrant & 2 else y - quarter_size
+        child = _build_tree(xs, ys, quadrant_indices, child_x, child_y, quarter_size, leaf_size, depth + 1)
+
+        cell.children.append(child)
+        radius = max(radius, child.radius + math.hypot(child.x - x, child.y - y))
+
+    cell.radius = min(radius, half_size * math.sqrt(2))
+    return cell
+
+
+class FMMSolver(GravitySolver):
+    """
+    The fast multipole method, computes the fields in O(N) with an error that's controlled by the expansion order.
+
+    The sources and the targets are put into quadtrees. The fields of the source cells are expanded into
+    Cartesian multipoles up to the order, and converted into local expansions of the target cells that are far enough,
+    the fields of the rest of the cells are summed up directly. The cells are far enough if the sum of their radii
+    is less than the opening angle times the distance between them. The error goes down roughly as
+    opening_angle ^ (order + 1), the time goes up roughly as order^4.
+
+    The Plummer softening is exact in the expansions too. With the spline softening, the cells that are closer
+    than the spline radius are summed up directly, since it's only Newtonian beyond it.
+    The excluded sources are subtracted at the end, so their part of the expansion error stays.
+    The summation only applies to the direct sums between the leaves, the expansions are far less accurate anyway
+    """
+    def __init__(self, order: int = 6, opening_angle: float = 0.5, leaf_size: int = 32):
+        """
+        :param order: the order of the expansions, the fields are one order less accurate than the potentials
+        :param opening_angle: the cells are far enough for the expansions if the sum of their radii is less than
+                              the distance between them times this
+        :param leaf_size: the cells with more bodies than this are split
+        """
+        if order < 1:
+            raise ValueError("order must be at least 1")
+
+        if not 0 < opening_angle < 1:
+            raise ValueError("opening_angle must be between 0 and 1")
+
+        if leaf_size <= 0:
+            raise ValueError("leaf_size must be positive")
+
+        self.__order = order
+        self.__opening_angle = opening_angle
+        self.__leaf_size = leaf_size
+        self.__tables = _ExpansionTables(order)
+
+    @property
+    def order(self) -> int:
+        return self.__order
+
+    @property
+    def opening_angle(self) -> float:
+        return self.__opening_angle
+
+    @property
+    def leaf_size(self) -> int:
+        return self.__leaf_size
+
+    def compute(self, target_xs: Sequence[float], target_ys: Sequence[float], excluded: Sequence[int],
+                source_xs: Sequence[float], source_ys: Sequence[float], source_masses: Sequence[float],
+                softening: str = NO_SOFTENING, softening_length: float = 0.0,
+                compute_potential: bool = False, summation: str = NAIVE_SUMMATION) -> GravityField:
+        target_count = len(target_xs)
+        fields_x = [0.0] * target_count
+        fields_y = [0.0] * target_count
+        potentials = [0.0] * target_count if compute_potential else None
+
+        if target_count == 0 or not source_xs:
+            return GravityField(fields_x, fields_y, potentials)
+
+        # both trees have the same root, the square around all the bodies
+        min_x = min(min(target_xs), min(source_xs))
+        max_x = max(max(target_xs), max(source_xs))
+        min_y = min(min(target_ys), min(source_ys))
+        max_y = max(max(target_ys), max(source_ys))
+        center_x = (min_x + max_x) / 2
+        center_y = (min_y + max_y) / 2
+        half_size = max(max_x - min_x, max_y - min_y, 1e-300) / 2 * (1 + 1e-9)
+
+        leaf_size = self.__leaf_size
+        source_root = _build_tree(source_xs, source_ys, list(range(len(source_xs))), center_x, center_y, half_size,
+                                  leaf_size)
+        target_root = _build_tree(target_xs, target_ys, list(range(target_count)), center_x, center_y, half_size,
+                                  leaf_size)
+
+        self.__compute_multipoles(source_root, source_xs, source_ys, source_masses)
+
+        # the sources at the same position are skipped by the direct sums,
+        # the rest of the excluded ones are subtracted after everything
+        no_exclusions = [-1] * target_count
+        softening_squared = softening_length ** 2 if softening == PLUMMER else 0.0
+        # the closest the surfaces of the cells can be for the expansions to be used
+        min_gap = softening_length * SPLINE_RADIUS_FACTOR if softening == SPLINE else 0.0
+        opening_angle = self.__opening_angle
+        tables = self.__tables
+        get_derivatives = tables.get_derivatives
+        conversions = tables.conversions
+        local_count = tables.count + 1
+
+        stack = [(target_root, source_root)]
+        while stack:
+            target_cell, source_cell = stack.pop()
+            dx = target_cell.x - source_cell.x
+            dy = target_cell.y - source_cell.y
+            distance = math.sqrt(dx * dx + dy * dy)
+            radii = target_cell.radius + source_cell.radius
+
+            if radii < opening_angle * distance and distance - radii >= min_gap:
+                derivatives = get_derivatives(dx, dy, distance * distance + softening_squared)
+                multipole = source_cell.expansion
+
+                local = target_cell.expansion
+                if local is None:
+                    local = [0.0] * local_count
+                    target_cell.expansion = local
+
+                for k, get_derivative_terms, get_multipole_terms in conversions:
+                    local[k] += sum(map(mul, get_derivative_terms(derivatives), get_multipole_terms(multipole)))
+
+                continue
+
+            target_is_leaf = not target_cell.children
+            source_is_leaf = not source_cell.children
+
+            if target_is_leaf and source_is_leaf:
+                near_x, near_y, near_potentials = _compute_fields(
+                    target_xs, target_ys, no_exclusions, source_cell.bodies, target_cell.indices,
+                    softening, softening_length, compute_potential, summation
+                )
+
+                for i, field_x, field_y in zip(target_cell.indices, near_x, near_y):
+                    fields_x[i] += field_x
+                    fields_y[i] += field_y
+
+                if compute_potential:
+                    for i, potential in zip(target_cell.indices, near_potentials):
+                        potentials[i] += potential
+            elif source_is_leaf or (not target_is_leaf and target_cell.radius >= source_cell.radius):
+                stack.extend((child, source_cell) for child in target_cell.children)
+            else:
+                stack.extend((target_cell, child) for child in source_cell.children)
+
+        self.__evaluate_locals(target_root, None, target_xs, target_ys, fields_x, fields_y, potentials)
+
+        for i, j in enumerate(excluded):
+            if j < 0:
+                continue
+
+            dx = source_xs[j] - target_xs[i]
+            dy = source_ys[j] - target_ys[i]
+            distance_squared = dx * dx + dy * dy
+
+            if distance_squared == 0:
+                continue
+
+            factor = source_masses[j] * force_factor(distance_squared, softening, softening_length)
+            fields_x[i] -= factor * dx
+            fields_y[i] -= factor * dy
+
+            if compute_potential:
+                potentials[i] -= source_masses[j] * potential_factor(distance_squared, softening, softening_length)
+
+        return GravityField(fields_x, fields_y, potentials)
+
+    def __compute_multipoles(self, cell: _Cell, xs: Sequence[float], ys: Sequence[float], masses: Sequence[float]):
+        """
+        Expands the fields of the source cells from the leaves up, M_n = the sum of m * (-s)^n / n!
+
+        The expansions are around the centers of mass, which makes the cells dominated by one heavy body
+        as accurate as the single bodies
+        """
+        tables = self.__tables
+        multipole = [0.0] * (tables.count + 1)
+        powers = tables.powers
+
+        if not cell.children:
+            cell.bodies = [(xs[i], ys[i], masses[i]) for i in cell.indices]
+
+            total_mass = math.fsum(mass for _, _, mass in cell.bodies)
+            if total_mass > 0:
+                cell.x = math.fsum(body_x * mass for body_x, _, mass in cell.bodies) / total_mass
+                cell.y = math.fsum(body_y * mass for _, body_y, mass in cell.bodies) / total_mass
+                cell.radius = max(math.hypot(body_x - cell.x, body_y - cell.y) for body_x, body_y, _ in cell.bodies)
+
+            for body_x, body_y, mass in cell.bodies:
+                powers_x, powers_y = tables.get_powers(cell.x - body_x, cell.y - body_y)
+
+                for n, (a, b) in enumerate(powers):
+                    multipole[n] += mass * powers_x[a] * powers_y[b]
+
+            for n, inverse_factorial in enumerate(tables.inverse_factorials):
+                multipole[n] *= inverse_factorial
+        else:
+            for child in cell.children:
+                self.__compute_multipoles(child, xs, ys, masses)
+
+            # the 0th moment is the mass
+            total_mass = math.fsum(child.expansion[0] for child in cell.children)
+            if total_mass > 0:
+                cell.x = math.fsum(child.x * child.expansion[0] for child in cell.children) / total_mass
+                cell.y = math.fsum(child.y * child.expansion[0] for child in cell.children) / total_mass
+                cell.radius = max(child.radius + math.hypot(child.x - cell.x, child.y - cell.y)
+                                  for child in cell.children)
+
+            for child in cell.children:
+                child_multipole = child.expansion
+                powers_x, powers_y = tables.get_powers(cell.x - child.x, cell.y - child.y)
+
+                for n, terms in enumerate(tables.multipole_shifts):
+                    multipole[n] += sum(child_multipole[m] * powers_x[a] * powers_y[b] * coefficient
+                                        for m, a, b, coefficient in terms)
+
+        cell.expansion = multipole
+
+    def __evaluate_locals(self, cell: _Cell, parent: Optional[_Cell], xs: Sequence[float], ys: Sequence[float],
+                          fields_x: List[float], fields_y: List[float], potentials: Optional[List[float]]):
+        """
+        Shifts the local expansions from the root down to the leaves and adds them up at the bodies
+        """
+        tables = self.__tables
+
+        if parent is not None and parent.expansion is not None:
+            parent_local = parent.expansion
+            powers_x, powers_y = tables.get_powers(cell.x - parent.x, cell.y - parent.y)
+
+            local = cell.expansion
+            if local is None:
+                local = [0.0] * (tables.count + 1)
+                cell.expansion = local
+
+            for k, terms in enumerate(tables.local_shifts):
+                local[k] += sum(parent_local[j] * powers_x[a] * powers_y[b] * coefficient
+                                for j, a, b, coefficient in terms)
+
+        for child in cell.children:
+            self.__evaluate_locals(child, cell, xs, ys, fields_x, fields_y, potentials)
+
+        local = cell.expansion
+        if cell.children or local is None:
+            return
+
+        for i in cell.indices:
+            powers_x, powers_y = tables.get_powers(xs[i] - cell.x, ys[i] - cell.y)
+
+            fields_x[i] += sum(local[k] * powers_x[a] * powers_y[b] * coefficient
+                               for k, a, b, coefficient in tables.gradient_x)
+            fields_y[i] += sum(local[k] * powers_x[a] * powers_y[b] * coefficient
+                               for k, a, b, coefficient in tables.gradient_y)
+
+            if potentials is not None:
+                potentials[i] += sum(local[k] * powers_x[a] * powers_y[b] * coefficient
+                                     for k, a, b, coefficient in tables.potential_terms)
+
+
+SOLVERS = {
+    "direct": DirectSolver,
+    "parallel": ParallelDirectSolver,
+    "fmm": FMMSolver
+}
+
+
+def get_gravity_solver(name: str, **settings) -> GravitySolver:
+    """
+    Creates a solver by its name in SOLVERS, with the given settings passed to its constructor
+    """
+    if name not in SOLVERS:
+        raise ValueError(f"unknown gravity solver '{name}', must be one of {', '.join(SOLVERS)}")
+
+    return SOLVERS[name](**settings)
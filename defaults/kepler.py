@@ -0,0 +1,81 @@
+"""
+The analytical solution of the two-body problem
+"""
+from typing import Tuple
+import math
+
+
+def propagate_kepler(mu: float, rx: float, ry: float, vx: float, vy: float,
+                     dt: float) -> Tuple[float, float, float, float]:
+    """
+    Moves a body along its elliptic orbit around the other body for dt seconds.
+
+    The position and the velocity are relative to the other body, mu is G * (m1 + m2).
+    Returns the new relative position and velocity as (rx, ry, vx, vy).
+    Raises ValueError if the bodies aren't bound to each other
+    """
+    r0 = math.hypot(rx, ry)
+    speed_squared = vx * vx + vy * vy
+
+    inverse_semi_major_axis = 2 / r0 - speed_squared / mu
+    if inverse_semi_major_axis <= 0:
+        raise ValueError("the orbit isn't elliptic")
+
+    a = 1 / inverse_semi_major_axis
+    mean_motion = math.sqrt(mu / (a * a * a))
+    sqrt_a = math.sqrt(a)
+    sigma0 = (rx * vx + ry * vy) / math.sqrt(mu)
+
+    # the full orbits don't change anything, so only the remainder is solved for
+    mean_anomaly = math.fmod(mean_motion * dt, 2 * math.pi)
+    dt = mean_anomaly / mean_motion
+
+    # Kepler's equation for the change of the eccentric anomaly:
+    # M = E - (1 - r0 / a) * sin(E) + sigma0 / sqrt(a) * (1 - cos(E))
+    # the right side is monotonic and differs from E by at most 2 * eccentricity,
+    # so the root is bracketed and Newton's method is kept inside the bracket
+    c1 = 1 - r0 / a
+    c2 = sigma0 / sqrt_a
+    low = mean_anomaly - 2
+    high = mean_anomaly + 2
+    e = mean_anomaly
+
+    for _ in range(64):
+        sin_e = math.sin(e)
+        cos_e = math.cos(e)
+        error = e - c1 * sin_e + c2 * (1 - cos_e) - mean_anomaly
+
+        if error > 0:
+            high = e
+        else:
+            low = e
+
+        # the derivative is r / a, which is always positive
+        derivative = 1 - c1 * cos_e + c2 * sin_e
+        next_e = e - error / derivative
+
+        if not low < next_e < high:
+            next_e = (low + high) / 2
+
+        if abs(next_e - e) <= 1e-15 * max(1.0, abs(e)):
+            e = next_e
+            break
+
+        e = next_e
+
+    sin_e = math.sin(e)
+    cos_e = math.cos(e)
+    r = a + (r0 - a) * cos_e + sigma0 * sqrt_a * sin_e
+
+    # Lagrange's f and g coefficients
+    f = 1 - a / r0 * (1 - cos_e)
+    g = dt - (e - sin_e) / mean_motion
+    f_dot = -math.sqrt(mu * a) / (r * r0) * sin_e
+    g_dot = 1 - a / r * (1 - cos_e)
+
+    return (
+        f * rx + g * vx,
+        f * ry + g * vy,
+        f_dot * rx + g_dot * vx,
+        f_dot * ry + g_dot * vy
+    )
@@ -0,0 +1,34 @@
+"""
+Re-executes a recorded session without rendering.
+
+Usage: python replay.py <path to the replay .jsonl file>
+"""
+import application
+import sys
+import time
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__.strip())
+        sys.exit(2)
+
+    start_time = time.perf_counter()
+    environment, matched = application.play_replay(sys.argv[1])
+    elapsed_time = time.perf_counter() - start_time
+
+    print(f"Replayed in {elapsed_time:.3f} s, {len(environment.sim_objects)} objects at the end")
+
+    if matched is None:
+        print("The recording wasn't finished, the final state can't be verified")
+        sys.exit(1)
+
+    if not matched:
+        print("The final state differs from the recorded one")
+        sys.exit(1)
+
+    print("The final state is identical to the recorded one")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,12 @@ from .event_system import EventSystem
 from .simulation import SimEnvironment, SimObject, EnvironmentComponent, \
     SimObjectComponent, Transform, RenderEvent, AdvanceTimeStepEvent, EnvironmentUpdateEvent
 
-from .rendering import Renderer, Camera, CameraRenderEvent, Color
-from .physics import PhysicsManager, RigidBody, Force, CollisionListener, PostPhysicsUpdateEvent
+from .rendering import Renderer, Camera, CameraRenderEvent, CameraPostRenderEvent, Color
+from .physics import PhysicsManager, RigidBody, Force, CollisionListener, PostPhysicsUpdateEvent, BodyArrays, \
+    RigidBodyExertArrayForcesEvent, CollisionResolutionEvent, PrePhysicsUpdateEvent, \
+    PostIntegrationEvent
 from .env_updater import EnvironmentUpdater
-from .time_settings import TimeSettings, PauseEvent, UnpauseEvent
+from .time_settings import TimeSettings, PauseEvent, UnpauseEvent, TimeStepChangedEvent
 from .pygame_event_processor import PygameEvent, PygameEventProcessor
 from .gui_manager import GUIManager
 from .monobehavior import MonoBehavior
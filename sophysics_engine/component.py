@@ -4,6 +4,7 @@ A component allows us to attach functionality to different objects (ComponentCon
 
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from typing import Sequence
 
 
 class Component(ABC):
@@ -30,6 +31,22 @@ class Component(ABC):
         """
         self._is_set_up = True
 
+    @classmethod
+    def batch_setup(cls, components: Sequence[Component]):
+        """
+        Sets up many components of exactly this type at once, in the given order.
+
+        By default calls setup() on each of them. Subclasses can override it to look up the shared references once
+        and to register with the managers in bulk. An override must fall back to _setup_each()
+        if setup() was overridden further down the hierarchy, since it wouldn't be called otherwise.
+        """
+        cls._setup_each(components)
+
+    @classmethod
+    def _setup_each(cls, components: Sequence[Component]):
+        for component in components:
+            component.setup()
+
     def destroy(self):
         """
         Destroy the component
@@ -37,6 +54,22 @@ class Component(ABC):
         self._on_destroy()
         self._after_destroy()
 
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[Component]):
+        """
+        Calls _on_destroy() for many components of exactly this type at once, in the given order.
+
+        Used by SimEnvironment.destroy_sim_objects(). Subclasses can override it to remove the event listeners
+        and to unregister from the managers in bulk. An override must fall back to _on_destroy_each()
+        if _on_destroy() was overridden further down the hierarchy, since it wouldn't be called otherwise.
+        """
+        cls._on_destroy_each(components)
+
+    @classmethod
+    def _on_destroy_each(cls, components: Sequence[Component]):
+        for component in components:
+            component._on_destroy()
+
     def _on_destroy(self):
         """
         Gets called when the object to which the component is attached to is destroyed
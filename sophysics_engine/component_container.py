@@ -4,7 +4,7 @@ A special object that you can attach different components (behaviors) to
 from __future__ import annotations
 from abc import ABC
 from .component import Component
-from typing import Iterable, Set, Any, List
+from typing import Iterable, Set, Any, List, Dict
 
 
 class ComponentContainer(ABC):
@@ -14,6 +14,9 @@ class ComponentContainer(ABC):
     def __init__(self, components: Iterable[Component] = ()):
         self.components: Set[Component] = set()
 
+        # the results of try_get_component, cleared whenever the components change
+        self._component_lookup_cache: Dict[type, Any] = {}
+
         for c in components:
             self.attach_component(c)
 
@@ -29,12 +32,14 @@ class ComponentContainer(ABC):
             raise TypeError("component must be of type Component")
 
         self.components.add(component)
+        self._component_lookup_cache.clear()
 
     def remove_component(self, component: Component):
         """
         Removes the component from the container
         """
         self.components.remove(component)
+        self._component_lookup_cache.clear()
 
     def get_component(self, comp_type: type) -> Any:
         """
@@ -61,12 +66,18 @@ class ComponentContainer(ABC):
         """
         Returns a component of a specified type or None if the component wasn't found.
         """
+        try:
+            return self._component_lookup_cache[comp_type]
+        except KeyError:
+            pass
+
         component = None
         for c in self.components:
             if(isinstance(c, comp_type)):
                 component = c
                 break
 
+        self._component_lookup_cache[comp_type] = component
         return component
 
     def has_component(self, comp_type: type) -> bool:
@@ -4,7 +4,7 @@ raised. That allows objects to communicate between each other indirectly, thus r
 and removing dependencies.
 """
 from __future__ import annotations
-from typing import Callable, Dict, Set
+from typing import Callable, Dict, Set, Iterable
 from .event import Event
 
 
@@ -22,7 +22,7 @@ class EventSystem:
         """
         Adds the given listener function that gets called every time an event of a given type is raised
         """
-        if not isinstance(listener, Callable):
+        if not callable(listener):
             raise TypeError("the 'listener' argument must be callable")
 
         if event_type not in self.__listeners:
@@ -30,12 +30,36 @@ class EventSystem:
 
         self.__listeners[event_type].add(listener)
 
+    def add_listeners(self, event_type: type, listeners: Iterable[Callable]):
+        """
+        Adds many listener functions of the same event type at once
+        """
+        listeners = tuple(listeners)
+
+        for listener in listeners:
+            if not callable(listener):
+                raise TypeError("all the listeners must be callable")
+
+        if event_type not in self.__listeners:
+            self.__listeners[event_type] = set()
+
+        self.__listeners[event_type].update(listeners)
+
     def remove_listener(self, event_type: type, listener: Callable):
         """
         Removes the given listener function from the listeners of the given event type.
         """
         self.__listeners[event_type].remove(listener)
 
+    def remove_listeners(self, event_type: type, listeners: Iterable[Callable]):
+        """
+        Removes many listener functions of the same event type at once.
+
+        The listeners that aren't registered are ignored
+        """
+        if event_type in self.__listeners:
+            self.__listeners[event_type].difference_update(listeners)
+
     def raise_event(self, event: Event):
         """
         Raises and event, which subsequently calls all of it's listeners
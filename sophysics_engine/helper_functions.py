@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Sequence, List, Tuple, Iterable
 
 
 number = Union[int, float]
@@ -42,4 +42,82 @@ def clamp(minimum: number, value: number, maximum: number):
 
     Returns the value if it's in the range between the minimum and maximum.
     """
-    return max(min(maximum, value), minimum)
\ No newline at end of file
+    return max(min(maximum, value), minimum)
+
+
+def get_addition_error(a: float, b: float, total: float) -> float:
+    """
+    The rounding error of total = a + b, so that a + b == total + error exactly
+    """
+    if abs(a) >= abs(b):
+        return (a - total) + b
+
+    return (b - total) + a
+
+
+def add_compensated(value: float, increment: float) -> Tuple[float, float]:
+    """
+    Adds the increment to the value, returns the sum and its rounding error.
+
+    Carrying the error over to the next increment keeps a running sum as accurate
+    as if it was summed up exactly and rounded once (Neumaier summation)
+    """
+    total = value + increment
+    return total, get_addition_error(value, increment, total)
+
+
+def neumaier_sum(values: Iterable[float]) -> float:
+    """
+    Sums up the values with Neumaier's compensated summation, the error doesn't grow with the number of values
+    """
+    total = 0.0
+    error = 0.0
+
+    # get_addition_error() inlined, since this is called in the force loops
+    for value in values:
+        new_total = total + value
+
+        if abs(total) >= abs(value):
+            error += (total - new_total) + value
+        else:
+            error += (value - new_total) + total
+
+        total = new_total
+
+    return total + error
+
+
+def sort_and_sweep(xs: Sequence[float], ys: Sequence[float], radii: Sequence[float]) -> List[Tuple[int, int]]:
+    """
+    Finds all pairs of overlapping circles.
+
+    The circles are sorted by their left edge and swept along the x axis,
+    so only the circles whose x intervals overlap are compared.
+    Returns the pairs of indices (i, j) with i < j, sorted
+    """
+    order = sorted(range(len(xs)), key=lambda index: xs[index] - radii[index])
+
+    pairs = []
+    # the indices of the circles whose x interval may still overlap with the next ones
+    active: List[int] = []
+
+    for i in order:
+        x = xs[i]
+        y = ys[i]
+        radius = radii[i]
+        left = x - radius
+
+        active = [j for j in active if xs[j] + radii[j] >= left]
+
+        for j in active:
+            dx = xs[j] - x
+            dy = ys[j] - y
+            max_distance = radii[j] + radius
+
+            if dx * dx + dy * dy < max_distance * max_distance:
+                pairs.append((j, i) if j < i else (i, j))
+
+        active.append(i)
+
+    pairs.sort()
+    return pairs
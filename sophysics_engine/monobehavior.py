@@ -1,5 +1,7 @@
+from __future__ import annotations
 from .simulation import SimObjectComponent, EnvironmentUpdateEvent
 from .physics import PostPhysicsUpdateEvent
+from typing import Sequence
 
 
 class MonoBehavior(SimObjectComponent):
@@ -13,6 +15,23 @@ class MonoBehavior(SimObjectComponent):
                                                               self.__handle_physics_update_event)
         self._start()
 
+    @classmethod
+    def batch_setup(cls, components: Sequence[MonoBehavior]):
+        if cls.setup is not MonoBehavior.setup or not components:
+            cls._setup_each(components)
+            return
+
+        for behavior in components:
+            behavior._is_set_up = True
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.add_listeners(EnvironmentUpdateEvent, [behavior.__handle_update_event for behavior in components])
+        event_system.add_listeners(PostPhysicsUpdateEvent,
+                                   [behavior.__handle_physics_update_event for behavior in components])
+
+        for behavior in components:
+            behavior._start()
+
     def __handle_update_event(self, _: EnvironmentUpdateEvent):
         self._update()
 
@@ -48,3 +67,18 @@ class MonoBehavior(SimObjectComponent):
         self.sim_object.environment.event_system.remove_listener(PostPhysicsUpdateEvent,
                                                                  self.__handle_physics_update_event)
         self.sim_object.environment.event_system.remove_listener(EnvironmentUpdateEvent, self.__handle_update_event)
+
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[MonoBehavior]):
+        if cls._on_destroy is not MonoBehavior._on_destroy or not components:
+            cls._on_destroy_each(components)
+            return
+
+        for behavior in components:
+            behavior._end()
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.remove_listeners(PostPhysicsUpdateEvent,
+                                      (behavior.__handle_physics_update_event for behavior in components))
+        event_system.remove_listeners(EnvironmentUpdateEvent,
+                                      (behavior.__handle_update_event for behavior in components))
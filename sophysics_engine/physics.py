@@ -11,9 +11,10 @@ from .event import Event
 from .event_system import EventSystem
 from .simulation import SimObjectComponent, Transform, EnvironmentComponent, AdvanceTimeStepEvent
 from .time_settings import TimeSettings
-from .helper_functions import validate_positive_number
+from .helper_functions import validate_positive_number, sort_and_sweep, add_compensated, get_addition_error
 
-from typing import Optional, Iterable, Set, Union, Sequence
+from typing import Optional, Iterable, Set, Union, Sequence, Dict, List, Tuple
+import math
 
 
 number = Union[int, float]
@@ -28,6 +29,81 @@ class RigidBodySyncSimObjectWithBodyEvent(Event):
 
 
 class RigidBodyExertForcesEvent(Event):
+    """
+    Raised when the forces have to be applied to the rigidbodies.
+
+    The forces that are instances of skipped_force_types have already been applied through the arrays
+    and must not exert again
+    """
+    def __init__(self, skipped_force_types: Tuple[type, ...] = ()):
+        self.__skipped_force_types = skipped_force_types
+
+    @property
+    def skipped_force_types(self) -> Tuple[type, ...]:
+        return self.__skipped_force_types
+
+
+class RigidBodyExertArrayForcesEvent(Event):
+    """
+    Raised in the gravity only mode before RigidBodyExertForcesEvent,
+    so that the forces can be added to all bodies at once through the arrays.
+
+    The listeners that apply the forces of some Force type must call mark_handled() with that type,
+    so that those forces don't exert a second time
+    """
+    def __init__(self, bodies: BodyArrays):
+        self.__bodies = bodies
+        self.__handled_force_types: List[type] = []
+
+    @property
+    def bodies(self) -> BodyArrays:
+        return self.__bodies
+
+    @property
+    def handled_force_types(self) -> Tuple[type, ...]:
+        return tuple(self.__handled_force_types)
+
+    def mark_handled(self, force_type: type):
+        """
+        Tells that the forces of this type have been applied through the arrays
+        """
+        self.__handled_force_types.append(force_type)
+
+
+class PrePhysicsUpdateEvent(Event):
+    """
+    An event that's raised at the start of every physics step, before anything has moved.
+
+    The listeners can ask for the step to be split into several substeps of the same length
+    """
+    def __init__(self):
+        self.__substeps = 1
+
+    @property
+    def substeps(self) -> int:
+        """
+        The largest number of substeps that was requested
+        """
+        return self.__substeps
+
+    def request_substeps(self, count: int):
+        self.__substeps = max(self.__substeps, count)
+
+
+class PostIntegrationEvent(Event):
+    """
+    Raised after all the substeps of a physics step have moved the bodies, before CollisionResolutionEvent.
+
+    The listeners can correct the positions and the velocities of the bodies
+    """
+    pass
+
+
+class CollisionResolutionEvent(Event):
+    """
+    Raised after the bodies have been moved and before PostPhysicsUpdateEvent,
+    so that the collisions found during the step can be resolved before anything else sees the new state
+    """
     pass
 
 
@@ -54,7 +130,36 @@ class Force(SimObjectComponent, ABC):
         event_system = self.sim_object.environment.event_system
         event_system.add_listener(RigidBodyExertForcesEvent, self.__handle_exert_force_event)
 
-    def __handle_exert_force_event(self, _: RigidBodyExertForcesEvent):
+    @classmethod
+    def batch_setup(cls, components: Sequence[Force]):
+        if cls.setup is not Force.setup:
+            cls._setup_each(components)
+            return
+
+        cls._batch_setup_forces(components)
+
+    @classmethod
+    def _batch_setup_forces(cls, components: Sequence[Force]):
+        """
+        Does the part of the setup that's common to all forces for many forces at once
+        """
+        if not components:
+            return
+
+        for force in components:
+            force._is_set_up = True
+            force._rigidbody = force.sim_object.get_component(RigidBody)
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.add_listeners(
+            RigidBodyExertForcesEvent,
+            [force.__handle_exert_force_event for force in components]
+        )
+
+    def __handle_exert_force_event(self, event: RigidBodyExertForcesEvent):
+        if event.skipped_force_types and isinstance(self, event.skipped_force_types):
+            return
+
         self.exert()
 
     @abstractmethod
@@ -69,6 +174,31 @@ class Force(SimObjectComponent, ABC):
         event_system.remove_listener(RigidBodyExertForcesEvent, self.__handle_exert_force_event)
         self._rigidbody = None
 
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[Force]):
+        if cls._on_destroy is not Force._on_destroy:
+            cls._on_destroy_each(components)
+            return
+
+        cls._batch_on_destroy_forces(components)
+
+    @classmethod
+    def _batch_on_destroy_forces(cls, components: Sequence[Force]):
+        """
+        Does the part of the destruction that's common to all forces for many forces at once
+        """
+        if not components:
+            return
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.remove_listeners(
+            RigidBodyExertForcesEvent,
+            (force.__handle_exert_force_event for force in components)
+        )
+
+        for force in components:
+            force._rigidbody = None
+
 
 class CollisionListener(SimObjectComponent):
     """
@@ -81,6 +211,7 @@ class CollisionListener(SimObjectComponent):
         super().__init__()
 
     def setup(self):
+        super().setup()
         self._rigidbody = self.sim_object.get_component(RigidBody)
         self._rigidbody.attach_collision_listener(self)
 
@@ -95,6 +226,9 @@ class CollisionListener(SimObjectComponent):
 
         When returning a bool, be aware that the final value, that determines whether the collision will be processed
         is the 'and' operation of all return values of all collision listeners on both bodies.
+
+        In the gravity only mode of the PhysicsManager the arbiter is None and the return value is ignored,
+        since the bodies are never pushed apart.
         """
         pass
 
@@ -102,6 +236,8 @@ class CollisionListener(SimObjectComponent):
         """
         Two shapes are touching and their collision response has been processed.
 
+        Not called in the gravity only mode of the PhysicsManager.
+
         Return false from the callback to make pymunk ignore the collision this
         step or true to process it normally. Additionally, you may override collision
         values using Arbiter.friction, Arbiter.elasticity or Arbiter.surfaceVelocity to provide custom
@@ -118,6 +254,8 @@ class CollisionListener(SimObjectComponent):
 
         You can retrieve the collision impulse or kinetic energy at this time if you want
         to use it to calculate sound volumes or damage amounts.
+
+        Not called in the gravity only mode of the PhysicsManager.
         """
         pass
 
@@ -128,6 +266,9 @@ class CollisionListener(SimObjectComponent):
         To ensure that begin()/separate() are always called in balanced pairs,
         it will also be called when removing a shape while its in contact with something
         or when de-allocating the space.
+
+        In the gravity only mode of the PhysicsManager the arbiter is None,
+        and it's not called for the bodies that have been removed.
         """
         pass
 
@@ -148,6 +289,7 @@ class RigidBody(SimObjectComponent):
         # initializing fields
         self._transform: Optional[Transform] = None
         self._space: Optional[pymunk.Space] = None
+        self._physics_manager: Optional[PhysicsManager] = None
         self._body: pymunk.Body = SophysicsBody(self, body_type=body_type)
         self._shapes: Set[pymunk.Shape] = set()
         self._collision_listeners: Set[CollisionListener] = set()
@@ -168,19 +310,54 @@ class RigidBody(SimObjectComponent):
         self._transform = self.sim_object.transform
         environment = self.sim_object.environment
         rb_manager: PhysicsManager = environment.get_component(PhysicsManager)
+        self._physics_manager = rb_manager
         self._space = rb_manager.space
-        self._space.add(self._body, *self.shapes)
 
         # syncing the pymunk body position and sim_object's position
         # (doing that awkwardness because pymunk and pygame use different Vector classes)
         # (Both are iterables so we can unpack like that)
+        # (the position is set before adding the shapes, so that they are indexed at the right place right away)
         self._body.position = pymunk.Vec2d(*self._transform.position)
+        self._space.add(self._body, *self.shapes)
 
         # subscribing to events
         event_system = environment.event_system
         event_system.add_listener(RigidBodySyncBodyWithSimObjectEvent, self.__handle_sync_with_sim_object_event)
         event_system.add_listener(RigidBodySyncSimObjectWithBodyEvent, self.__handle_sync_with_body_event)
 
+    @classmethod
+    def batch_setup(cls, components: Sequence[RigidBody]):
+        if cls.setup is not RigidBody.setup or not components:
+            cls._setup_each(components)
+            return
+
+        environment = components[0].sim_object.environment
+        physics_manager = environment.get_component(PhysicsManager)
+        space = physics_manager.space
+
+        to_add = []
+        for rigidbody in components:
+            rigidbody._is_set_up = True
+            rigidbody._transform = rigidbody.sim_object.transform
+            rigidbody._physics_manager = physics_manager
+            rigidbody._space = space
+            rigidbody._body.position = pymunk.Vec2d(*rigidbody._transform.position)
+
+            to_add.append(rigidbody._body)
+            to_add.extend(rigidbody.shapes)
+
+        space.add(*to_add)
+
+        event_system = environment.event_system
+        event_system.add_listeners(
+            RigidBodySyncBodyWithSimObjectEvent,
+            [rigidbody.__handle_sync_with_sim_object_event for rigidbody in components]
+        )
+        event_system.add_listeners(
+            RigidBodySyncSimObjectWithBodyEvent,
+            [rigidbody.__handle_sync_with_body_event for rigidbody in components]
+        )
+
     def __handle_sync_with_body_event(self, _: RigidBodySyncSimObjectWithBodyEvent):
         self.__sync_sim_object_with_body()
 
@@ -204,8 +381,17 @@ class RigidBody(SimObjectComponent):
         self._body.angle = self._transform.rotation
         self._space.reindex_shapes_for_body(self._body)
 
+    def __sync_with_arrays(self):
+        # in the gravity only mode the pymunk body can be behind the arrays of the PhysicsManager
+        if self._physics_manager is not None:
+            self._physics_manager.sync_body(self)
+
     @property
     def body(self) -> pymunk.Body:
+        """
+        The pymunk body, up to date with the last step
+        """
+        self.__sync_with_arrays()
         return self._body
 
     @property
@@ -220,6 +406,7 @@ class RigidBody(SimObjectComponent):
         """
         The object's velocity
         """
+        self.__sync_with_arrays()
         return self._body.velocity
 
     @velocity.setter
@@ -236,6 +423,7 @@ class RigidBody(SimObjectComponent):
         x, y, *_ = value
         del _
 
+        self.__sync_with_arrays()
         self._body.velocity = pymunk.Vec2d(x, y)
 
     def attach_shape(self, shape: pymunk.Shape):
@@ -269,12 +457,14 @@ class RigidBody(SimObjectComponent):
         """
         Same as RigidBody.body.mass
         """
+        self.__sync_with_arrays()
         return self._body.mass
 
     @mass.setter
     def mass(self, value: float):
         validate_positive_number(value, "mass")
 
+        self.__sync_with_arrays()
         self._body.mass = value
 
     def apply_force(self, force: Union[Sequence[number], pygame.Vector2]):
@@ -284,8 +474,38 @@ class RigidBody(SimObjectComponent):
         x = force[0]
         y = force[1]
 
+        # in the gravity only mode the forces are summed up in the arrays instead of the pymunk body
+        bodies = self._physics_manager.body_arrays if self._physics_manager is not None else None
+        if bodies is not None:
+            index = bodies.index_of.get(self, None)
+
+            if index is not None:
+                bodies.force_x[index] += x
+                bodies.force_y[index] += y
+                return
+
         self._body.apply_force_at_local_point((x, y))
 
+    def get_bounding_radius(self) -> float:
+        """
+        The radius of the circle around the center of the body that contains all of its shapes
+        """
+        radius = 0.0
+
+        for shape in self._shapes:
+            if isinstance(shape, pymunk.Circle):
+                offset_x, offset_y = shape.offset
+                radius = max(radius, shape.radius + math.hypot(offset_x, offset_y))
+                continue
+
+            position = self._body.position
+            bb = shape.bb
+            for corner_x in (bb.left, bb.right):
+                for corner_y in (bb.bottom, bb.top):
+                    radius = max(radius, math.hypot(corner_x - position.x, corner_y - position.y))
+
+        return radius
+
     def attach_collision_listener(self, listener: CollisionListener):
         """
         adds a collision listener to the list of collision listeners
@@ -355,7 +575,30 @@ class RigidBody(SimObjectComponent):
         event_system.remove_listener(RigidBodySyncBodyWithSimObjectEvent, self.__handle_sync_with_sim_object_event)
         event_system.remove_listener(RigidBodySyncSimObjectWithBodyEvent, self.__handle_sync_with_body_event)
 
+        self._physics_manager.sync_bodies()
         self._space.remove(*self.shapes, self._body)
+        self._physics_manager = None
+
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[RigidBody]):
+        if cls._on_destroy is not RigidBody._on_destroy or not components:
+            cls._on_destroy_each(components)
+            return
+
+        event_system = components[0].sim_object.environment.event_system
+        event_system.remove_listeners(
+            RigidBodySyncBodyWithSimObjectEvent,
+            (rigidbody.__handle_sync_with_sim_object_event for rigidbody in components)
+        )
+        event_system.remove_listeners(
+            RigidBodySyncSimObjectWithBodyEvent,
+            (rigidbody.__handle_sync_with_body_event for rigidbody in components)
+        )
+
+        components[0]._physics_manager.remove_rigidbodies(components)
+
+        for rigidbody in components:
+            rigidbody._physics_manager = None
 
 
 class SophysicsBody(pymunk.Body):
@@ -380,17 +623,374 @@ class SophysicsBody(pymunk.Body):
         return self._rigidbody
 
 
+class BodyArrays:
+    """
+    The state of all the bodies in the space as flat lists, used by the gravity only mode of the PhysicsManager.
+
+    The i-th item of every list belongs to the i-th rigidbody
+    """
+    def __init__(self, rigidbodies: List[RigidBody]):
+        self.rigidbodies = rigidbodies
+        self.index_of: Dict[RigidBody, int] = {rigidbody: i for i, rigidbody in enumerate(rigidbodies)}
+
+        self.x: List[float] = []
+        self.y: List[float] = []
+        self.velocity_x: List[float] = []
+        self.velocity_y: List[float] = []
+        self.mass: List[float] = []
+        self.body_type: List[int] = []
+
+        for rigidbody in rigidbodies:
+            body = rigidbody._body
+            position = rigidbody._transform.position
+            velocity_x, velocity_y = body.velocity
+
+            self.x.append(position.x)
+            self.y.append(position.y)
+            self.velocity_x.append(velocity_x)
+            self.velocity_y.append(velocity_y)
+            self.mass.append(body.mass)
+            self.body_type.append(body.body_type)
+
+        self.force_x: List[float] = [0.0] * len(rigidbodies)
+        self.force_y: List[float] = [0.0] * len(rigidbodies)
+
+    def __len__(self):
+        return len(self.rigidbodies)
+
+    def reset_forces(self):
+        self.force_x = [0.0] * len(self.rigidbodies)
+        self.force_y = [0.0] * len(self.rigidbodies)
+
+    def read_positions(self):
+        """
+        Updates the positions from the transforms, which are moved without the pymunk bodies (e.g. by the editor)
+        """
+        positions = [rigidbody._transform.position for rigidbody in self.rigidbodies]
+
+        self.x = [position.x for position in positions]
+        self.y = [position.y for position in positions]
+
+    def read_body(self, index: int):
+        """
+        Updates the arrays from the pymunk body, e.g. after a collision listener has changed it
+        """
+        body = self.rigidbodies[index]._body
+
+        self.x[index], self.y[index] = body.position
+        self.velocity_x[index], self.velocity_y[index] = body.velocity
+        self.mass[index] = body.mass
+        self.body_type[index] = body.body_type
+
+    def write_body(self, index: int):
+        """
+        Puts the state from the arrays into the pymunk body and the transform
+        """
+        rigidbody = self.rigidbodies[index]
+        x = self.x[index]
+        y = self.y[index]
+
+        rigidbody._transform.position = (x, y)
+        rigidbody._body.position = pymunk.Vec2d(x, y)
+        rigidbody._body.velocity = pymunk.Vec2d(self.velocity_x[index], self.velocity_y[index])
+
+    def write_bodies(self):
+        """
+        Puts the state from the arrays into all pymunk bodies and transforms
+        """
+        vector = pymunk.Vec2d
+
+        for rigidbody, x, y, velocity_x, velocity_y in zip(self.rigidbodies, self.x, self.y,
+                                                            self.velocity_x, self.velocity_y):
+            position = rigidbody._transform.position
+            position.x = x
+            position.y = y
+
+            body = rigidbody._body
+            body.position = vector(x, y)
+            body.velocity = vector(velocity_x, velocity_y)
+
+    def write_transforms(self):
+        """
+        Puts the positions from the arrays into all transforms, without the pymunk bodies
+        """
+        for rigidbody, x, y in zip(self.rigidbodies, self.x, self.y):
+            position = rigidbody._transform.position
+            position.x = x
+            position.y = y
+
+
 class PhysicsManager(EnvironmentComponent):
     """
     The manager for RigidBody components
     """
-    def __init__(self):
+    BOUNDING_BOX_TREE = "bbtree"
+    SPATIAL_HASH = "spatial_hash"
+
+    # the modes of integration
+    PYMUNK = "pymunk"
+    GRAVITY_ONLY = "gravity_only"
+
+    def __init__(self, broadphase: str = BOUNDING_BOX_TREE, spatial_hash_cell_size: Optional[float] = None,
+                 cell_size_percentile: float = 90, iterations: int = 10, collision_slop: float = 0.1,
+                 threads: int = 1, mode: str = PYMUNK, max_substeps: int = 1, compensated_positions: bool = False):
+        """
+        :param broadphase: the spatial index pymunk uses to find the shapes that might collide,
+                           "bbtree" (the bounding box tree, good for few shapes or shapes of very different sizes)
+                           or "spatial_hash" (good for thousands of shapes of similar size)
+        :param spatial_hash_cell_size: the size of the cells of the spatial hash. None to estimate it from
+                                       the sizes of the shapes, it's estimated again when the number of shapes
+                                       doubles or halves
+        :param cell_size_percentile: the estimated cell size is this percentile of the diameters of the shapes
+        :param iterations: the number of iterations of the collision solver
+        :param collision_slop: the amount of overlap between shapes that is allowed
+        :param threads: the number of threads pymunk uses to solve the collisions, 1 or 2.
+                        The order of the threaded solver isn't guaranteed, so keep 1 thread when recording replays.
+                        Ignored on Windows
+        :param mode: "pymunk" to step the pymunk space, or "gravity_only" to integrate the bodies on flat lists
+                     without stepping the space. See the mode property
+        :param max_substeps: the maximum number of substeps a step can be split into
+                             through PrePhysicsUpdateEvent.request_substeps()
+        :param compensated_positions: whether to carry the rounding errors of the positions over to the next steps.
+                                      Far from the origin, a step moves a body by much less than the spacing of
+                                      the floats there, so every step rounds its motion off
+        """
+        if broadphase not in (self.BOUNDING_BOX_TREE, self.SPATIAL_HASH):
+            raise ValueError(f"broadphase must be either '{self.BOUNDING_BOX_TREE}' or '{self.SPATIAL_HASH}'")
+
+        if spatial_hash_cell_size is not None:
+            validate_positive_number(spatial_hash_cell_size, "spatial_hash_cell_size")
+
+        if not 0 <= cell_size_percentile <= 100:
+            raise ValueError("cell_size_percentile must be between 0 and 100")
+
+        if iterations <= 0:
+            raise ValueError("iterations must be positive")
+
+        if collision_slop < 0:
+            raise ValueError("collision_slop can't be negative")
+
+        if threads not in (1, 2):
+            raise ValueError("threads must be either 1 or 2")
+
+        self.__validate_mode(mode)
+
+        if max_substeps < 1:
+            raise ValueError("max_substeps must be at least 1")
+
         super().__init__()
         self.__event_system: Optional[EventSystem] = None
         self.__time_settings: Optional[TimeSettings] = None
-        self._space: pymunk.Space = pymunk.Space()
+
+        self.__broadphase = broadphase
+        self.__spatial_hash_cell_size = spatial_hash_cell_size
+        self.__cell_size_percentile = cell_size_percentile
+        self.__iterations = iterations
+        self.__collision_slop = collision_slop
+        self.__threads = threads
+        self.__mode = mode
+        self.__max_substeps = max_substeps
+        self.__compensated_positions = compensated_positions
+
+        # the positions the bodies were moved to, and their rounding errors, for the compensated positions
+        self.__position_errors: Dict[pymunk.Body, Tuple[float, float, float, float]] = {}
+
+        # the state of the bodies while the gravity only step applies the forces
+        self.__body_arrays: Optional[BodyArrays] = None
+        # the state of the bodies after the last gravity only step, when the pymunk bodies are behind it.
+        # The indices of the bodies that were brought up to date since then are read back by the next step
+        self.__unsynced_arrays: Optional[BodyArrays] = None
+        self.__synced_indices: Set[int] = set()
+        # the pairs of bodies that overlapped at the end of the last gravity only step
+        self.__contacts: Dict[frozenset, Tuple[RigidBody, RigidBody]] = {}
+
+        # the number of shapes the spatial hash was configured for, None if it's not used yet
+        self.__spatial_hash_shape_count: Optional[int] = None
+
+        self._space: pymunk.Space = self.__create_space()
         self.__initialize_collision_callback_functions()
 
+    @property
+    def broadphase(self) -> str:
+        return self.__broadphase
+
+    @property
+    def mode(self) -> str:
+        """
+        How the bodies are moved.
+
+        In the "pymunk" mode the pymunk space is stepped. In the "gravity_only" mode the bodies are integrated
+        the same way pymunk does it, but on flat lists, and the shapes never collide.
+        The overlapping bodies are found with a sort and sweep pass over their bounding circles,
+        only CollisionListener.begin() and separate() are called for them.
+        The gravity of the space, joints and the rotation are ignored in this mode
+        """
+        return self.__mode
+
+    @mode.setter
+    def mode(self, value: str):
+        self.__validate_mode(value)
+
+        self.sync_bodies()
+        self.__mode = value
+        self.__contacts.clear()
+
+    def __validate_mode(self, mode: str):
+        if mode not in (self.PYMUNK, self.GRAVITY_ONLY):
+            raise ValueError(f"mode must be either '{self.PYMUNK}' or '{self.GRAVITY_ONLY}'")
+
+    @property
+    def body_arrays(self) -> Optional[BodyArrays]:
+        """
+        The state of the bodies while the forces are applied in the gravity only mode, None otherwise
+        """
+        return self.__body_arrays
+
+    def sync_body(self, rigidbody: RigidBody):
+        """
+        Puts the state of the last gravity only step into the pymunk body of the rigidbody.
+
+        The gravity only steps keep the state in the arrays between the steps and only move the transforms,
+        the RigidBody calls this before its pymunk body is used. The next step reads the body back,
+        so it can be changed afterwards
+        """
+        arrays = self.__unsynced_arrays
+        if arrays is None:
+            return
+
+        index = arrays.index_of.get(rigidbody, None)
+        if index is None or index in self.__synced_indices:
+            return
+
+        arrays.write_body(index)
+        self.__synced_indices.add(index)
+
+    def sync_bodies(self):
+        """
+        Puts the state of the last gravity only step into all pymunk bodies, the next step reads all of them back
+        """
+        arrays = self.__unsynced_arrays
+        if arrays is None:
+            return
+
+        self.__unsynced_arrays = None
+        self.__synced_indices.clear()
+        arrays.write_bodies()
+
+    @property
+    def spatial_hash_cell_size(self) -> Optional[float]:
+        """
+        The size of the cells of the spatial hash, None if it's estimated automatically
+        """
+        return self.__spatial_hash_cell_size
+
+    @property
+    def cell_size_percentile(self) -> float:
+        return self.__cell_size_percentile
+
+    @property
+    def iterations(self) -> int:
+        return self.__iterations
+
+    @property
+    def collision_slop(self) -> float:
+        return self.__collision_slop
+
+    @property
+    def threads(self) -> int:
+        return self.__threads
+
+    def __create_space(self) -> pymunk.Space:
+        space = pymunk.Space(threaded=self.__threads > 1)
+
+        if space.threaded:
+            space.threads = self.__threads
+
+        space.iterations = self.__iterations
+        space.collision_slop = self.__collision_slop
+
+        self.__spatial_hash_shape_count = None
+
+        return space
+
+    def reset_space(self):
+        """
+        Replaces the space with a fresh one, so that the internal state of the old space
+        (e.g. shape ids) doesn't affect the simulation. The space must be empty.
+        """
+        if self._space.bodies or self._space.shapes:
+            raise RuntimeError("can't reset a space that still contains bodies or shapes")
+
+        self.sync_bodies()
+
+        self._space = self.__create_space()
+        self.__initialize_collision_callback_functions()
+        self.__contacts.clear()
+
+    def remove_rigidbodies(self, rigidbodies: Sequence[RigidBody]):
+        """
+        Removes the bodies and the shapes of many rigidbodies from the space at once.
+
+        If that leaves the space empty, the space is replaced with a fresh one instead,
+        which is a lot faster than removing the shapes one by one
+        """
+        self.sync_bodies()
+
+        space = self._space
+        bodies = [rigidbody.body for rigidbody in rigidbodies]
+        shapes = [shape for rigidbody in rigidbodies for shape in rigidbody.shapes]
+
+        is_removing_everything = len(bodies) == len(space.bodies) and len(shapes) == len(space.shapes) and \
+            not space.constraints and all(rigidbody._space is space for rigidbody in rigidbodies)
+
+        if not is_removing_everything:
+            space.remove(*shapes, *bodies)
+            return
+
+        # the old space calls separate() for the touching shapes when it's garbage collected,
+        # the listeners shouldn't hear about it at some random moment later
+        space.add_default_collision_handler().separate = lambda *_: None
+
+        self._space = self.__create_space()
+        self.__initialize_collision_callback_functions()
+        self.__contacts.clear()
+
+    def __update_spatial_hash(self):
+        """
+        Switches the space to the spatial hash, or reconfigures it when the number of shapes changes a lot
+        """
+        shape_count = len(self._space.shapes)
+
+        if shape_count == 0:
+            return
+
+        configured_count = self.__spatial_hash_shape_count
+        if configured_count is not None and configured_count / 2 <= shape_count <= configured_count * 2:
+            return
+
+        cell_size = self.__spatial_hash_cell_size
+        if cell_size is None:
+            cell_size = self.estimate_cell_size()
+
+        # the pymunk docs suggest about 10 times more cells than there are shapes
+        self._space.use_spatial_hash(cell_size, max(10 * shape_count, 1000))
+        self.__spatial_hash_shape_count = shape_count
+
+    def estimate_cell_size(self) -> float:
+        """
+        Estimates a good cell size for the spatial hash from the diameters of the shapes in the space
+        """
+        diameters = sorted(max(shape.bb.right - shape.bb.left, shape.bb.top - shape.bb.bottom)
+                           for shape in self._space.shapes)
+
+        if not diameters:
+            return 1.0
+
+        index = round(self.__cell_size_percentile / 100 * (len(diameters) - 1))
+
+        # a cell size of 0 would break the hash
+        return diameters[index] if diameters[index] > 0 else max(diameters[-1], 1.0)
+
     def __initialize_collision_callback_functions(self):
         """
         configures collision callbacks to call collision listeners
@@ -454,18 +1054,232 @@ class PhysicsManager(EnvironmentComponent):
     @property
     def space(self):
         """
-        The reference to the current pymunk's simulation space
+        The reference to the current pymunk's simulation space, the bodies in it are up to date with the last step
         """
+        self.sync_bodies()
         return self._space
 
+    @property
+    def max_substeps(self) -> int:
+        return self.__max_substeps
+
+    @property
+    def compensated_positions(self) -> bool:
+        return self.__compensated_positions
+
+    @compensated_positions.setter
+    def compensated_positions(self, value: bool):
+        self.__compensated_positions = value
+        self.__position_errors.clear()
+
     def advance_timestep(self):
+        pre_physics_update_event = PrePhysicsUpdateEvent()
+        self.__event_system.raise_event(pre_physics_update_event)
+
+        # the collisions are resolved only once at the end of the whole step
+        substeps = min(pre_physics_update_event.substeps, self.__max_substeps)
+        dt = self.__time_settings.dt / substeps
+
+        for _ in range(substeps):
+            if self.__mode == self.GRAVITY_ONLY:
+                self.__advance_gravity_only_substep(dt)
+            else:
+                self.__advance_pymunk_substep(dt)
+
+        self.__event_system.raise_event(PostIntegrationEvent())
+        self.__event_system.raise_event(CollisionResolutionEvent())
+        self.__event_system.raise_event(PostPhysicsUpdateEvent())
+
+    def __advance_pymunk_substep(self, dt: float):
+        if self.__broadphase == self.SPATIAL_HASH:
+            self.__update_spatial_hash()
+
         # put all pymunk bodies to the same positions as the transforms
         self.__event_system.raise_event(RigidBodySyncBodyWithSimObjectEvent())
         self.__event_system.raise_event(RigidBodyExertForcesEvent())
-        self._space.step(self.__time_settings.dt)
+
+        if self.__compensated_positions:
+            static = pymunk.Body.STATIC
+            start_states = [(body, body.position, body.velocity) for body in self._space.bodies
+                            if body.body_type != static]
+
+            self._space.step(dt)
+            self.__compensate_pymunk_positions(start_states, dt)
+        else:
+            self._space.step(dt)
+
         self.__event_system.raise_event(RigidBodySyncSimObjectWithBodyEvent())
-        self.__event_system.raise_event(PostPhysicsUpdateEvent())
+
+    def __get_position_error(self, body: pymunk.Body, x: float, y: float) -> Tuple[float, float]:
+        """
+        The rounding error carried over from the last step,
+        0 if the body was moved by something else since then
+        """
+        last_state = self.__position_errors.get(body, None)
+
+        if last_state is None or last_state[0] != x or last_state[1] != y:
+            return 0.0, 0.0
+
+        return last_state[2], last_state[3]
+
+    def __compensate_pymunk_positions(self, start_states: List[Tuple[pymunk.Body, pymunk.Vec2d, pymunk.Vec2d]],
+                                      dt: float):
+        """
+        Adds the rounding errors of the positions pymunk has computed to them
+        """
+        get_position_error = self.__get_position_error
+        position_errors = {}
+
+        for body, (start_x, start_y), (velocity_x, velocity_y) in start_states:
+            moved_x, moved_y = body.position
+            step_x = velocity_x * dt
+            step_y = velocity_y * dt
+
+            # pymunk moves the bodies by the velocity plus a bias that pushes the overlapping shapes apart,
+            # the error is only known when there's no bias
+            if start_x + step_x != moved_x or start_y + step_y != moved_y:
+                continue
+
+            error_x, error_y = get_position_error(body, start_x, start_y)
+            x, error_x = add_compensated(moved_x, error_x + get_addition_error(start_x, step_x, moved_x))
+            y, error_y = add_compensated(moved_y, error_y + get_addition_error(start_y, step_y, moved_y))
+
+            # most of the time the errors are still too small to change the position
+            if x != moved_x or y != moved_y:
+                body.position = pymunk.Vec2d(x, y)
+
+            position_errors[body] = (x, y, error_x, error_y)
+
+        self.__position_errors = position_errors
+
+    def __move_compensated(self, bodies: BodyArrays, dt: float):
+        """
+        Moves the bodies the same way the gravity only step does, with the rounding errors carried over
+        """
+        static = pymunk.Body.STATIC
+        get_position_error = self.__get_position_error
+        xs = bodies.x
+        ys = bodies.y
+        position_errors = {}
+
+        for i, (rigidbody, velocity_x, velocity_y, body_type) in enumerate(zip(
+                bodies.rigidbodies, bodies.velocity_x, bodies.velocity_y, bodies.body_type)):
+            if body_type == static:
+                continue
+
+            body = rigidbody.body
+            error_x, error_y = get_position_error(body, xs[i], ys[i])
+            x, error_x = add_compensated(xs[i], velocity_x * dt + error_x)
+            y, error_y = add_compensated(ys[i], velocity_y * dt + error_y)
+
+            xs[i] = x
+            ys[i] = y
+            position_errors[body] = (x, y, error_x, error_y)
+
+        self.__position_errors = position_errors
+
+    def __get_body_arrays(self) -> BodyArrays:
+        """
+        The arrays of the last gravity only step, with the changes made to the bodies since then
+        """
+        bodies = self.__unsynced_arrays
+        if bodies is None:
+            return BodyArrays([body.rigidbody for body in self._space.bodies])
+
+        for index in self.__synced_indices:
+            bodies.read_body(index)
+
+        self.__synced_indices.clear()
+
+        # the transforms are always up to date, and they're the only thing the editor changes for the position
+        bodies.read_positions()
+        bodies.reset_forces()
+
+        return bodies
+
+    def __advance_gravity_only_substep(self, dt: float):
+        bodies = self.__get_body_arrays()
+        # the bodies are read back from the arrays while the step changes them
+        self.__unsynced_arrays = None
+
+        # the forces are computed at the positions from the start of the step
+        self.__body_arrays = bodies
+        try:
+            array_forces_event = RigidBodyExertArrayForcesEvent(bodies)
+            self.__event_system.raise_event(array_forces_event)
+            self.__event_system.raise_event(RigidBodyExertForcesEvent(array_forces_event.handled_force_types))
+        finally:
+            self.__body_arrays = None
+
+        # pymunk moves the bodies first, then finds the collisions, and then updates the velocities
+        static = pymunk.Body.STATIC
+        dynamic = pymunk.Body.DYNAMIC
+        body_types = bodies.body_type
+
+        if self.__compensated_positions:
+            self.__move_compensated(bodies, dt)
+        else:
+            bodies.x = [x + vx * dt if body_type != static else x
+                        for x, vx, body_type in zip(bodies.x, bodies.velocity_x, body_types)]
+            bodies.y = [y + vy * dt if body_type != static else y
+                        for y, vy, body_type in zip(bodies.y, bodies.velocity_y, body_types)]
+
+        self.__process_gravity_only_collisions(bodies)
+
+        damping = self._space.damping ** dt
+        velocity_x, velocity_y = bodies.velocity_x, bodies.velocity_y
+        for i, (mass, force_x, force_y, body_type) in enumerate(zip(bodies.mass, bodies.force_x, bodies.force_y,
+                                                                     body_types)):
+            if body_type != dynamic:
+                continue
+
+            inverse_mass = 1 / mass
+            velocity_x[i] = velocity_x[i] * damping + force_x * inverse_mass * dt
+            velocity_y[i] = velocity_y[i] * damping + force_y * inverse_mass * dt
+
+        # the pymunk bodies are only brought up to date when something needs them
+        bodies.write_transforms()
+        self.__unsynced_arrays = bodies
+
+    def __process_gravity_only_collisions(self, bodies: BodyArrays):
+        """
+        Calls the collision listeners of the bodies that started or stopped overlapping
+        """
+        radii = [rigidbody.get_bounding_radius() for rigidbody in bodies.rigidbodies]
+        rigidbodies = bodies.rigidbodies
+
+        contacts: Dict[frozenset, Tuple[RigidBody, RigidBody]] = {}
+        for i, j in sort_and_sweep(bodies.x, bodies.y, radii):
+            contacts[frozenset((rigidbodies[i], rigidbodies[j]))] = (rigidbodies[i], rigidbodies[j])
+
+        for key, (body1, body2) in self.__contacts.items():
+            if key in contacts or body1 not in bodies.index_of or body2 not in bodies.index_of:
+                continue
+
+            body1.collision_separate(body2, None)
+            body2.collision_separate(body1, None)
+
+        for key, (body1, body2) in contacts.items():
+            if key in self.__contacts:
+                continue
+
+            index1 = bodies.index_of[body1]
+            index2 = bodies.index_of[body2]
+
+            # the listeners work with the pymunk bodies, so they have to be up to date
+            bodies.write_body(index1)
+            bodies.write_body(index2)
+
+            body1.collision_begin(body2, None)
+            body2.collision_begin(body1, None)
+
+            bodies.read_body(index1)
+            bodies.read_body(index2)
+
+        self.__contacts = contacts
 
     def _on_destroy(self):
         self.__event_system.remove_listener(AdvanceTimeStepEvent, self.__handle_advance_timestep_event)
+        self.sync_bodies()
+        self.__position_errors.clear()
         super()._on_destroy()
@@ -7,10 +7,10 @@ from __future__ import annotations
 import pygame
 
 from abc import ABC, abstractmethod
-from .simulation import EnvironmentComponent, SimObjectComponent, RenderEvent
+from .simulation import EnvironmentComponent, SimObjectComponent, RenderEvent, Transform
 from .event_system import EventSystem
 from .event import Event
-from typing import Optional, List, Union, Tuple
+from typing import Optional, List, Union, Tuple, Sequence
 from .helper_functions import validate_positive_number
 
 
@@ -53,6 +53,7 @@ class Camera(EnvironmentComponent):
         # initializing to then call the setters, which would check if the values are valid
         self._units_per_pixel: Optional[float] = None
         self._position = pygame.Vector2(position)
+        self._origin: Optional[Transform] = None
 
         self._display = display
         self.units_per_pixel = units_per_pixel
@@ -87,6 +88,7 @@ class Camera(EnvironmentComponent):
 
         # render onto the layers
         self.environment.event_system.raise_event(CameraRenderEvent(self))
+        self.environment.event_system.raise_event(CameraPostRenderEvent(self))
 
         # blit the layers onto the display
         for i, layer in enumerate(self._layers):
@@ -141,6 +143,32 @@ class Camera(EnvironmentComponent):
         """
         self._position = pygame.Vector2(value)
 
+    @property
+    def origin(self) -> Optional[Transform]:
+        """
+        The transform, whose position is displayed as the origin of the coordinate system.
+
+        If it's None, the world origin is used.
+        """
+        return self._origin
+
+    @origin.setter
+    def origin(self, value: Optional[Transform]):
+        if value is not None and not isinstance(value, Transform):
+            raise TypeError("origin can only be of type Transform or None")
+
+        self._origin = value
+
+    @property
+    def origin_offset(self) -> pygame.Vector2:
+        """
+        The worldspace position of the origin
+        """
+        if self._origin is None:
+            return pygame.Vector2()
+
+        return self._origin.position.copy()
+
     def get_screen_center(self) -> pygame.Vector2:
         """
         Returns the screenspace coordinates of the screen center
@@ -188,27 +216,63 @@ class Camera(EnvironmentComponent):
 
         self._units_per_pixel = 1 / value
 
-    def world_to_screen(self, world_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+    def world_to_local(self, world_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
         """
-        Converts a worldspace position into a position on the screen in pixels
+        Converts a worldspace position into a position relative to the origin
         """
         world_x, world_y = world_coords
+
+        if self._origin is None:
+            return (world_x, world_y)
+
+        origin = self._origin.position
+        return (world_x - origin.x, world_y - origin.y)
+
+    def local_to_world(self, local_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+        """
+        Converts a position relative to the origin into a worldspace position
+        """
+        local_x, local_y = local_coords
+
+        if self._origin is None:
+            return (local_x, local_y)
+
+        origin = self._origin.position
+        return (local_x + origin.x, local_y + origin.y)
+
+    def local_to_screen(self, local_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+        """
+        Converts a position relative to the origin into a position on the screen in pixels
+        """
+        local_x, local_y = local_coords
         surface_rect = self.display.get_rect()
-        screen_x = world_x * self.pixels_per_unit + surface_rect.centerx - self.position.x
-        screen_y = -(world_y * self.pixels_per_unit) + surface_rect.centery - self.position.y
+        screen_x = local_x * self.pixels_per_unit + surface_rect.centerx - self.position.x
+        screen_y = -(local_y * self.pixels_per_unit) + surface_rect.centery - self.position.y
         return (screen_x, screen_y)
 
-    def screen_to_world(self, screen_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+    def screen_to_local(self, screen_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
         """
-        Converts from a position on the screen into a position in the world
+        Converts from a position on the screen into a position relative to the origin
         """
         screen_x, screen_y = screen_coords
         surface_rect = self.display.get_rect()
-        world_x = (screen_x - surface_rect.centerx + self.position.x) * self.units_per_pixel
-        # this might cause world_y to be -0.0 in some cases, but it doesn't really matter.
-        world_y = -(screen_y - surface_rect.centery + self.position.y) * self.units_per_pixel
+        local_x = (screen_x - surface_rect.centerx + self.position.x) * self.units_per_pixel
+        # this might cause local_y to be -0.0 in some cases, but it doesn't really matter.
+        local_y = -(screen_y - surface_rect.centery + self.position.y) * self.units_per_pixel
+
+        return (local_x, local_y)
+
+    def world_to_screen(self, world_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+        """
+        Converts a worldspace position into a position on the screen in pixels
+        """
+        return self.local_to_screen(self.world_to_local(world_coords))
 
-        return (world_x, world_y)
+    def screen_to_world(self, screen_coords: Union[pygame.Vector2, Tuple[number, number]]) -> Tuple[float, float]:
+        """
+        Converts from a position on the screen into a position in the world
+        """
+        return self.local_to_world(self.screen_to_local(screen_coords))
 
     def _on_destroy(self):
         self.environment.event_system.remove_listener(RenderEvent, self.__handle_render_event)
@@ -249,6 +313,18 @@ class Renderer(SimObjectComponent, ABC):
 
         super().setup()
 
+    @classmethod
+    def batch_setup(cls, components: Sequence[Renderer]):
+        if cls.setup is not Renderer.setup or not components:
+            cls._setup_each(components)
+            return
+
+        for renderer in components:
+            renderer._is_set_up = True
+
+        event_system: EventSystem = components[0].sim_object.environment.event_system
+        event_system.add_listeners(CameraRenderEvent, [renderer.__handle_render_event for renderer in components])
+
     def __handle_render_event(self, event: CameraRenderEvent):
         if not self.is_active:
             return
@@ -286,6 +362,25 @@ class Renderer(SimObjectComponent, ABC):
         event_system = self.sim_object.environment.event_system
         event_system.remove_listener(CameraRenderEvent, self.__handle_render_event)
 
+    @classmethod
+    def _batch_on_destroy(cls, components: Sequence[Renderer]):
+        if cls._on_destroy is not Renderer._on_destroy:
+            cls._on_destroy_each(components)
+            return
+
+        cls._batch_on_destroy_renderers(components)
+
+    @classmethod
+    def _batch_on_destroy_renderers(cls, components: Sequence[Renderer]):
+        """
+        Does the part of the destruction that's common to all renderers for many renderers at once
+        """
+        if not components:
+            return
+
+        event_system: EventSystem = components[0].sim_object.environment.event_system
+        event_system.remove_listeners(CameraRenderEvent, (renderer.__handle_render_event for renderer in components))
+
 
 class CameraRenderEvent(Event):
     """
@@ -299,3 +394,18 @@ class CameraRenderEvent(Event):
     @property
     def camera(self) -> Camera:
         return self.__camera
+
+
+class CameraPostRenderEvent(Event):
+    """
+    An event raised by the camera after all renderers have drawn onto the layers, but before the layers are
+    blitted onto the display.
+
+    Has a reference to the camera.
+    """
+    def __init__(self, camera: Camera):
+        self.__camera = camera
+
+    @property
+    def camera(self) -> Camera:
+        return self.__camera
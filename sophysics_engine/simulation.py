@@ -9,7 +9,7 @@ from .component import Component
 from .component_container import ComponentContainer
 from .event_system import EventSystem, Event
 from abc import ABC
-from typing import Iterable, Set, Optional, Sequence
+from typing import Iterable, Set, Optional, Sequence, Dict, List, KeysView
 
 
 class SimEnvironment(ComponentContainer):
@@ -25,9 +25,9 @@ class SimEnvironment(ComponentContainer):
         self._is_set_up = False
         self.sim_objects: Set[SimObject] = set()
 
-        # a set of sim_objects
-        # that have to be destroyed at the end of the time step
-        self._to_be_destroyed: Set[SimObject] = set()
+        # sim_objects that have to be destroyed at the end of the time step
+        # (a dict is used as an ordered set, so that the objects are destroyed in a reproducible order)
+        self._to_be_destroyed: Dict[SimObject, None] = {}
 
         self.__event_system: EventSystem = EventSystem()
 
@@ -52,8 +52,8 @@ class SimEnvironment(ComponentContainer):
         return self._is_set_up
 
     @property
-    def to_be_destroyed_sim_objects(self) -> Set[SimObject]:
-        return self._to_be_destroyed
+    def to_be_destroyed_sim_objects(self) -> KeysView[SimObject]:
+        return self._to_be_destroyed.keys()
 
     def attach_sim_object(self, sim_object: SimObject):
         """
@@ -66,6 +66,37 @@ class SimEnvironment(ComponentContainer):
             for component in sim_object.components:
                 component.setup()
 
+    def attach_sim_objects(self, sim_objects: Iterable[SimObject]):
+        """
+        Attaches many sim objects at once.
+
+        The components are set up grouped by their type through Component.batch_setup,
+        so that the components of the same type can share lookups and register with the managers in bulk.
+        The components of each type are set up in the order of the given sim objects.
+        """
+        sim_objects = tuple(sim_objects)
+
+        for sim_object in sim_objects:
+            sim_object.attach_environment(self)
+
+        self.sim_objects.update(sim_objects)
+
+        if not self._is_set_up:
+            return
+
+        components_by_type: Dict[type, List[Component]] = {}
+        for sim_object in sim_objects:
+            for component in sim_object.components:
+                component_type = type(component)
+
+                if component_type not in components_by_type:
+                    components_by_type[component_type] = []
+
+                components_by_type[component_type].append(component)
+
+        for component_type, components in components_by_type.items():
+            component_type.batch_setup(components)
+
     def remove_sim_object(self, sim_object: SimObject):
         """
         Removes the sim_object from the environment
@@ -73,6 +104,41 @@ class SimEnvironment(ComponentContainer):
         sim_object.remove_environment()
         self.sim_objects.remove(sim_object)
 
+    def destroy_sim_objects(self, sim_objects: Iterable[SimObject]):
+        """
+        Destroys many sim objects at once.
+
+        The components are destroyed grouped by their type through Component._batch_on_destroy(),
+        so that the components of the same type can remove their listeners and registrations in bulk.
+        Then all the sim objects are detached from the environment together
+        """
+        sim_objects = tuple(sim_objects)
+
+        components_by_type: Dict[type, List[Component]] = {}
+        for sim_object in sim_objects:
+            for component in sim_object.components:
+                component_type = type(component)
+
+                if component_type not in components_by_type:
+                    components_by_type[component_type] = []
+
+                components_by_type[component_type].append(component)
+
+        for component_type, components in components_by_type.items():
+            component_type._batch_on_destroy(components)
+
+        for sim_object in sim_objects:
+            for component in sim_object.components:
+                component.remove_sim_object()
+
+            sim_object.components.clear()
+            sim_object._component_lookup_cache.clear()
+            sim_object.remove_environment()
+
+            self._to_be_destroyed.pop(sim_object, None)
+
+        self.sim_objects.difference_update(sim_objects)
+
     # overriding a method to connect the component to self
     def attach_component(self, component: EnvironmentComponent):
         """
@@ -105,12 +171,13 @@ class SimEnvironment(ComponentContainer):
         """
         Schedule the sim_object to be destroyed at the end of the current step
         """
-        self._to_be_destroyed.add(sim_object)
+        self._to_be_destroyed[sim_object] = None
 
     def _destroy_marked_sim_objects(self):
-        for o in self._to_be_destroyed:
-            o.destroy()
+        if not self._to_be_destroyed:
+            return
 
+        self.destroy_sim_objects(tuple(self._to_be_destroyed))
         self._to_be_destroyed.clear()
 
     def advance(self):
@@ -136,8 +203,7 @@ class SimEnvironment(ComponentContainer):
         """
         Destroys the environment and all its components and sim_objects
         """
-        for sim_object in self.sim_objects.copy():
-            sim_object.destroy()
+        self.destroy_sim_objects(self.sim_objects.copy())
 
         for component in self.components.copy():
             component.destroy()
@@ -220,6 +286,7 @@ class SimObject(ComponentContainer):
             c.destroy()
 
         self.components.clear()
+        self._component_lookup_cache.clear()
         self.environment.remove_sim_object(self)
 
 
@@ -14,14 +14,37 @@ class UnpauseEvent(Event):
     pass
 
 
+class TimeStepChangedEvent(Event):
+    """
+    Raised when the length of the time step (dt) changes
+    """
+    def __init__(self, dt: number):
+        self.__dt = dt
+
+    @property
+    def dt(self) -> number:
+        return self.__dt
+
+
 class TimeSettings(EnvironmentComponent):
     def __init__(self, dt: number = 1 / 60, steps_per_frame: int = 1, paused: bool = False):
-        self.dt = dt
+        self.__dt = dt
         self.steps_per_frame = steps_per_frame
         self.__paused = paused
 
         super().__init__()
 
+    @property
+    def dt(self) -> number:
+        return self.__dt
+
+    @dt.setter
+    def dt(self, value: number):
+        self.__dt = value
+
+        if self.environment is not None:
+            self.environment.event_system.raise_event(TimeStepChangedEvent(value))
+
     @property
     def paused(self) -> bool:
         return self.__paused